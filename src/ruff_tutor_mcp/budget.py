@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from typing import TypeVar
+
+from ruff_tutor_mcp import instructions
+from ruff_tutor_mcp.models import Progress, ReviewResponse, ViolationDetail, ViolationGroup, ViolationRef
+
+DEFAULT_MAX_RESPONSE_BYTES = 64 * 1024
+MIN_RESPONSE_BYTES = 4 * 1024
+
+# approximate JSON bytes of each model besides its free-text fields (keys, numbers, punctuation)
+RESPONSE_OVERHEAD_BYTES = 200
+GROUP_OVERHEAD_BYTES = 150
+DETAIL_OVERHEAD_BYTES = 150
+REF_OVERHEAD_BYTES = 60
+
+# file names listed per group for summarized violations; the rest are only counted
+MAX_OMITTED_FILES = 20
+
+Shaped = TypeVar('Shaped', ReviewResponse, Progress)
+
+
+def response_sections(response: ReviewResponse | Progress) -> list[list[ViolationGroup]]:
+    """Return the response's lists of violation groups, in display order."""
+    if isinstance(response, ReviewResponse):
+        return [response.groups]
+    return [response.remaining, response.new]
+
+
+def with_sections(response: Shaped, sections: list[list[ViolationGroup]]) -> Shaped:
+    if isinstance(response, ReviewResponse):
+        return response.model_copy(update={'groups': sections[0]})
+    return response.model_copy(update={'remaining': sections[0], 'new': sections[1]})
+
+
+def fit_to_budget(response: Shaped, max_bytes: int | None = None) -> Shaped:
+    """Shrink `response` to roughly `max_bytes` of JSON before it is serialized.
+
+    Every group keeps full detail for its first N violations, with the largest
+    N that fits; the others are summarized as `omitted` with the files they
+    are in. For `check_my_fix` an oversized `fixed` list is cut to at most half
+    the budget first. Sizes are estimated from the text fields, so the bound
+    is approximate, and group headers are never cut: `ResultPages` keeps
+    to pages whose headers fit (see `headers_fit`).
+    """
+    budget = _budget(max_bytes)
+    used = RESPONSE_OVERHEAD_BYTES + _text_size(response.instruction, instructions.TRUNCATED)
+
+    truncated = False
+    if isinstance(response, Progress):
+        fixed = _fit_refs(response.fixed, budget // 2)
+        if len(fixed) < len(response.fixed):
+            response = response.model_copy(
+                update={'fixed': fixed, 'fixed_omitted': response.fixed_omitted + len(response.fixed) - len(fixed)}
+            )
+            truncated = True
+        used += sum(_ref_size(ref) for ref in response.fixed)
+
+    sections = response_sections(response)
+    limit = _detail_limit(sections, budget - used)
+    if limit is not None:
+        response = with_sections(response, [[_summarize(group, limit) for group in groups] for groups in sections])
+        truncated = True
+    if not truncated:
+        return response
+    return response.model_copy(update={'instruction': f'{response.instruction}\n\n{instructions.TRUNCATED}'})
+
+
+def headers_fit(response: ReviewResponse | Progress, max_bytes: int | None = None) -> int | None:
+    """Return how many leading violations fit on a page when the group headers alone overflow `max_bytes`.
+
+    None when every header fits. The count covers whole groups, and at least
+    the first, so paging by it always makes progress.
+    """
+    budget = _budget(max_bytes)
+    used = RESPONSE_OVERHEAD_BYTES + _text_size(response.instruction, instructions.MORE_PAGES, instructions.TRUNCATED)
+    if isinstance(response, Progress):
+        used += sum(_ref_size(ref) for ref in _fit_refs(response.fixed, budget // 2))
+    shown = 0
+    for groups in response_sections(response):
+        for group in groups:
+            used += _group_size(group, [], 0)
+            if used > budget:
+                return shown or len(group.violations)
+            shown += len(group.violations)
+    return None
+
+
+def _budget(max_bytes: int | None) -> int:
+    return max(max_bytes or DEFAULT_MAX_RESPONSE_BYTES, MIN_RESPONSE_BYTES)
+
+
+def _detail_limit(sections: list[list[ViolationGroup]], budget: int) -> int | None:
+    """Return the most violations per group that fit in `budget`, or None when everything fits."""
+    groups = [group for groups in sections for group in groups]
+    sizes = [[_detail_size(detail) for detail in group.violations] for group in groups]
+    longest = max((len(group_sizes) for group_sizes in sizes), default=0)
+
+    def cost(limit: int) -> int:
+        return sum(_group_size(group, group_sizes, limit) for group, group_sizes in zip(groups, sizes, strict=True))
+
+    if cost(longest) <= budget:
+        return None
+    low, high = 0, longest
+    while low < high:
+        middle = (low + high + 1) // 2
+        if cost(middle) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _group_size(group: ViolationGroup, sizes: list[int], limit: int) -> int:
+    """Size of `group` with its first `limit` violations (of sizes `sizes`) in detail and the rest summarized."""
+    return (
+        GROUP_OVERHEAD_BYTES
+        + _text_size(group.code, group.rule_name, group.summary, group.url)
+        + sum(sizes[:limit])
+        + sum(_text_size(file) + 3 for file in _omitted_files(group.violations[limit:]))
+    )
+
+
+def _summarize(group: ViolationGroup, limit: int) -> ViolationGroup:
+    kept, dropped = group.violations[:limit], group.violations[limit:]
+    if not dropped:
+        return group
+    return group.model_copy(
+        update={
+            'violations': kept,
+            'omitted': group.omitted + len(dropped),
+            'omitted_files': list(dict.fromkeys([*group.omitted_files, *_omitted_files(dropped)]))[:MAX_OMITTED_FILES],
+        }
+    )
+
+
+def _omitted_files(details: list[ViolationDetail]) -> list[str]:
+    return list(dict.fromkeys(detail.file for detail in details))[:MAX_OMITTED_FILES]
+
+
+def _fit_refs(refs: list[ViolationRef], budget: int) -> list[ViolationRef]:
+    used = 0
+    for index, ref in enumerate(refs):
+        used += _ref_size(ref)
+        if used > budget:
+            return refs[:index]
+    return refs
+
+
+def _detail_size(detail: ViolationDetail) -> int:
+    return DETAIL_OVERHEAD_BYTES + _text_size(detail.file, detail.message, detail.before, detail.after, detail.mode)
+
+
+def _ref_size(ref: ViolationRef) -> int:
+    return REF_OVERHEAD_BYTES + _text_size(ref.file, ref.code, ref.message)
+
+
+def _text_size(*texts: str | None) -> int:
+    # quotes, backslashes and newlines each take one more byte once JSON-escaped
+    return sum(
+        len(text.encode('utf-8')) + text.count('\n') + text.count('"') + text.count('\\') for text in texts if text
+    )
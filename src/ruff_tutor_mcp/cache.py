@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from importlib import metadata
+from pathlib import Path
+
+from loguru import logger
+from pydantic import ValidationError
+
+from ruff_tutor_mcp.models import RuleDoc
+
+APP_NAME = 'ruff-tutor-mcp'
+
+# overrides the platform cache directory (also keeps tests off the real one)
+CACHE_DIR_ENV = 'RUFF_TUTOR_CACHE_DIR'
+
+RULE_DOCS_FILE_NAME = 'rule-docs.json'
+
+RUFF_CACHE_DIR_NAME = 'ruff'
+RUFF_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RUFF_CACHE_MAX_AGE_DAYS = 14
+
+# touched on every use; its mtime is the workspace's last use and its text the workspace path
+LAST_USED_FILE_NAME = '.last-used'
+
+
+def user_cache_dir() -> Path:
+    """Return this server's directory under the platform's user cache root."""
+    override = os.environ.get(CACHE_DIR_ENV)
+    if override:
+        return Path(override)
+    if sys.platform == 'win32':
+        root = Path(os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local')
+    elif sys.platform == 'darwin':
+        root = Path.home() / 'Library' / 'Caches'
+    else:
+        root = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+    return root / APP_NAME
+
+
+def ruff_version() -> str:
+    """Return the installed ruff package version, or 'unknown'."""
+    try:
+        return metadata.version('ruff')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write text via a temporary sibling so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp.write_text(text, encoding='utf-8')
+    tmp.replace(path)
+
+
+class RuleDocCache:
+    """Rule documentation persisted across server restarts.
+
+    The cache is tied to the ruff binary it was built from: a different
+    version or binary path (e.g. after upgrading the package) invalidates it.
+    """
+
+    def __init__(self, ruff_bin: str) -> None:
+        self._ruff_bin = ruff_bin
+
+    @property
+    def path(self) -> Path:
+        # resolved on every access so the cache root is never fixed at import time
+        return user_cache_dir() / RULE_DOCS_FILE_NAME
+
+    def load(self) -> dict[str, RuleDoc] | None:
+        """Return the cached rules, or None when missing, stale or unreadable."""
+        try:
+            raw = json.loads(self.path.read_text(encoding='utf-8'))
+            if raw.get('key') != self._key():
+                logger.debug(f'Ignoring stale rule documentation cache: {self.path}')
+                return None
+            docs = [RuleDoc.model_validate(item) for item in raw['rules']]
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError, AttributeError, KeyError, TypeError, ValidationError) as e:
+            logger.warning(f'Failed to read rule documentation cache: {e}')
+            return None
+        return {doc.code: doc for doc in docs}
+
+    def save(self, rules: dict[str, RuleDoc]) -> None:
+        payload = {'key': self._key(), 'rules': [doc.model_dump() for doc in rules.values()]}
+        try:
+            write_atomic(self.path, json.dumps(payload))
+        except OSError as e:
+            # the cache is an optimization; a read-only home must not break lookups
+            logger.warning(f'Failed to write rule documentation cache: {e}')
+
+    def _key(self) -> dict[str, str]:
+        return {'ruff_version': ruff_version(), 'ruff_bin': str(Path(self._ruff_bin).resolve())}
+
+
+@dataclass
+class _CacheEntry:
+    directory: Path
+    last_used: float
+    size: int
+
+
+class RuffCacheDirs:
+    """Private per-workspace `--cache-dir`s for ruff, kept outside the user's project.
+
+    Each scanned workspace gets its own directory so repeated reviews and
+    re-checks reuse ruff's per-file cache instead of re-parsing everything.
+    """
+
+    def __init__(self, max_bytes: int = RUFF_CACHE_MAX_BYTES, max_age_days: int = RUFF_CACHE_MAX_AGE_DAYS) -> None:
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+
+    @property
+    def root(self) -> Path:
+        return user_cache_dir() / RUFF_CACHE_DIR_NAME
+
+    def for_workspace(self, path: str | Path) -> Path | None:
+        """Return the cache directory for the workspace containing `path`, or None if unusable."""
+        workspace = Path(path).resolve()
+        if workspace.is_file():
+            workspace = workspace.parent
+        directory = self.root / hashlib.blake2b(str(workspace).encode(), digest_size=8).hexdigest()
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / LAST_USED_FILE_NAME).write_text(str(workspace), encoding='utf-8')
+        except OSError as e:
+            logger.warning(f'Failed to prepare ruff cache directory: {e}')
+            return None
+        return directory
+
+    def prune(self) -> list[Path]:
+        """Remove stale workspace caches and return the removed directories.
+
+        Workspaces unused for `max_age_days` go first, then the least recently
+        used ones until the total size fits in `max_bytes`. The most recently
+        used workspace is always kept.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry.last_used, reverse=True)
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        kept = entries[:1] + [entry for entry in entries[1:] if entry.last_used >= cutoff]
+        removed = [entry for entry in entries[1:] if entry.last_used < cutoff]
+        total = sum(entry.size for entry in kept)
+        while len(kept) > 1 and total > self.max_bytes:
+            oldest = kept.pop()
+            removed.append(oldest)
+            total -= oldest.size
+
+        for entry in removed:
+            shutil.rmtree(entry.directory, ignore_errors=True)
+            logger.debug(f'Pruned ruff cache directory: {entry.directory}')
+        return [entry.directory for entry in removed]
+
+    def _entries(self) -> list[_CacheEntry]:
+        try:
+            directories = [path for path in self.root.iterdir() if path.is_dir()]
+        except OSError:
+            return []
+        entries: list[_CacheEntry] = []
+        for directory in directories:
+            try:
+                last_used = (directory / LAST_USED_FILE_NAME).stat().st_mtime
+            except OSError:
+                last_used = 0.0
+            try:
+                size = sum(file.stat().st_size for file in directory.rglob('*') if file.is_file())
+            except OSError:
+                # being written (or removed) concurrently; sized on the next prune
+                continue
+            entries.append(_CacheEntry(directory=directory, last_used=last_used, size=size))
+        return entries
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import time
 import tomllib
+from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 from typing import Any
@@ -10,6 +12,10 @@ from pydantic import BaseModel, Field, ValidationError
 
 CONFIG_FILE_NAME = '.ruff-tutor.toml'
 
+# seconds a directory's config file lookup is trusted, found or not; edits to a found file apply at once
+DISCOVERY_TTL_SECONDS = 5.0
+MAX_CACHED_DISCOVERIES = 256
+
 
 class TutorMode(str, Enum):
     """Enum representing learning mode."""
@@ -19,6 +25,30 @@ class TutorMode(str, Enum):
     AUTO = 'auto'
 
 
+class RuffBackend(str, Enum):
+    """Enum representing how ruff is run."""
+
+    CLI = 'cli'
+    SERVER = 'server'
+
+
+class ReviewScope(str, Enum):
+    """Enum representing which files a review covers."""
+
+    ALL = 'all'
+    # files changed in the git working tree
+    CHANGED = 'changed'
+    # lines changed in the git working tree
+    HUNKS = 'hunks'
+
+
+class SessionStoreKind(str, Enum):
+    """Enum representing where learning sessions are kept."""
+
+    MEMORY = 'memory'
+    SQLITE = 'sqlite'
+
+
 class TutorConfig(BaseModel):
     """Model representing ruff_tutor configuration."""
 
@@ -26,6 +56,22 @@ class TutorConfig(BaseModel):
     max_retry: int = Field(
         default=2, ge=1, le=10, description='Maximum attempts in learning sessions (beginner/advanced)'
     )
+    backend: RuffBackend = Field(
+        default=RuffBackend.CLI, description='Run ruff once per check (cli) or keep a `ruff server` running (server)'
+    )
+    timeout: float = Field(
+        default=60.0, gt=0, le=3600, description='Seconds one ruff check may take before it is killed'
+    )
+    session_store: SessionStoreKind = Field(
+        default=SessionStoreKind.MEMORY,
+        description='Keep sessions in memory (memory) or in a SQLite database that survives restarts (sqlite)',
+    )
+    session_ttl_hours: float = Field(default=24.0, gt=0, description='Hours an unused session is kept')
+    session_memory_mb: float = Field(
+        default=256.0,
+        gt=0,
+        description='Estimated memory the memory session store may use before evicting least recently used sessions',
+    )
 
     @classmethod
     def default(cls) -> TutorConfig:
@@ -71,6 +117,99 @@ def _parse_toml(path: Path) -> dict[str, Any]:
         return tomllib.load(f)
 
 
+@dataclass
+class _Discovery:
+    config_file: Path | None
+    expires_at: float
+
+
+@dataclass
+class _Parsed:
+    mtime_ns: int
+    size: int
+    config: TutorConfig
+
+
+# start path (absolute, unresolved) -> the config file found for it
+_discoveries: dict[Path, _Discovery] = {}
+# config file -> its parsed contents, valid while its mtime and size are unchanged
+_parsed: dict[Path, _Parsed] = {}
+
+
+def clear_config_cache() -> None:
+    """Forget every discovered and parsed config file."""
+    _discoveries.clear()
+    _parsed.clear()
+
+
+def _discover(start_path: Path, *, refresh: bool = False) -> Path | None:
+    """Find the config file for `start_path`, searching the parent directories only when the last search expired.
+
+    Args:
+        start_path: Starting path for search.
+        refresh: Search even if the last search has not expired.
+
+    Returns:
+        Path to config file, or None if not found.
+
+    """
+    # not resolved: resolving walks every path component, which is what the cache avoids
+    key = start_path.absolute()
+    now = time.monotonic()
+    cached = _discoveries.get(key)
+    if cached is not None and cached.expires_at > now and not refresh:
+        return cached.config_file
+    config_file = _find_config_file(start_path)
+    _discoveries.pop(key, None)
+    _discoveries[key] = _Discovery(config_file=config_file, expires_at=now + DISCOVERY_TTL_SECONDS)
+    while len(_discoveries) > MAX_CACHED_DISCOVERIES:
+        del _discoveries[next(iter(_discoveries))]
+    return config_file
+
+
+def _load_file(config_file: Path) -> TutorConfig | None:
+    """Return the config file's contents, parsing it again only when its mtime or size changed.
+
+    Args:
+        config_file: Path to config file.
+
+    Returns:
+        Parsed configuration (the defaults if the file is invalid), or None if the file is gone.
+
+    """
+    try:
+        stat = config_file.stat()
+    except OSError:
+        _parsed.pop(config_file, None)
+        return None
+    cached = _parsed.get(config_file)
+    if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+        return cached.config
+
+    try:
+        data = _parse_toml(config_file)
+        config = TutorConfig.model_validate(data)
+        logger.info(f'Loaded config from {config_file}')
+    except (ValidationError, tomllib.TOMLDecodeError, OSError) as e:
+        logger.warning(f'Failed to parse config file: {e}, using defaults')
+        config = TutorConfig.default()
+    _parsed[config_file] = _Parsed(mtime_ns=stat.st_mtime_ns, size=stat.st_size, config=config)
+    return config
+
+
+def _cached_config(start_path: Path) -> TutorConfig:
+    # a second search only when the file found before has been removed since
+    for refresh in (False, True):
+        config_file = _discover(start_path, refresh=refresh)
+        if config_file is None:
+            break
+        config = _load_file(config_file)
+        if config is not None:
+            return config
+    logger.debug('No config file found, using defaults')
+    return TutorConfig.default()
+
+
 def load_config(path: str | Path | None = None, mode_override: str | None = None) -> TutorConfig:
     """Load configuration.
 
@@ -79,6 +218,10 @@ def load_config(path: str | Path | None = None, mode_override: str | None = None
     2. Config file (.ruff-tutor.toml)
     3. Default values
 
+    Which config file applies to a path is remembered for
+    `DISCOVERY_TTL_SECONDS`; the file itself is re-read as soon as its
+    mtime or size changes.
+
     Args:
         path: Starting path for search (current directory if not specified).
         mode_override: Value to override the mode.
@@ -88,25 +231,59 @@ def load_config(path: str | Path | None = None, mode_override: str | None = None
 
     """
     start_path = Path(path) if path else Path.cwd()
-    config_file = _find_config_file(start_path)
+    return _with_override(_cached_config(start_path), mode_override)
 
-    if config_file is None:
-        logger.debug('No config file found, using defaults')
-        config = TutorConfig.default()
-    else:
-        try:
-            data = _parse_toml(config_file)
-            config = TutorConfig.model_validate(data)
-            logger.info(f'Loaded config from {config_file}')
-        except (ValidationError, tomllib.TOMLDecodeError, OSError) as e:
-            logger.warning(f'Failed to parse config file: {e}, using defaults')
-            config = TutorConfig.default()
 
+def _with_override(config: TutorConfig, mode_override: str | None) -> TutorConfig:
+    # a copy, so the override never changes the cached config
+    config = config.model_copy()
     if mode_override is not None:
         try:
             config.mode = TutorMode(mode_override)
             logger.debug(f'Mode overridden to: {mode_override}')
         except ValueError:
             logger.warning(f'Invalid mode override: {mode_override}, keeping {config.mode}')
-
     return config
+
+
+class ConfigIndex:
+    """Maps the files of one scan to their nearest config file, for projects with one config per package.
+
+    Every directory is checked for a config file at most once: a
+    directory's answer is its own config file or else its parent's, and is
+    shared by every file below it. Config files are read through the same
+    mtime-checked cache as `load_config`; `mode_override` applies to all.
+    """
+
+    def __init__(self, mode_override: str | None = None) -> None:
+        self._mode_override = mode_override
+        self._nearest: dict[Path, Path | None] = {}
+        self._configs: dict[Path | None, TutorConfig] = {}
+
+    def config_file_for(self, path: str | Path) -> Path | None:
+        """Return the config file nearest to the resolved file `path`, or None if there is none."""
+        unknown: list[Path] = []
+        found: Path | None = None
+        directory = Path(path).parent
+        for current in [directory, *directory.parents]:
+            if current in self._nearest:
+                found = self._nearest[current]
+                break
+            unknown.append(current)
+            candidate = current / CONFIG_FILE_NAME
+            if candidate.is_file():
+                found = candidate
+                break
+        for current in unknown:
+            self._nearest[current] = found
+        return found
+
+    def config_for(self, path: str | Path) -> TutorConfig:
+        """Return the configuration that applies to the resolved file `path`."""
+        config_file = self.config_file_for(path)
+        config = self._configs.get(config_file)
+        if config is None:
+            loaded = _load_file(config_file) if config_file is not None else None
+            config = _with_override(loaded or TutorConfig.default(), self._mode_override)
+            self._configs[config_file] = config
+        return config
@@ -1,38 +1,71 @@
 from __future__ import annotations
 
+from bisect import bisect_right
+from itertools import accumulate
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from ruff_tutor_mcp.models import FixEdit, RuffViolation
 
 
-def source_line(source: str, row: int) -> str:
+class LineIndex:
+    """A source file normalized and split into lines once, shared by all its violations.
+
+    Building it is linear in the file size; row lookups and (row, col)
+    offsets are then constant time.
+    """
+
+    def __init__(self, source: str) -> None:
+        self.text = _normalize(source)
+        self.lines = self.text.split('\n')
+        self.starts = list(accumulate((len(line) + 1 for line in self.lines[:-1]), initial=0))
+
+    def line(self, row: int) -> str:
+        """Return the text of the given 1-based line, or '' when out of range."""
+        if 1 <= row <= len(self.lines):
+            return self.lines[row - 1]
+        return ''
+
+    def offset(self, row: int, col: int) -> int:
+        """Return the text offset of a 1-based (row, col), clamped to the end of the file."""
+        if row - 1 < len(self.starts):
+            return min(self.starts[row - 1] + col - 1, len(self.text))
+        return len(self.text)
+
+    def row_of(self, offset: int) -> int:
+        """Return the 1-based row containing a text offset."""
+        return bisect_right(self.starts, offset)
+
+    def line_end(self, row: int) -> int:
+        """Return the offset just past the last character (before the newline) of a 1-based row."""
+        if row < len(self.starts):
+            return self.starts[row] - 1
+        return len(self.text)
+
+
+def source_line(index: LineIndex, row: int) -> str:
     """Return the text of the given 1-based line, or '' when out of range."""
-    return _line_at(_normalize(source).split('\n'), row)
+    return index.line(row)
 
 
-def render_fix(source: str, violation: RuffViolation) -> tuple[str, str | None]:
+def render_fix(index: LineIndex, violation: RuffViolation) -> tuple[str, str | None]:
     """Render before/after snippets for a violation from ruff's native fix edits.
 
     Returns (before, after). `after` is None when ruff provides no fix.
     The snippets cover the full lines spanned by the edits, so multi-line
     fixes and line deletions render correctly.
     """
-    source = _normalize(source)
-    lines = source.split('\n')
+    lines = index.lines
 
     if violation.fix is None or not violation.fix.edits:
-        return _line_at(lines, violation.row), None
+        return index.line(violation.row), None
 
     edits = violation.fix.edits
     start_row = min(edit.row for edit in edits)
     end_row = max(edit.end_row for edit in edits)
 
     before = '\n'.join(lines[start_row - 1 : end_row])
-
-    new_lines = _apply_edits(source, edits).split('\n')
-    delta = len(new_lines) - len(lines)
-    after = '\n'.join(new_lines[start_row - 1 : end_row + delta])
+    after = _render_after(index, edits, start_row, end_row)
 
     return before, after
 
@@ -42,46 +75,42 @@ def _normalize(source: str) -> str:
 
     Lines are always derived via split('\n') (never str.splitlines, which also
     splits on characters ruff does not treat as line breaks, e.g. form feed)
-    so that line indexing stays consistent with `_line_starts`.
+    so that line indexing stays consistent with `LineIndex.starts`.
     """
     return source.replace('\r\n', '\n').replace('\r', '\n')
 
 
-def _line_at(lines: list[str], row: int) -> str:
-    if 1 <= row <= len(lines):
-        return lines[row - 1]
-    return ''
-
-
-def _line_starts(source: str) -> list[int]:
-    starts = [0]
-    for index, char in enumerate(source):
-        if char == '\n':
-            starts.append(index + 1)
-    return starts
+def _render_after(index: LineIndex, edits: list[FixEdit], start_row: int, end_row: int) -> str:
+    """Return rows `start_row`..`end_row` of the fixed file, shifted by the lines the edits add or remove.
 
-
-def _offset(starts: list[int], source_length: int, row: int, col: int) -> int:
-    if row - 1 < len(starts):
-        return min(starts[row - 1] + col - 1, source_length)
-    return source_length
-
-
-def _apply_edits(source: str, edits: list[FixEdit]) -> str:
-    starts = _line_starts(source)
-    length = len(source)
+    Only the window of whole lines covering the edits is rebuilt; the rest of
+    the fixed file is the original text, addressed through `index`. For
+    non-overlapping edits (all ruff produces) the result equals applying them
+    to the full text and slicing its lines.
+    """
     spans = sorted(
-        (
-            (
-                _offset(starts, length, edit.row, edit.col),
-                _offset(starts, length, edit.end_row, edit.end_col),
-                edit.content,
-            )
-            for edit in edits
-        ),
+        ((index.offset(edit.row, edit.col), index.offset(edit.end_row, edit.end_col), edit.content) for edit in edits),
         reverse=True,
     )
-    result = source
+    offsets = [offset for span_start, span_end, _ in spans for offset in (span_start, span_end)]
+    first, last = index.row_of(min(offsets)), index.row_of(max(offsets))
+    window_start = index.starts[first - 1]
+    window = index.text[window_start : index.line_end(last)]
     for span_start, span_end, content in spans:
-        result = result[:span_start] + content + result[span_end:]
-    return result
+        window = window[: span_start - window_start] + content + window[span_end - window_start :]
+    window_lines = window.split('\n')
+
+    # the fixed file's lines are lines[:first - 1] + window_lines + lines[last:]
+    head = first - 1
+    tail = head + len(window_lines)
+    total = tail + len(index.lines) - last
+    delta = len(window_lines) - (last - first + 1)
+
+    def fixed_line(row_index: int) -> str:
+        if row_index < head:
+            return index.lines[row_index]
+        if row_index < tail:
+            return window_lines[row_index - head]
+        return index.lines[row_index - tail + last]
+
+    return '\n'.join(fixed_line(row_index) for row_index in range(total)[start_row - 1 : end_row + delta])
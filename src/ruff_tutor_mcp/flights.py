@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Callable, Hashable
+
+Item = TypeVar('Item')
+
+# items a flight keeps for callers yet to join; one scan's violations rarely come near it
+MAX_REPLAY_ITEMS = 10_000
+
+
+@dataclass
+class _Flight(Generic[Item]):
+    """One running stream and the items it has produced that some caller may still read."""
+
+    items: list[Item] = field(default_factory=list)
+    # position in the stream of `items[0]`; items are dropped from the front once every caller has read them
+    offset: int = 0
+    # whether new callers may join, replaying the stream from its first item
+    joinable: bool = True
+    done: bool = False
+    error: BaseException | None = None
+    # how many items each caller has read
+    positions: dict[object, int] = field(default_factory=dict)
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+    task: asyncio.Task[None] | None = None
+
+    @property
+    def produced(self) -> int:
+        return self.offset + len(self.items)
+
+    def has_news(self, position: int) -> bool:
+        """Whether a caller that has seen `position` items has anything left to read."""
+        return self.done or position < self.produced
+
+    def release(self) -> None:
+        """Drop the items every caller has read, once no caller can join to replay them."""
+        if self.joinable or not self.positions:
+            return
+        read = min(self.positions.values()) - self.offset
+        # in batches, so a lagging caller does not make every read shift the whole buffer
+        if read and read * 2 >= len(self.items):
+            del self.items[:read]
+            self.offset += read
+
+
+class SingleFlight(Generic[Item]):
+    """Lets concurrent identical streams share one producer.
+
+    The first caller for a key starts the producer in a task of its own;
+    callers arriving while it runs replay what it produced so far and then
+    follow it live. The producer outlives any single caller and is only
+    cancelled once every caller has stopped listening, so one cancelled
+    request never breaks the others. A finished flight is forgotten: the
+    next caller for the same key starts afresh.
+
+    Memory stays bounded: once a flight has produced more than `max_replay`
+    items it is forgotten too, so later callers start their own run, and
+    it drops the items all of its callers have read.
+    """
+
+    def __init__(self, max_replay: int = MAX_REPLAY_ITEMS) -> None:
+        self._flights: dict[Hashable, _Flight[Item]] = {}
+        self._max_replay = max_replay
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def stream(
+        self, key: Hashable, start: Callable[[], AsyncGenerator[Item, None]]
+    ) -> AsyncGenerator[Item, None]:
+        """Yield the items of the flight for `key`, starting it with `start()` if none is running.
+
+        Re-raises the producer's exception, if any, to every caller.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.create_task(self._produce(key, flight, start))
+            self._flights[key] = flight
+        else:
+            logger.debug(f'Joining in-flight scan: {key}')
+        follower = object()
+        position = flight.positions[follower] = 0
+        try:
+            while True:
+                while position < flight.produced:
+                    yield flight.items[position - flight.offset]
+                    position = flight.positions[follower] = position + 1
+                    flight.release()
+                if flight.done:
+                    break
+                async with flight.changed:
+                    await flight.changed.wait_for(partial(flight.has_news, position))
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            del flight.positions[follower]
+            flight.release()
+            if not flight.positions and not flight.done and flight.task is not None:
+                self._forget(key, flight)
+                flight.task.cancel()
+                # the producer's cleanup (killing ruff) is done once the last caller is
+                await asyncio.wait([flight.task])
+
+    async def _produce(
+        self, key: Hashable, flight: _Flight[Item], start: Callable[[], AsyncGenerator[Item, None]]
+    ) -> None:
+        try:
+            async with aclosing(start()) as items:
+                async for item in items:
+                    flight.items.append(item)
+                    if flight.joinable and flight.produced > self._max_replay:
+                        logger.debug(f'Scan produced over {self._max_replay} items, no longer shared: {key}')
+                        flight.joinable = False
+                        self._forget(key, flight)
+                        flight.release()
+                    async with flight.changed:
+                        flight.changed.notify_all()
+        except Exception as e:  # noqa: BLE001 - handed to every caller instead
+            flight.error = e
+        finally:
+            # forgotten before the callers wake, so none of them can join a finished flight
+            self._forget(key, flight)
+            flight.done = True
+            async with flight.changed:
+                flight.changed.notify_all()
+
+    def _forget(self, key: Hashable, flight: _Flight[Item]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
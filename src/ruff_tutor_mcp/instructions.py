@@ -48,12 +48,49 @@ Then ask the user to fix the code. When the user says they are done,
 call `check_my_fix(session_id)` to verify their work.
 """.strip()
 
+MIXED = f"""
+You are a Python coding tutor. The scanned packages use different learning modes
+(see `packages`), so each violation carries the `mode` of its package:
+- "auto": show Before | After and apply the fix to the code yourself.
+- "beginner": show Before | After, but the user must fix the code THEMSELVES.
+- "advanced": `after` is null; do NOT reveal or write the corrected code -
+  explain the underlying principle and let the user work out the fix.
+
+{_COMMON_TEACHING}
+
+A learning session has started for all of them. After applying the auto-mode fixes,
+ask the user to fix the rest. When the user says they are done,
+call `check_my_fix(session_id)` to verify their work.
+""".strip()
+
 CLEAN = 'No violations found. The code is clean! Congratulate the user briefly.'
 
 ERROR = 'Failed to run or parse ruff on the given path. Verify the path points to Python code, then try again.'
 
+TIMEOUT = (
+    'ruff did not finish within the configured `timeout` and was stopped; no attempt was used. '
+    'Check a smaller path (a single directory or file), or raise `timeout` in .ruff-tutor.toml.'
+)
+
+NO_CHANGED_FILES = (
+    'No Python files under the given path differ from the last git commit, so there is nothing to review. '
+    'Tell the user; to review every file instead, call `review_code` again with `scope="all"`.'
+)
+
+GIT_ERROR = (
+    'Could not list the changed files with git: the path may not be inside a git repository, '
+    'or git is not installed. No attempt was used. Call `review_code` with `scope="all"` to review every file.'
+)
+
+BATCH = (
+    'This response holds one review per requested path (`reviews`, each with its `path`). '
+    "Work through them in order, following each review's own `instruction`; each learning session "
+    'has its own `session_id` for `check_my_fix`. To fetch a later page of one review, call '
+    "`review_code` with `cursor` set to that review's `next_cursor`."
+)
+
 SESSION_NOT_FOUND = (
-    'This session no longer exists (the server may have restarted or the session was evicted). '
+    'This session does not exist (the server may have restarted since it was started). '
     'Call `review_code` again to start a fresh session.'
 )
 
@@ -64,6 +101,31 @@ Congratulate the user, then briefly recap what they learned using the `fixed` li
 Respond in the same language as the user's last message.
 """.strip()
 
+NO_CHANGES = """
+No files changed since the last check, so nothing was re-checked and no attempt was used.
+The user may have forgotten to save their edits. Ask them to save the files
+(or to make their fix if they have not yet), then call `check_my_fix(session_id)` again.
+Respond in the same language as the user's last message.
+""".strip()
+
+MORE_PAGES = """
+This response is one page of a larger result (`total` counts all of it; each group's `count` covers all pages).
+Work through this page first. Then fetch the next page by calling the same tool again with the same
+arguments plus `cursor` set to `next_cursor`. Fetching a page does not re-run ruff or use up an attempt.
+""".strip()
+
+TRUNCATED = """
+To keep this response small, some groups show only their first violations in detail; the rest are
+counted in `omitted` (with the files they are in listed in `omitted_files`), and `fixed_omitted` counts
+fixed violations left out of `fixed`. Teach from the detailed examples - the same explanation applies
+to the omitted ones. To see them in detail, check a single file from `omitted_files` or use a smaller `page_size`.
+""".strip()
+
+CURSOR_EXPIRED = (
+    'This page cursor is unknown or has expired (the server keeps only recent results). '
+    'Call the tool again without `cursor` to get a fresh first page.'
+)
+
 _KEEP_TRYING = """
 The user's fix is not complete yet.
 - Praise what was fixed (see `fixed`).
@@ -75,6 +137,11 @@ Respond in the same language as the user's last message.
 
 _KEEP_TRYING_ADVANCED_SUFFIX = 'Still do NOT reveal or write the corrected code - give conceptual hints only.'
 
+_KEEP_TRYING_MIXED_SUFFIX = (
+    "Follow each violation's `mode`: where `after` is null, do NOT reveal or write the corrected code - "
+    'give conceptual hints only.'
+)
+
 ANSWER_REVEALED = """
 The user has reached the retry limit, so the correct fixes are now revealed
 (`after` values are included in `remaining` and `new`).
@@ -92,12 +159,40 @@ SESSION_ENDED = (
 
 
 def lesson_instruction(mode: str) -> str:
-    """Return the instruction for a new lesson in the given mode."""
+    """Return the instruction for a new lesson in the given mode (`mixed` when packages differ)."""
+    if mode == 'mixed':
+        return MIXED
     return BEGINNER if mode == 'beginner' else ADVANCED
 
 
 def keep_trying_instruction(mode: str) -> str:
-    """Return the keep-trying instruction, hardened for advanced mode."""
+    """Return the keep-trying instruction, hardened for advanced and mixed modes."""
     if mode == 'advanced':
         return f'{_KEEP_TRYING}\n{_KEEP_TRYING_ADVANCED_SUFFIX}'
+    if mode == 'mixed':
+        return f'{_KEEP_TRYING}\n{_KEEP_TRYING_MIXED_SUFFIX}'
     return _KEEP_TRYING
+
+
+_EVICTION_CAUSES = {
+    'idle': 'it was not used for longer than `session_ttl_hours`',
+    'memory': 'the server needed its memory for more recently used sessions (see `session_memory_mb`)',
+}
+
+
+def evicted_instruction(reason: str) -> str:
+    """Return the instruction for a session the server dropped before it was ended."""
+    cause = _EVICTION_CAUSES.get(reason, 'the server dropped it')
+    return (
+        f'This session was evicted: {cause}. Its progress is gone. '
+        'Tell the user, then call `review_code` again to start a fresh session.'
+    )
+
+
+def unknown_rules_instruction(selectors: list[str]) -> str:
+    """Return the instruction for `select`/`ignore` entries that match no ruff rule."""
+    return (
+        f'No ruff rule code starts with: {", ".join(selectors)}, so nothing was checked. '
+        'Use rule codes or prefixes such as "PERF", "B" or "E712" (`explain_rule` shows a rule), '
+        "or leave `select` and `ignore` out to use the project's rules."
+    )
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from ruff_tutor_mcp.models import MemoUsage
+
+if TYPE_CHECKING:
+    from ruff_tutor_mcp.ruff_runner import RuleSelection
+    from ruff_tutor_mcp.sessions import Inspected
+    from ruff_tutor_mcp.snapshots import Snapshot
+
+MAX_MEMO_ENTRIES = 32
+MAX_MEMO_BYTES = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ScanKey:
+    """Everything a full scan's result depends on."""
+
+    # resolved scan path
+    path: str
+    backend: str
+    # content digest of every source and ruff config in scope (`Snapshot.digest`)
+    tree: str
+    ruff_version: str
+    # rules the scan was narrowed to; None for the project's own selection
+    rules: RuleSelection | None = None
+
+
+@dataclass
+class MemoStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class _MemoEntry:
+    items: list[Inspected]
+    snapshot: Snapshot
+    size: int
+
+
+@dataclass
+class ScanMemo:
+    """Recent full-scan results, keyed by what they depend on, with least-recently-used eviction.
+
+    Repeating `review_code` on an unchanged project (a retry, another mode)
+    is answered without running ruff. Entries are dropped oldest first once
+    there are more than `max_entries` or their estimated size passes
+    `max_bytes`; a single result larger than `max_bytes` is not kept. The
+    returned lists are shared, so callers must not modify them.
+    """
+
+    max_entries: int = MAX_MEMO_ENTRIES
+    max_bytes: int = MAX_MEMO_BYTES
+    stats: MemoStats = field(default_factory=MemoStats)
+    _entries: OrderedDict[ScanKey, _MemoEntry] = field(default_factory=OrderedDict)
+
+    def __contains__(self, key: object) -> bool:
+        """Whether `key` is memoized; unlike `get`, neither counted nor made recent."""
+        return key in self._entries
+
+    def get(self, key: ScanKey) -> list[Inspected] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        logger.debug(f'Scan memo hit for {key.path} ({self.stats.hits} hits / {self.stats.misses} misses)')
+        return entry.items
+
+    def put(self, key: ScanKey, snapshot: Snapshot, items: list[Inspected]) -> None:
+        size = sum(item.estimated_size for item in items)
+        if size > self.max_bytes:
+            logger.debug(f'Not memoizing scan of {key.path}: ~{size} bytes')
+            return
+        self._drop(key)
+        self._entries[key] = _MemoEntry(items=items, snapshot=snapshot, size=size)
+        self.stats.bytes += size
+        while len(self._entries) > self.max_entries or self.stats.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats.evictions += 1
+            logger.debug(f'Evicted memoized scan: {oldest.path}')
+        self.stats.entries = len(self._entries)
+
+    def usage(self) -> MemoUsage:
+        return MemoUsage(max_entries=self.max_entries, max_bytes=self.max_bytes, **asdict(self.stats))
+
+    def latest_snapshot(self, path: str) -> Snapshot | None:
+        """Return the snapshot of the most recent memoized scan of `path`, to reuse its digests."""
+        for key in reversed(self._entries):
+            if key.path == path:
+                return self._entries[key].snapshot
+        return None
+
+    def _drop(self, key: ScanKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.stats.bytes -= entry.size
+        self.stats.entries = len(self._entries)
@@ -60,6 +60,8 @@ class ViolationDetail(BaseModel):
     fixable: bool = False
     # ruff's fix applicability ("safe" / "unsafe" / ...); unsafe fixes may change behavior
     fix_applicability: str | None = None
+    # learning mode of the violation's package; set only when the packages of a scan use different modes
+    mode: str | None = None
 
 
 class ViolationGroup(BaseModel):
@@ -75,6 +77,9 @@ class ViolationGroup(BaseModel):
     url: str | None = None
     count: int
     violations: list[ViolationDetail]
+    # violations summarized to keep the response within its size budget
+    omitted: int = 0
+    omitted_files: list[str] = Field(default_factory=list)
 
 
 class ViolationRef(BaseModel):
@@ -86,6 +91,15 @@ class ViolationRef(BaseModel):
     message: str
 
 
+class PackageConfig(BaseModel):
+    """Learning settings of one package with its own `.ruff-tutor.toml`."""
+
+    # directory of the package's config file, relative to the scanned path when inside it
+    path: str
+    mode: str
+    max_retry: int
+
+
 class ReviewResponse(BaseModel):
     """Result of the `review_code` tool.
 
@@ -93,24 +107,43 @@ class ReviewResponse(BaseModel):
     carries a `session_id` for the `check_my_fix` learning loop.
     """
 
-    status: Literal['clean', 'violations_found', 'error']
+    status: Literal['clean', 'violations_found', 'timeout', 'error']
     mode: str
     total: int
     groups: list[ViolationGroup] = Field(default_factory=list)
     session_id: str | None = None
     max_retry: int | None = None
+    # set when the scan spans packages with different settings; `mode` is then "mixed" and `max_retry` the largest
+    packages: list[PackageConfig] = Field(default_factory=list)
+    # set when `groups` is one page of a larger result; pass it back as `cursor`
+    next_cursor: str | None = None
+    # the reviewed path; set in `review_paths` results
+    path: str | None = None
+    instruction: str
+
+
+class BatchReviewResponse(BaseModel):
+    """Result of the `review_paths` tool: one review per requested path, from a shared ruff run."""
+
+    reviews: list[ReviewResponse] = Field(default_factory=list)
     instruction: str
 
 
 class Progress(BaseModel):
     """Result of the `check_my_fix` tool."""
 
-    verdict: Literal['passed', 'keep_trying', 'answer_revealed', 'session_not_found', 'error']
+    verdict: Literal[
+        'passed', 'keep_trying', 'answer_revealed', 'no_changes', 'timeout', 'evicted', 'session_not_found', 'error'
+    ]
     attempts: int
     max_retry: int
     fixed: list[ViolationRef] = Field(default_factory=list)
+    # fixed violations left out of `fixed` to keep the response within its size budget
+    fixed_omitted: int = 0
     remaining: list[ViolationGroup] = Field(default_factory=list)
     new: list[ViolationGroup] = Field(default_factory=list)
+    # set when `remaining`/`new` are one page of a larger result; pass it back as `cursor`
+    next_cursor: str | None = None
     instruction: str
 
 
@@ -123,3 +156,37 @@ class SessionSummary(BaseModel):
     attempts: int
     rules_covered: list[str] = Field(default_factory=list)
     instruction: str
+
+
+class SessionUsage(BaseModel):
+    """Learning sessions held by the server, against the session store's limits."""
+
+    store: Literal['memory', 'sqlite']
+    sessions: int
+    # estimated size in memory; for the sqlite store, the size of the stored session data
+    bytes: int
+    # None where the store has no such limit
+    max_sessions: int | None = None
+    max_bytes: int | None = None
+    idle_ttl_seconds: float
+    # sessions dropped for idleness or memory since the server started
+    evictions: int = 0
+
+
+class MemoUsage(BaseModel):
+    """Full-scan results kept for reuse, against the memo's limits."""
+
+    entries: int
+    bytes: int
+    max_entries: int
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class Diagnostics(BaseModel):
+    """Result of the `diagnostics` tool."""
+
+    sessions: SessionUsage
+    scan_memo: MemoUsage
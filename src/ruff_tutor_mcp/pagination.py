@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from ruff_tutor_mcp import instructions
+from ruff_tutor_mcp.budget import Shaped, fit_to_budget, headers_fit, response_sections, with_sections
+from ruff_tutor_mcp.models import Progress, ReviewResponse, ViolationGroup
+
+# violations per page when the caller does not ask for a size
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# full results kept for paging; the oldest is dropped first, expiring its cursors
+MAX_PAGED_RESULTS = 16
+
+
+def paginate(
+    sections: list[list[ViolationGroup]], offset: int, page_size: int
+) -> tuple[list[list[ViolationGroup]], int | None]:
+    """Cut the violations [offset, offset + page_size) out of consecutive group lists.
+
+    Violations are counted across all groups of all sections in order. A group
+    split over several pages appears on each with its full `count`. Returns
+    the page's groups per section and the next page's offset, or None on the
+    last page.
+    """
+    end = offset + page_size
+    position = 0
+    pages: list[list[ViolationGroup]] = []
+    for groups in sections:
+        page: list[ViolationGroup] = []
+        for group in groups:
+            group_end = position + len(group.violations)
+            if group_end > offset and position < end:
+                sliced = group.violations[max(offset - position, 0) : end - position]
+                page.append(group.model_copy(update={'violations': sliced}))
+            position = group_end
+        pages.append(page)
+    return pages, end if end < position else None
+
+
+@dataclass
+class _PagedResult:
+    response: ReviewResponse | Progress
+    # session a `check_my_fix` result belongs to; its cursors only work for that session
+    owner: str | None
+
+
+@dataclass
+class ResultPages:
+    """Full tool results held server-side so later pages are served without re-running ruff."""
+
+    max_results: int = MAX_PAGED_RESULTS
+    _results: OrderedDict[str, _PagedResult] = field(default_factory=OrderedDict)
+
+    def first(
+        self, response: Shaped, page_size: int | None = None, owner: str | None = None, max_bytes: int | None = None
+    ) -> Shaped:
+        """Return the first page of `response`, keeping the rest for `next_cursor`.
+
+        A response that fits on one page is not kept. Every page is shrunk to
+        `max_bytes` (see `fit_to_budget`), and ends early when the headers of
+        its groups alone would not fit.
+        """
+        size = _page_size(page_size)
+        total = sum(len(group.violations) for groups in response_sections(response) for group in groups)
+        if total <= size and headers_fit(response, max_bytes) is None:
+            return fit_to_budget(response, max_bytes)
+        result_id = uuid.uuid4().hex[:8]
+        self._results[result_id] = _PagedResult(response=response, owner=owner)
+        while len(self._results) > self.max_results:
+            evicted_id, _ = self._results.popitem(last=False)
+            logger.debug(f'Dropped paged result: {evicted_id}')
+        return self._page(response, result_id, 0, size, max_bytes)
+
+    def next(
+        self,
+        cursor: str,
+        kind: type[Shaped],
+        page_size: int | None = None,
+        owner: str | None = None,
+        max_bytes: int | None = None,
+    ) -> Shaped | None:
+        """Return the page `cursor` points at, or None when it is unknown, expired or not `owner`'s."""
+        result_id, _, raw_offset = cursor.partition(':')
+        result = self._results.get(result_id)
+        if result is None or not raw_offset.isdigit() or result.owner != owner:
+            return None
+        if not isinstance(result.response, kind):
+            return None
+        self._results.move_to_end(result_id)
+        return self._page(result.response, result_id, int(raw_offset), _page_size(page_size), max_bytes)
+
+    def _page(self, response: Shaped, result_id: str, offset: int, page_size: int, max_bytes: int | None) -> Shaped:
+        pages, next_offset = paginate(response_sections(response), offset, page_size)
+        page = with_sections(response, pages)
+        fitting = headers_fit(page, max_bytes)
+        if fitting is not None:
+            # too many groups for the budget even without details; the rest go to the next page
+            pages, next_offset = paginate(response_sections(response), offset, fitting)
+            page = with_sections(response, pages)
+        if next_offset is not None:
+            page = page.model_copy(
+                update={
+                    'next_cursor': f'{result_id}:{next_offset}',
+                    'instruction': f'{response.instruction}\n\n{instructions.MORE_PAGES}',
+                }
+            )
+        return fit_to_budget(page, max_bytes)
+
+
+def _page_size(page_size: int | None) -> int:
+    if page_size is None:
+        return DEFAULT_PAGE_SIZE
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
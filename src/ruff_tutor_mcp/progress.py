@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import time
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    # (progress, total, message), the signature of FastMCP's `Context.report_progress`
+    ProgressHook = Callable[[float, float | None, str | None], Awaitable[None]]
+
+PROGRESS_TOTAL = 100.0
+
+# minimum seconds between notifications within a stage; stage changes are always sent
+MIN_INTERVAL_SECONDS = 0.25
+
+
+class Stage(Enum):
+    """Stages of a scan, as (start, end) shares of `PROGRESS_TOTAL`."""
+
+    RUFF = (0.0, 60.0)
+    ENRICH = (60.0, 90.0)
+    GROUP = (90.0, 100.0)
+
+
+class ScanProgress:
+    """Turns a scan's stages into MCP progress notifications.
+
+    Keeps the reported value strictly increasing, as MCP requires, and
+    throttles updates so a scan of many files does not flood the client.
+    Without a hook (the client sent no progress token) every call is a no-op.
+    """
+
+    def __init__(self, hook: ProgressHook | None = None) -> None:
+        self._hook = hook
+        self._last_value = -1.0
+        self._last_stage: Stage | None = None
+        self._last_sent = 0.0
+
+    async def update(self, stage: Stage, done: int = 0, total: int | None = None, message: str | None = None) -> None:
+        """Report `done` units of `stage` out of `total`.
+
+        With an unknown total the bar creeps towards the end of the stage
+        without reaching it. A stage's end is the next stage's start, so
+        finishing a stage need not be reported: the next stage's first
+        update says it.
+        """
+        if self._hook is None:
+            return
+        start, end = stage.value
+        fraction = min(done / total, 1.0) if total else done / (done + 1)
+        value = start + (end - start) * fraction
+        now = time.monotonic()
+        if value <= self._last_value:
+            return
+        if stage is self._last_stage and now - self._last_sent < MIN_INTERVAL_SECONDS and value < end:
+            return
+        self._last_value, self._last_stage, self._last_sent = value, stage, now
+        try:
+            await self._hook(value, PROGRESS_TOTAL, message)
+        except Exception as e:  # noqa: BLE001 - progress is best effort; the scan must go on
+            logger.debug(f'Failed to send progress notification: {e}')
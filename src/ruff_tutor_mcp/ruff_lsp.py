@@ -0,0 +1,481 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Protocol
+
+from loguru import logger
+from pydantic import ValidationError
+from ruff.__main__ import find_ruff_bin
+
+from ruff_tutor_mcp.flights import SingleFlight
+from ruff_tutor_mcp.models import FixEdit, RuffFix, RuffViolation
+from ruff_tutor_mcp.progress import ScanProgress, Stage
+from ruff_tutor_mcp.ruff_runner import (
+    SYNTAX_ERROR_CODE,
+    RuffError,
+    RuffRunner,
+    RuffTimeoutError,
+    RuleSelection,
+    kill_process_group,
+)
+from ruff_tutor_mcp.snapshots import RUFF_CONFIG_FILE_NAMES, is_ruff_config, scope_files, tree_state
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Awaitable, Callable, Iterable
+
+# the server does not report fix applicability
+UNKNOWN_APPLICABILITY = 'unknown'
+
+# files diagnosed concurrently within one scan
+DIAGNOSTIC_WINDOW = 32
+
+# how long `ruff server` gets to exit after `shutdown`/`exit` before it is killed
+SHUTDOWN_TIMEOUT_SECONDS = 5
+
+# LSP FileChangeType values
+FILE_CREATED, FILE_CHANGED, FILE_DELETED = 1, 2, 3
+
+# notebooks need LSP notebook-document sync; only plain sources are opened
+LSP_SOURCE_SUFFIXES = frozenset({'.py', '.pyi'})
+
+# source lists kept, one per checked paths and tree state
+MAX_SOURCE_LISTS = 16
+
+# checked paths (resolved), force_exclude, and the tree state of the paths
+_CheckKey = tuple[tuple[str, ...], bool, str]
+
+
+class LspError(RuffError):
+    """The connection to `ruff server` failed or the server returned an error."""
+
+
+class LspWriter(Protocol):
+    def write(self, data: bytes) -> None: ...
+
+    async def drain(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class LspConnection:
+    """A minimal LSP client: JSON-RPC messages with Content-Length framing over a byte stream pair.
+
+    Requests sent by the server (capability registration, progress tokens)
+    are acknowledged with a null result; its notifications are ignored.
+    Must be created inside the event loop that will use it.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: LspWriter,
+        process: asyncio.subprocess.Process | None = None,
+    ) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._process = process
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future[Any]] = {}
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    @property
+    def closed(self) -> bool:
+        return self._read_task.done()
+
+    async def request(self, method: str, params: Any = None) -> Any:  # noqa: ANN401
+        """Send a request and wait for its result; raises LspError on failure."""
+        if self.closed:
+            raise LspError('ruff server connection is closed')
+        request_id = next(self._ids)
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._send({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def notify(self, method: str, params: Any = None) -> None:  # noqa: ANN401
+        await self._send({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    def kill(self) -> None:
+        """Terminate the peer immediately, e.g. when its event loop is gone."""
+        if self._process is not None and self._process.returncode is None:
+            kill_process_group(self._process)
+
+    async def close(self) -> None:
+        """Shut the server down politely, killing it if it does not exit in time."""
+        if not self.closed:
+            with contextlib.suppress(LspError, TimeoutError):
+                async with asyncio.timeout(SHUTDOWN_TIMEOUT_SECONDS):
+                    await self.request('shutdown')
+                    await self.notify('exit')
+        self._writer.close()
+        if self._process is not None:
+            try:
+                async with asyncio.timeout(SHUTDOWN_TIMEOUT_SECONDS):
+                    await self._process.wait()
+            except TimeoutError:
+                self.kill()
+                await self._process.wait()
+        self._read_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._read_task
+
+    async def _send(self, message: dict[str, Any]) -> None:
+        body = json.dumps(message).encode('utf-8')
+        try:
+            self._writer.write(b'Content-Length: %d\r\n\r\n%b' % (len(body), body))
+            await self._writer.drain()
+        except (ConnectionError, OSError, RuntimeError) as e:
+            raise LspError(f'failed to write to ruff server: {e}') from e
+
+    async def _read_loop(self) -> None:
+        try:
+            while (message := await self._read_message()) is not None:
+                await self._dispatch(message)
+        except (asyncio.IncompleteReadError, ValueError, TypeError, LspError) as e:
+            logger.warning(f'ruff server connection broke: {e}')
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(LspError('ruff server connection closed'))
+
+    async def _read_message(self) -> dict[str, Any] | None:
+        length: int | None = None
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                return None
+            if not line.strip():
+                break
+            name, _, value = line.decode('ascii').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        if length is None:
+            raise ValueError('message without Content-Length header')
+        message = json.loads(await self._reader.readexactly(length))
+        if not isinstance(message, dict):
+            raise TypeError(f'unexpected message: {message!r}')
+        return message
+
+    async def _dispatch(self, message: dict[str, Any]) -> None:
+        if 'method' in message:
+            if 'id' in message:
+                await self._send({'jsonrpc': '2.0', 'id': message['id'], 'result': None})
+            return
+        future = self._pending.get(message.get('id', -1))
+        if future is None or future.done():
+            return
+        if 'error' in message:
+            future.set_exception(LspError(f'ruff server error: {message["error"].get("message", message["error"])}'))
+        else:
+            future.set_result(message.get('result'))
+
+
+class RuffServerRunner:
+    """Diagnostics from one long-lived `ruff server` process, spoken to over LSP.
+
+    An alternative backend to `RuffRunner.stream_check` that pays ruff's
+    startup and configuration discovery once rather than on every call.
+    Files are opened in the server, diagnosed with pull diagnostics and closed
+    again, a bounded window at a time, and the results are mapped onto the
+    same `RuffViolation`/`FixEdit` models as the CLI. The server does not
+    report fix applicability, so fixes carry `applicability='unknown'`.
+    The files to open are listed by `ruff check --show-files`.
+    """
+
+    def __init__(self, connect: Callable[[], Awaitable[LspConnection]] | None = None) -> None:
+        self._connect = connect or self._spawn
+        self._connection: LspConnection | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock: asyncio.Lock | None = None
+        # workspace folders registered with the server, and the config file
+        # states it last saw; the server only reloads config when told to
+        self._workspaces: set[str] = set()
+        self._configs: dict[str, tuple[int, int]] = {}
+        self._flights: SingleFlight[RuffViolation] = SingleFlight()
+        self._cli = RuffRunner()
+        self._sources: OrderedDict[_CheckKey, list[Path]] = OrderedDict()
+
+    async def stream_check(
+        self,
+        *paths: str,
+        force_exclude: bool = False,
+        workspace: str | None = None,
+        progress: ScanProgress | None = None,
+        time_limit: float | None = None,
+        rules: RuleSelection | None = None,
+    ) -> AsyncGenerator[RuffViolation, None]:
+        """Yield violations for `paths` file by file, in path order.
+
+        Same contract as `RuffRunner.stream_check`. The files opened are
+        those the CLI would lint, so the project's `exclude` settings and
+        .gitignore apply alike; the list is kept until a file in scope
+        changes. `rules` is accepted for parity only: the server applies the
+        project's rule selection, so narrowed checks belong to the CLI.
+        Raises RuffError when the server or the file listing fails.
+        `progress` hears about every file the server has checked.
+
+        The `time_limit` clock starts once this call has the server to itself.
+        A server that misses the deadline is killed (it may be stuck) and
+        restarted by the next call. Identical checks running at the same time
+        are shared like the CLI's; only the first caller hears per-file progress.
+        """
+        del rules
+        progress = progress or ScanProgress()
+        key: _CheckKey = (
+            tuple(str(Path(path).resolve()) for path in paths),
+            force_exclude,
+            await asyncio.to_thread(tree_state, *paths),
+        )
+        if self._flights.in_flight(key):
+            await progress.update(Stage.RUFF, message='Waiting for an identical ruff server check in progress')
+        else:
+            await progress.update(Stage.RUFF, message='Starting ruff server')
+        run = self._flights.stream(key, lambda: self._check(key, paths, workspace, progress, time_limit))
+        async with contextlib.aclosing(run) as violations:
+            async for violation in violations:
+                yield violation
+
+    async def _check(
+        self,
+        key: _CheckKey,
+        paths: tuple[str, ...],
+        workspace: str | None,
+        progress: ScanProgress,
+        time_limit: float | None,
+    ) -> AsyncGenerator[RuffViolation, None]:
+        sources = await self._list_sources(key, paths, time_limit)
+        configs = await asyncio.to_thread(_configs, paths)
+        async with self._lock_for_running_loop():
+            deadline = None if time_limit is None else asyncio.get_running_loop().time() + time_limit
+            try:
+                async with asyncio.timeout_at(deadline):
+                    connection = await self._ensure_started()
+                    await self._sync_workspace(
+                        connection, Path(workspace or next(iter(paths), '.')).resolve(), configs
+                    )
+                async for violation in self._diagnose_all(connection, sources, progress, deadline):
+                    yield violation
+            except TimeoutError as e:
+                # the server may be stuck; the next call starts a fresh one
+                if self._connection is not None:
+                    self._connection.kill()
+                    self._connection = None
+                raise RuffTimeoutError(f'ruff server did not answer within {time_limit} seconds') from e
+
+    async def _list_sources(self, key: _CheckKey, paths: tuple[str, ...], time_limit: float | None) -> list[Path]:
+        """Return the sources under `paths` to diagnose, sorted, as listed by ruff for this tree state."""
+        sources = self._sources.get(key)
+        if sources is None:
+            _, force_exclude, _ = key
+            files = await self._cli.list_files(*paths, force_exclude=force_exclude, time_limit=time_limit)
+            sources = sorted({file for file in files if file.suffix in LSP_SOURCE_SUFFIXES})
+            self._sources[key] = sources
+            while len(self._sources) > MAX_SOURCE_LISTS:
+                self._sources.popitem(last=False)
+        self._sources.move_to_end(key)
+        return sources
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    def _lock_for_running_loop(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or loop is not self._loop:
+            # the connection and lock belong to one event loop; a new loop starts afresh
+            if self._connection is not None:
+                self._connection.kill()
+                self._connection = None
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _ensure_started(self) -> LspConnection:
+        if self._connection is not None and not self._connection.closed:
+            return self._connection
+        if self._connection is not None:
+            logger.warning('ruff server exited; restarting it')
+        self._workspaces.clear()
+        self._configs.clear()
+        connection = await self._connect()
+        try:
+            await self._initialize(connection)
+        except LspError:
+            await connection.close()
+            raise
+        self._connection = connection
+        logger.info('Started ruff server')
+        return connection
+
+    async def _initialize(self, connection: LspConnection) -> None:
+        result = await connection.request(
+            'initialize',
+            {
+                'processId': os.getpid(),
+                'rootUri': None,
+                'capabilities': {
+                    # code point offsets index Python strings directly, like the CLI's columns
+                    'general': {'positionEncodings': ['utf-32']},
+                    'textDocument': {'diagnostic': {'dynamicRegistration': False}},
+                    'workspace': {
+                        'workspaceFolders': True,
+                        'didChangeWatchedFiles': {'dynamicRegistration': True},
+                    },
+                },
+            },
+        )
+        encoding = ((result or {}).get('capabilities') or {}).get('positionEncoding', 'utf-16')
+        if encoding != 'utf-32':
+            raise LspError(f'ruff server does not support utf-32 positions (got {encoding})')
+        await connection.notify('initialized', {})
+
+    async def _sync_workspace(self, connection: LspConnection, scan_root: Path, configs: list[Path]) -> None:
+        root = _project_root(scan_root)
+        registered = str(root) in self._workspaces
+        if not registered:
+            await connection.notify(
+                'workspace/didChangeWorkspaceFolders',
+                {'event': {'added': [{'uri': root.as_uri(), 'name': root.name or str(root)}], 'removed': []}},
+            )
+            self._workspaces.add(str(root))
+
+        changes: list[dict[str, Any]] = []
+        for config in configs:
+            try:
+                stat = config.stat()
+            except OSError:
+                continue
+            state = (stat.st_mtime_ns, stat.st_size)
+            known = self._configs.get(str(config))
+            if known is None and registered:
+                changes.append({'uri': config.as_uri(), 'type': FILE_CREATED})
+            elif known is not None and known != state:
+                changes.append({'uri': config.as_uri(), 'type': FILE_CHANGED})
+            self._configs[str(config)] = state
+        for path in [path for path in self._configs if not Path(path).exists()]:
+            changes.append({'uri': Path(path).as_uri(), 'type': FILE_DELETED})
+            del self._configs[path]
+        if changes:
+            logger.debug(f'Notifying ruff server of {len(changes)} config change(s)')
+            await connection.notify('workspace/didChangeWatchedFiles', {'changes': changes})
+
+    async def _diagnose_all(
+        self, connection: LspConnection, files: list[Path], progress: ScanProgress, deadline: float | None = None
+    ) -> AsyncGenerator[RuffViolation, None]:
+        remaining = iter(files)
+        in_flight = deque(
+            asyncio.create_task(self._diagnose(connection, file))
+            for file in itertools.islice(remaining, DIAGNOSTIC_WINDOW)
+        )
+        done = 0
+        try:
+            while in_flight:
+                async with asyncio.timeout_at(deadline):
+                    violations = await in_flight.popleft()
+                done += 1
+                await progress.update(Stage.RUFF, done, len(files), f'ruff checked {done}/{len(files)} files')
+                if (file := next(remaining, None)) is not None:
+                    in_flight.append(asyncio.create_task(self._diagnose(connection, file)))
+                for violation in violations:
+                    yield violation
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def _diagnose(self, connection: LspConnection, file: Path) -> list[RuffViolation]:
+        try:
+            text = file.read_bytes().decode('utf-8', errors='replace')
+        except OSError:
+            logger.warning(f'Failed to read file: {file}')
+            return []
+        document = {'uri': file.as_uri()}
+        await connection.notify(
+            'textDocument/didOpen',
+            {'textDocument': {**document, 'languageId': 'python', 'version': 1, 'text': text}},
+        )
+        try:
+            report = await connection.request('textDocument/diagnostic', {'textDocument': document})
+        finally:
+            with contextlib.suppress(LspError):
+                await connection.notify('textDocument/didClose', {'textDocument': document})
+        try:
+            violations = [_to_violation(str(file), item) for item in (report or {}).get('items', [])]
+        except (AttributeError, KeyError, TypeError, ValidationError) as e:
+            raise LspError(f'unparsable diagnostics for {file}: {e}') from e
+        return sorted(violations, key=lambda violation: (violation.row, violation.col))
+
+    async def _spawn(self) -> LspConnection:
+        command = [find_ruff_bin(), 'server']
+        logger.debug(f'Running: {" ".join(command)}')
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            start_new_session=True,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            # ruff server logs to stderr; nobody reads it, so it must not fill a pipe
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        assert process.stdout is not None
+        assert process.stdin is not None
+        return LspConnection(process.stdout, process.stdin, process=process)
+
+
+def _configs(paths: Iterable[str]) -> list[Path]:
+    """Return the ruff configs affecting `paths`; the server is told when one of them changes."""
+    configs: dict[Path, None] = {}
+    for path in paths:
+        for file in scope_files(Path(path).resolve()):
+            if is_ruff_config(str(file)):
+                configs[file] = None
+    return list(configs)
+
+
+def _project_root(scan_root: Path) -> Path:
+    """Return the nearest directory at or above `scan_root` holding a ruff config.
+
+    Registered as the server's workspace folder so that config edits inside
+    it can be reloaded.
+    """
+    start = scan_root.parent if scan_root.is_file() else scan_root
+    for directory in [start, *start.parents]:
+        if any((directory / name).is_file() for name in RUFF_CONFIG_FILE_NAMES):
+            return directory
+    return start
+
+
+def _to_violation(filename: str, item: dict[str, Any]) -> RuffViolation:
+    start, end = item['range']['start'], item['range']['end']
+    code = item.get('code')
+    data = item.get('data') or {}
+    edits = [
+        FixEdit(
+            content=edit['newText'],
+            row=edit['range']['start']['line'] + 1,
+            col=edit['range']['start']['character'] + 1,
+            end_row=edit['range']['end']['line'] + 1,
+            end_col=edit['range']['end']['character'] + 1,
+        )
+        for edit in data.get('edits') or []
+    ]
+    return RuffViolation(
+        code=SYNTAX_ERROR_CODE if code is None else str(code),
+        message=item['message'],
+        filename=filename,
+        row=start['line'] + 1,
+        col=start['character'] + 1,
+        end_row=end['line'] + 1,
+        end_col=end['character'] + 1,
+        url=(item.get('codeDescription') or {}).get('href'),
+        fix=RuffFix(applicability=UNKNOWN_APPLICABILITY, message=data.get('title'), edits=edits) if edits else None,
+    )
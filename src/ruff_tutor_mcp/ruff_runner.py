@@ -1,77 +1,368 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import json
+import os
+import signal
 import subprocess
-from typing import Any
+import sys
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 from loguru import logger
 from pydantic import ValidationError
 from ruff.__main__ import find_ruff_bin
 
+from ruff_tutor_mcp.cache import RuffCacheDirs, RuleDocCache
+from ruff_tutor_mcp.flights import SingleFlight
 from ruff_tutor_mcp.models import FixEdit, RuffFix, RuffViolation, RuleDoc
+from ruff_tutor_mcp.progress import ScanProgress, Stage
+from ruff_tutor_mcp.snapshots import tree_state
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
 
 RUFF_DOCS_BASE = 'https://docs.astral.sh/ruff/rules'
 
 # ruff reports syntax errors with "code": null
 SYNTAX_ERROR_CODE = 'syntax-error'
 
+# ruff check exits 0 (clean) or 1 (violations found); anything else is a failure
+CHECK_OK_RETURNCODES = (0, 1)
+
+# per-line buffer limit for streamed output; one json-lines record carries a
+# whole fix, which can be far beyond asyncio's 64 KiB default for big rewrites
+STREAM_LINE_LIMIT = 64 * 1024 * 1024
+
+
+# how often stale ruff cache directories are looked for, at most
+CACHE_PRUNE_INTERVAL_SECONDS = 60 * 60
+
+# deadline for one-off ruff calls such as loading the rule catalogue
+RUN_TIMEOUT_SECONDS = 60
+
+
+class RuffError(Exception):
+    """ruff failed to run or produced output that could not be parsed."""
+
+
+class RuffTimeoutError(RuffError):
+    """ruff did not finish before its deadline and was killed."""
+
+
+@dataclass(frozen=True)
+class RuleSelection:
+    """Rules a check is narrowed to, on top of the project's own ruff configuration.
+
+    Each entry is a rule code or prefix as ruff accepts it (`PERF`, `B006`,
+    `ALL`). `select` replaces the project's selection; `ignore` is added to
+    its ignores.
+    """
+
+    select: tuple[str, ...] = ()
+    ignore: tuple[str, ...] = ()
+
+    @property
+    def args(self) -> list[str]:
+        """The `ruff check` options applying this selection."""
+        args: list[str] = []
+        if self.select:
+            args.append(f'--select={",".join(self.select)}')
+        if self.ignore:
+            args.append(f'--extend-ignore={",".join(self.ignore)}')
+        return args
+
 
 class RuffRunner:
     """Runs the bundled ruff binary and parses its JSON output.
 
     The target project's own ruff configuration (pyproject.toml / ruff.toml)
     is still respected because ruff resolves it from the checked path.
+    ruff runs as an asyncio subprocess, so a slow scan never blocks other
+    tool calls on the server's event loop.
     """
 
     def __init__(self) -> None:
         self._ruff_bin = find_ruff_bin()
-        self._rule_cache: dict[str, RuleDoc | None] = {}
+        self._rules: dict[str, RuleDoc] | None = None
+        # the catalogue load in progress, shared by every caller that needs it meanwhile
+        self._rules_loading: asyncio.Future[dict[str, RuleDoc] | None] | None = None
+        self._rule_doc_cache = RuleDocCache(self._ruff_bin)
+        self._ruff_caches = RuffCacheDirs()
+        self._pruned_at: float | None = None
+        self._flights: SingleFlight[RuffViolation] = SingleFlight()
+
+    async def check(
+        self,
+        *paths: str,
+        force_exclude: bool = False,
+        workspace: str | None = None,
+        progress: ScanProgress | None = None,
+        time_limit: float | None = None,
+        rules: RuleSelection | None = None,
+    ) -> list[RuffViolation] | None:
+        """Run `ruff check` and return all violations, or None when ruff fails.
 
-    def check(self, path: str) -> list[RuffViolation] | None:
-        """Run `ruff check` and return violations, or None on unparsable output."""
-        result = self._run(['check', path, '--output-format=json', '--no-cache'])
+        Raises RuffTimeoutError when ruff runs past `time_limit` seconds.
+        """
+        stream = self.stream_check(
+            *paths,
+            force_exclude=force_exclude,
+            workspace=workspace,
+            progress=progress,
+            time_limit=time_limit,
+            rules=rules,
+        )
         try:
-            raw = json.loads(result.stdout)
-        except json.JSONDecodeError:
-            logger.warning(f'Failed to parse ruff check output: {result.stderr.strip()}')
+            return [violation async for violation in stream]
+        except RuffTimeoutError:
+            raise
+        except RuffError as e:
+            logger.warning(f'Failed to parse ruff check output: {e}')
             return None
-        return [self._to_violation(item) for item in raw]
 
-    def rule(self, code: str) -> RuleDoc | None:
-        """Fetch rule documentation via `ruff rule`, cached per process."""
-        if code in self._rule_cache:
-            return self._rule_cache[code]
+    async def stream_check(
+        self,
+        *paths: str,
+        force_exclude: bool = False,
+        workspace: str | None = None,
+        progress: ScanProgress | None = None,
+        time_limit: float | None = None,
+        rules: RuleSelection | None = None,
+    ) -> AsyncGenerator[RuffViolation, None]:
+        """Run `ruff check` and yield violations as they are read from its output.
 
-        result = self._run(['rule', code, '--output-format=json'])
-        doc: RuleDoc | None
-        try:
-            raw = json.loads(result.stdout)
-            name = raw.get('name', '')
-            doc = RuleDoc(
-                code=code,
-                name=name,
-                summary=raw.get('summary', ''),
-                explanation=raw.get('explanation', ''),
-                fix_availability=raw.get('fix_availability', ''),
-                url=f'{RUFF_DOCS_BASE}/{name}/' if name else None,
-            )
-        except (json.JSONDecodeError, AttributeError, ValidationError):
-            logger.warning(f'Failed to fetch rule documentation for {code}: {result.stderr.strip()}')
-            doc = None
+        ruff's `json-lines` output is parsed one record at a time, so the full
+        report is never held as a single string or decoded JSON list. ruff
+        sorts its output by file, so all violations for one file arrive
+        together. Raises RuffError when ruff fails or writes unparsable output.
+
+        Identical checks (same paths, same stat of every file and config in
+        scope) running at the same time share one ruff process: later callers
+        replay the violations parsed so far and then follow the live output
+        (up to `MAX_REPLAY_ITEMS` violations; a longer run is not shared).
+        The first caller's `workspace` and `time_limit` apply to the shared run.
+
+        Pass `force_exclude` when `paths` are individual files picked by the
+        server, so the project's `exclude` settings still apply to them.
+        ruff's own cache is kept in a server-owned directory per `workspace`
+        (default: the first path), never in the user's project.
+
+        `progress` hears when ruff starts and when its results begin to
+        arrive; ruff prints nothing until it has checked every file.
+
+        ruff is killed and RuffTimeoutError raised once `time_limit` seconds
+        have passed since it started, however far the output has been read.
+
+        `rules` narrows the check with `--select`/`--extend-ignore`, so ruff
+        never runs the rules that are not wanted.
+        """
+        progress = progress or ScanProgress()
+        key = (
+            tuple(str(Path(path).resolve()) for path in paths),
+            force_exclude,
+            rules,
+            await asyncio.to_thread(tree_state, *paths),
+        )
+        if self._flights.in_flight(key):
+            await progress.update(Stage.RUFF, message='Waiting for an identical ruff run in progress')
+        else:
+            await progress.update(Stage.RUFF, message='Running ruff')
+        run = self._flights.stream(key, lambda: self._check(paths, force_exclude, workspace, time_limit, rules))
+        async with aclosing(run) as violations:
+            async for violation in violations:
+                await progress.update(Stage.RUFF, 1, 1, 'ruff finished, reading results')
+                yield violation
 
-        self._rule_cache[code] = doc
-        return doc
+    async def _check(
+        self,
+        paths: tuple[str, ...],
+        force_exclude: bool,
+        workspace: str | None,
+        time_limit: float | None,
+        rules: RuleSelection | None,
+    ) -> AsyncGenerator[RuffViolation, None]:
+        args = [
+            'check',
+            *paths,
+            '--output-format=json-lines',
+            *await self._cache_args(workspace or next(iter(paths), '.')),
+            *(rules.args if rules is not None else []),
+        ]
+        if force_exclude:
+            args.append('--force-exclude')
+        async with aclosing(self._stream(args, ok_returncodes=CHECK_OK_RETURNCODES, time_limit=time_limit)) as lines:
+            async for line in lines:
+                try:
+                    violation = self._to_violation(json.loads(line))
+                except (json.JSONDecodeError, KeyError, TypeError, ValidationError) as e:
+                    raise RuffError(f'unparsable output line: {line[:200]}') from e
+                yield violation
 
-    def _run(self, args: list[str]) -> subprocess.CompletedProcess[str]:
+    async def list_files(
+        self, *paths: str, force_exclude: bool = False, time_limit: float | None = None
+    ) -> list[Path]:
+        """Return the files `ruff check` would lint under `paths` (`--show-files`), with its exclusions applied.
+
+        Raises RuffError when ruff fails, and RuffTimeoutError past `time_limit` seconds.
+        """
+        args = ['check', '--show-files', *paths]
+        if force_exclude:
+            args.append('--force-exclude')
+        result = await self._run(args, time_limit or RUN_TIMEOUT_SECONDS)
+        if result.returncode != 0:
+            raise RuffError(f'ruff check --show-files failed ({result.returncode}): {result.stderr.strip()}')
+        return [Path(line) for line in result.stdout.splitlines() if line]
+
+    async def rule(self, code: str) -> RuleDoc | None:
+        """Look up rule documentation by code, or None for an unknown rule."""
+        return (await self.rules()).get(code)
+
+    async def rules(self) -> dict[str, RuleDoc]:
+        """Return the full rule catalogue keyed by code.
+
+        The catalogue is loaded lazily on first use: from the on-disk cache
+        when it matches this ruff binary, otherwise with a single
+        `ruff rule --all` call whose result is then written to that cache.
+        Looking up many distinct codes never spawns one process per code,
+        and concurrent first lookups share one load.
+        """
+        if self._rules is not None:
+            return self._rules
+        loading = self._rules_loading
+        if loading is None or loading.get_loop() is not asyncio.get_running_loop():
+            loading = self._rules_loading = asyncio.ensure_future(self._load_catalogue())
+        # shielded: a cancelled lookup must not cancel the load other lookups wait for
+        rules = await asyncio.shield(loading)
+        if self._rules_loading is loading:
+            self._rules_loading = None
+        if rules is None:
+            return {}
+        self._rules = rules
+        return rules
+
+    async def _load_catalogue(self) -> dict[str, RuleDoc] | None:
+        rules = await asyncio.to_thread(self._rule_doc_cache.load)
+        if rules is None:
+            rules = await self._load_rules()
+            if rules is None:
+                return None
+            await asyncio.to_thread(self._rule_doc_cache.save, rules)
+        return rules
+
+    async def _load_rules(self) -> dict[str, RuleDoc] | None:
+        try:
+            result = await self._run(['rule', '--all', '--output-format=json'])
+        except RuffTimeoutError as e:
+            logger.warning(f'Failed to load rule documentation: {e}')
+            return None
+        try:
+            docs = [self._to_rule_doc(item) for item in json.loads(result.stdout)]
+        except (json.JSONDecodeError, AttributeError, KeyError, TypeError, ValidationError):
+            # not cached, so a transient failure is retried on the next lookup
+            logger.warning(f'Failed to load rule documentation: {result.stderr.strip()}')
+            return None
+        logger.debug(f'Loaded {len(docs)} rules')
+        return {doc.code: doc for doc in docs}
+
+    async def _run(self, args: list[str], time_limit: float = RUN_TIMEOUT_SECONDS) -> subprocess.CompletedProcess[str]:
+        """Run ruff to completion; raises RuffTimeoutError past `time_limit` seconds."""
         command = [self._ruff_bin, *args]
         logger.debug(f'Running: {" ".join(command)}')
-        return subprocess.run(  # noqa: S603
-            command,
-            capture_output=True,
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            async with asyncio.timeout(time_limit):
+                stdout, stderr = await process.communicate()
+        except TimeoutError as e:
+            raise RuffTimeoutError(f'ruff did not finish within {time_limit} seconds') from e
+        finally:
+            if process.returncode is None:
+                kill_process_group(process)
+                await process.wait()
+        return subprocess.CompletedProcess(
+            args=command,
+            returncode=await process.wait(),
             # ruff always emits UTF-8; never decode with the platform locale
-            encoding='utf-8',
-            errors='replace',
-            check=False,
+            stdout=stdout.decode('utf-8', errors='replace'),
+            stderr=stderr.decode('utf-8', errors='replace'),
+        )
+
+    async def _cache_args(self, workspace: str) -> list[str]:
+        now = time.monotonic()
+        if self._pruned_at is None or now - self._pruned_at > CACHE_PRUNE_INTERVAL_SECONDS:
+            self._pruned_at = now
+            await asyncio.to_thread(self._ruff_caches.prune)
+        # creates the directory and records its use: file I/O, kept off the event loop
+        cache_dir = await asyncio.to_thread(self._ruff_caches.for_workspace, workspace)
+        return ['--no-cache'] if cache_dir is None else ['--cache-dir', str(cache_dir)]
+
+    async def _stream(
+        self, args: list[str], ok_returncodes: tuple[int, ...], time_limit: float | None = None
+    ) -> AsyncGenerator[str, None]:
+        """Yield ruff's non-empty stdout lines as they arrive.
+
+        Raises RuffError once the output ends if ruff exited with a code
+        outside `ok_returncodes`, and RuffTimeoutError when `time_limit` seconds
+        pass first. The process group is killed if the consumer stops
+        iterating early, e.g. because the tool call was cancelled.
+        """
+        command = [self._ruff_bin, *args]
+        logger.debug(f'Streaming: {" ".join(command)}')
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_LINE_LIMIT,
+            start_new_session=True,
+        )
+        assert process.stdout is not None
+        assert process.stderr is not None
+        deadline = None if time_limit is None else asyncio.get_running_loop().time() + time_limit
+        # drained concurrently so a chatty stderr can never fill its pipe and stall ruff
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        try:
+            while True:
+                # checked only while waiting on ruff, so it never fires inside the consumer's code
+                async with asyncio.timeout_at(deadline):
+                    raw_line = await process.stdout.readline()
+                if not raw_line:
+                    break
+                # ruff always emits UTF-8; never decode with the platform locale
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if line:
+                    yield line
+            async with asyncio.timeout_at(deadline):
+                returncode = await process.wait()
+                stderr = (await stderr_task).decode('utf-8', errors='replace').strip()
+        except TimeoutError as e:
+            raise RuffTimeoutError(f'ruff did not finish within {time_limit} seconds') from e
+        finally:
+            if process.returncode is None:
+                kill_process_group(process)
+                # drain both pipes to EOF so the transport closes together with the process
+                await asyncio.gather(process.stdout.read(), stderr_task)
+                await process.wait()
+        if returncode not in ok_returncodes:
+            raise RuffError(stderr or f'ruff exited with code {returncode}')
+
+    def _to_rule_doc(self, raw: dict[str, Any]) -> RuleDoc:
+        name = raw.get('name', '')
+        return RuleDoc(
+            code=raw['code'],
+            name=name,
+            summary=raw.get('summary', ''),
+            explanation=raw.get('explanation', ''),
+            fix_availability=raw.get('fix_availability', ''),
+            url=f'{RUFF_DOCS_BASE}/{name}/' if name else None,
         )
 
     def _to_violation(self, raw: dict[str, Any]) -> RuffViolation:
@@ -103,3 +394,16 @@ class RuffRunner:
             url=raw.get('url'),
             fix=fix,
         )
+
+
+def kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """Kill `process` together with any children it started.
+
+    ruff runs in its own session (`start_new_session=True`), so its process
+    group holds nothing but ruff and whatever it spawned.
+    """
+    with contextlib.suppress(ProcessLookupError):
+        if sys.platform == 'win32':
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
@@ -2,60 +2,83 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+from contextlib import aclosing
+from dataclasses import dataclass, replace
 from itertools import groupby
-from pathlib import Path
-from typing import Literal
+from pathlib import Path, PurePath
+from typing import TYPE_CHECKING, Literal
 
 from loguru import logger
-from mcp.server.fastmcp import FastMCP
+
+# `Context` is a runtime import on purpose: FastMCP resolves the tools' type hints
+# to find the parameter it injects the request context into
+from mcp.server.fastmcp import Context, FastMCP
 
 from ruff_tutor_mcp import instructions
-from ruff_tutor_mcp.config import TutorMode, load_config
-from ruff_tutor_mcp.fixes import render_fix, source_line
+from ruff_tutor_mcp.budget import DEFAULT_MAX_RESPONSE_BYTES
+from ruff_tutor_mcp.cache import ruff_version
+from ruff_tutor_mcp.config import (
+    ConfigIndex,
+    ReviewScope,
+    RuffBackend,
+    SessionStoreKind,
+    TutorConfig,
+    TutorMode,
+    load_config,
+)
+from ruff_tutor_mcp.fixes import LineIndex, render_fix, source_line
+from ruff_tutor_mcp.memo import ScanKey, ScanMemo
 from ruff_tutor_mcp.models import (
+    BatchReviewResponse,
+    Diagnostics,
+    PackageConfig,
     Progress,
     ReviewResponse,
-    RuffViolation,
     RuleDoc,
     SessionSummary,
     ViolationDetail,
     ViolationGroup,
-    ViolationRef,
 )
-from ruff_tutor_mcp.ruff_runner import RuffRunner
-from ruff_tutor_mcp.sessions import SessionStore, TrackedViolation, make_fingerprint, split_progress
+from ruff_tutor_mcp.pagination import ResultPages
+from ruff_tutor_mcp.progress import ScanProgress, Stage
+from ruff_tutor_mcp.ruff_lsp import RuffServerRunner
+from ruff_tutor_mcp.ruff_runner import RuffError, RuffRunner, RuffTimeoutError, RuleSelection
+from ruff_tutor_mcp.session_db import SqliteSessionStore
+from ruff_tutor_mcp.sessions import (
+    Inspected,
+    ScanState,
+    Session,
+    SessionBackend,
+    SessionLocks,
+    SessionStore,
+    TeachingPolicy,
+    TrackedViolation,
+    split_progress,
+)
+from ruff_tutor_mcp.snapshots import Snapshot, is_package_marker, is_ruff_config, is_source, take_snapshot
+from ruff_tutor_mcp.worktree import ChangedLines, GitError, working_tree_changes
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Callable
+
+    from ruff_tutor_mcp.models import RuffViolation
 
 MCP_SERVER_NAME = 'Ruff Tutor'
 
 mcp = FastMCP(MCP_SERVER_NAME)
 
 _runner = RuffRunner()
-_store = SessionStore()
-
-
-@dataclass
-class _Inspected:
-    """A violation enriched with source context for teaching."""
-
-    violation: RuffViolation
-    file: str
-    line: str
-    before: str
-    after: str | None
-
-    @property
-    def fingerprint(self) -> tuple[str, str, str]:
-        return make_fingerprint(self.file, self.violation.code, self.line)
-
-    @property
-    def ref(self) -> ViolationRef:
-        return ViolationRef(
-            file=self.file,
-            row=self.violation.row,
-            code=self.violation.code,
-            message=self.violation.message,
-        )
+# started on the first check of a project configured with `backend = "server"`
+_lsp_runner = RuffServerRunner()
+# replaced in `main` by the store the server's config picks; called from a worker thread,
+# as the SQLite store may wait up to its busy timeout for another process's lock
+_store: SessionBackend = SessionStore()
+_session_locks = SessionLocks()
+_pages = ResultPages()
+_memo = ScanMemo()
+# part of every memo key; results from another ruff version are never reused
+_ruff_version = ruff_version()
 
 
 def _scan_base(path: str) -> Path:
@@ -63,52 +86,344 @@ def _scan_base(path: str) -> Path:
     return resolved.parent if resolved.is_file() else resolved
 
 
-def _relative(filename: str, base: Path) -> str:
+def _relative(filename: str, *bases: Path) -> str:
+    """Return `filename` relative to the innermost of `bases` holding it, or as is when none does."""
+    resolved = Path(filename).resolve()
+    for base in sorted(bases, key=lambda base: len(base.parts), reverse=True):
+        if resolved.is_relative_to(base):
+            return str(resolved.relative_to(base))
+    return filename
+
+
+def _read_source(filename: str) -> str:
     try:
-        return str(Path(filename).resolve().relative_to(base))
-    except ValueError:
-        return filename
+        return Path(filename).read_text(encoding='utf-8')
+    except OSError:
+        logger.warning(f'Failed to read file: {filename}')
+        return ''
+
+
+def _open_source(filename: str, bases: list[Path]) -> tuple[LineIndex, str, str]:
+    """Read and index `filename`; returns the index, its resolved path and its path relative to `bases`."""
+    return LineIndex(_read_source(filename)), str(Path(filename).resolve()), _relative(filename, *bases)
+
+
+async def _inspect(
+    path: str,
+    targets: list[str] | None = None,
+    config: TutorConfig | None = None,
+    progress: ScanProgress | None = None,
+    rules: RuleSelection | None = None,
+) -> list[Inspected] | None:
+    """Run ruff and enrich each violation with before/after snippets (see `_enrich`).
+
+    With `targets`, only those files are linted; paths are still reported
+    relative to the scan base of `path`. The config's `backend` picks
+    between one ruff process per call and the long-lived `ruff server`;
+    `rules` narrows the check to a rule selection, which only the CLI can
+    do. `progress` hears about the ruff run and about every file enriched.
+
+    Returns None when ruff fails; raises RuffTimeoutError when it runs
+    past the config's `timeout` and had to be killed.
+    """
+    config = config or TutorConfig.default()
+    progress = progress or ScanProgress()
+    checker = _lsp_runner if config.backend is RuffBackend.SERVER and rules is None else _runner
+    time_limit = config.timeout
+    if targets:
+        violations = checker.stream_check(
+            *targets, force_exclude=True, workspace=path, progress=progress, time_limit=time_limit, rules=rules
+        )
+    else:
+        violations = checker.stream_check(path, progress=progress, time_limit=time_limit, rules=rules)
+    return await _enrich(violations, [_scan_base(path)], progress)
+
 
+async def _enrich(
+    violations: AsyncGenerator[RuffViolation, None], bases: list[Path], progress: ScanProgress
+) -> list[Inspected] | None:
+    """Enrich ruff's violations as they stream in, reporting files relative to the innermost of `bases`.
 
-def _inspect(path: str) -> list[_Inspected] | None:
-    """Run ruff and enrich each violation with before/after snippets."""
-    violations = _runner.check(path)
-    if violations is None:
+    Only the source of the file currently being enriched is held in
+    memory, indexed into lines once for all of its violations; it is
+    released as soon as ruff's (file-sorted) output moves on to the next
+    file. Files are read in a worker thread, which also lets other tool
+    calls run between files.
+
+    Returns None when ruff fails; re-raises RuffTimeoutError.
+    """
+    inspected: list[Inspected] = []
+    current: str | None = None
+    index = LineIndex('')
+    resolved = relative = ''
+    files = 0
+
+    try:
+        # closed explicitly so ruff never outlives an enrichment error
+        async with aclosing(violations):
+            async for violation in violations:
+                if violation.filename != current:
+                    await progress.update(Stage.ENRICH, files, message=f'Enriched violations in {files} file(s)')
+                    files += 1
+                    current = violation.filename
+                    index, resolved, relative = await asyncio.to_thread(_open_source, current, bases)
+                before, after = render_fix(index, violation)
+                inspected.append(
+                    Inspected(
+                        violation=violation,
+                        path=resolved,
+                        file=relative,
+                        line=source_line(index, violation.row),
+                        before=before,
+                        after=after,
+                    )
+                )
+    except RuffTimeoutError:
+        raise
+    except RuffError as e:
+        logger.warning(f'Failed to run ruff check: {e}')
         return None
 
+    logger.debug(f'Enriched {len(inspected)} violations in {files} file(s)')
+    return inspected
+
+
+async def _scan(
+    path: str, snapshot: Snapshot, config: TutorConfig, progress: ScanProgress, rules: RuleSelection | None
+) -> list[Inspected] | None:
+    """Inspect all of `path`, reusing the memoized result when nothing it depends on has changed.
+
+    `snapshot` must be taken before ruff runs; its content digest keys the memo.
+    """
+    key = _scan_key(path, snapshot, config, rules)
+    items = _memo.get(key)
+    if items is None:
+        items = await _inspect(path, config=config, progress=progress, rules=rules)
+        if items is not None:
+            _memo.put(key, snapshot, items)
+    return items
+
+
+def _scan_key(path: str, snapshot: Snapshot, config: TutorConfig, rules: RuleSelection | None) -> ScanKey:
+    return ScanKey(
+        path=str(Path(path).resolve()),
+        backend=config.backend.value,
+        tree=snapshot.digest,
+        ruff_version=_ruff_version,
+        rules=rules,
+    )
+
+
+@dataclass
+class _Target:
+    """A path to review, with its config and the snapshot taken of it so far."""
+
+    path: str
+    mode: str | None
+    config: TutorConfig
+    # taken by a batch before its ruff run; `_review` takes its own when None
+    snapshot: Snapshot | None = None
+
+
+async def _prefetch(targets: list[_Target], progress: ScanProgress, rules: RuleSelection | None) -> set[str]:
+    """Lint every path whose full scan is not memoized in one ruff run, and memoize each path's share.
+
+    `_scan` then finds each path's result in the memo, so a batch pays for
+    ruff's startup and config discovery once. Paths checked by `ruff
+    server` are left to their own scan, as is a lone path, and so is a path
+    inside another: ruff's exclusions apply while it walks a directory, not
+    to a path it is given, so the outer run's share of it could miss files.
+    When the run fails, each path's own scan retries and reports it.
+    Returns the paths whose run timed out; the snapshots taken are left on
+    the targets for their reviews.
+    """
+    pending: dict[str, tuple[ScanKey, Snapshot]] = {}
+    time_limit = 0.0
+    for target in targets:
+        if target.config.backend is RuffBackend.SERVER and rules is None:
+            continue
+        previous = _memo.latest_snapshot(str(Path(target.path).resolve()))
+        target.snapshot = await asyncio.to_thread(take_snapshot, target.path, previous=previous)
+        key = _scan_key(target.path, target.snapshot, target.config, rules)
+        if key not in _memo:
+            pending[target.path] = (key, target.snapshot)
+            time_limit = max(time_limit, target.config.timeout)
+    roots = _outermost(list(pending))
+    if len(roots) <= 1:
+        return set()
+
+    violations = _runner.stream_check(*roots, progress=progress, time_limit=time_limit, rules=rules)
+    try:
+        items = await _enrich(violations, [_scan_base(root) for root in roots], progress)
+    except RuffTimeoutError as e:
+        logger.warning(f'Batch review of {len(roots)} paths timed out: {e}')
+        return set(roots)
+    if items is None:
+        return set()
+    for root in roots:
+        key, snapshot = pending[root]
+        _memo.put(key, snapshot, _share(items, root))
+    logger.info(f'Linted {len(roots)} paths in one ruff run')
+    return set()
+
+
+def _outermost(paths: list[str]) -> list[str]:
+    """Drop the paths inside (or equal to) another of `paths`; ruff would report their files twice."""
+    roots: dict[Path, str] = {}
+    for path in paths:
+        roots.setdefault(Path(path).resolve(), path)
+    return [
+        path
+        for root, path in roots.items()
+        if not any(other != root and root.is_relative_to(other) for other in roots)
+    ]
+
+
+def _share(items: list[Inspected], path: str) -> list[Inspected]:
+    """Return the items a scan of `path` alone would find, with files relative to its own scan base."""
+    root = Path(path).resolve()
     base = _scan_base(path)
-    source_cache: dict[str, str] = {}
-    inspected: list[_Inspected] = []
-
-    for violation in violations:
-        source = source_cache.get(violation.filename)
-        if source is None:
-            try:
-                source = Path(violation.filename).read_text(encoding='utf-8')
-            except OSError:
-                logger.warning(f'Failed to read file: {violation.filename}')
-                source = ''
-            source_cache[violation.filename] = source
-        before, after = render_fix(source, violation)
-        inspected.append(
-            _Inspected(
-                violation=violation,
-                file=_relative(violation.filename, base),
-                line=source_line(source, violation.row),
-                before=before,
-                after=after,
-            )
-        )
+    share: list[Inspected] = []
+    for item in items:
+        if PurePath(item.path).is_relative_to(root):
+            file = _relative(item.path, base)
+            share.append(item if item.file == file else replace(item, file=file))
+    return share
 
-    return inspected
+
+async def _scan_changed(
+    path: str, snapshot: Snapshot, config: TutorConfig, progress: ScanProgress, rules: RuleSelection | None
+) -> list[Inspected] | None:
+    """Inspect only the source files in `snapshot`: those changed in the git working tree.
+
+    Not memoized; the run is as small as the change.
+    """
+    targets = [file for file in snapshot.files if is_source(file)]
+    if not targets:
+        return []
+    return await _inspect(path, targets=targets, config=config, progress=progress, rules=rules)
 
 
-def _build_groups(items: list[_Inspected], include_fixes: bool) -> list[ViolationGroup]:
-    """Group violations by rule code with a one-line rule summary."""
+async def _changed_lines(path: str, scope: ReviewScope) -> ChangedLines | None:
+    """Return what a scoped review covers, or None when it covers every file; raises GitError."""
+    if scope is ReviewScope.ALL:
+        return None
+    return await working_tree_changes(path, hunks=scope is ReviewScope.HUNKS)
+
+
+def _within(items: list[Inspected], changed: ChangedLines) -> list[Inspected]:
+    """Keep the violations on changed lines; a file changed throughout keeps all of its own."""
+    return [item for item in items if (lines := changed.get(item.path, set())) is None or item.violation.row in lines]
+
+
+async def _recheck(session: Session, snapshot: Snapshot, progress: ScanProgress) -> list[Inspected] | None:
+    """Re-lint only the files changed between the session's last scan and `snapshot`.
+
+    Findings for unchanged files are reused from that scan. A changed ruff
+    config can affect every file, and an added or removed `__init__.py`
+    the files of its package (INP001), so either falls back to a full scan.
+    """
+    config = load_config(session.path)
+    last_scan = session.last_scan
+    changed, removed = last_scan.snapshot.changes(snapshot) if last_scan else ([], [])
+    added = [path for path in changed if path not in (last_scan.snapshot.files if last_scan else {})]
+
+    if (
+        last_scan is None
+        or any(is_ruff_config(path) for path in [*changed, *removed])
+        or any(is_package_marker(path) for path in [*added, *removed])
+    ):
+        scan = _scan if session.scope == ReviewScope.ALL.value else _scan_changed
+        items = await scan(session.path, snapshot, config, progress, session.rules)
+        if items is None:
+            return None
+        session.last_scan = ScanState.from_items(snapshot, items)
+        return items
+
+    stale = {*changed, *removed}
+    findings = {path: items for path, items in last_scan.findings.items() if path not in stale}
+    if changed:
+        fresh = await _inspect(session.path, targets=changed, config=config, progress=progress, rules=session.rules)
+        if fresh is None:
+            return None
+        findings.update(ScanState.from_items(snapshot, fresh).findings)
+    logger.debug(f'Session {session.id}: re-linted {len(changed)} changed / {len(removed)} removed file(s)')
+
+    session.last_scan = ScanState(snapshot=snapshot, findings=findings)
+    return session.last_scan.items
+
+
+def _package_policies(
+    items: list[Inspected], mode_override: str | None
+) -> tuple[dict[str, TeachingPolicy], dict[str, TeachingPolicy]]:
+    """Find the learning mode and retry limit of each violation from its package's nearest `.ruff-tutor.toml`.
+
+    Returns the policy of each file with violations, and of each package by
+    the directory of its config file; files under no config file share the
+    filesystem root's entry. Each directory is looked at once, however many
+    files it holds.
+    """
+    index = ConfigIndex(mode_override)
+    files: dict[str, TeachingPolicy] = {}
+    packages: dict[str, TeachingPolicy] = {}
+    for path in {item.path for item in items}:
+        config_file = index.config_file_for(path)
+        config = index.config_for(path)
+        files[path] = TeachingPolicy(mode=config.mode.value, max_retry=config.max_retry)
+        packages[str(config_file.parent) if config_file else PurePath(path).anchor] = files[path]
+    return files, packages
+
+
+async def _add_packages(session: Session, items: list[Inspected]) -> None:
+    """Add the packages of `items` the session has no policy for yet, read from their own config.
+
+    A package that had no violations at review time is missing from
+    `Session.packages`; without this its new violations would be taught
+    with the policy of an enclosing package, or the session's.
+    """
+    _, packages = await asyncio.to_thread(_package_policies, items, session.mode_override)
+    for directory, policy in packages.items():
+        session.packages.setdefault(directory, policy)
+
+
+def _package_configs(packages: dict[str, TeachingPolicy], base: Path) -> list[PackageConfig]:
+    configs: list[PackageConfig] = []
+    for directory, policy in sorted(packages.items()):
+        # the filesystem root's entry stands for files under no config file
+        path = '' if directory == PurePath(directory).anchor else _relative(directory, base)
+        configs.append(PackageConfig(path=path, mode=policy.mode, max_retry=policy.max_retry))
+    return configs
+
+
+async def _build_groups(
+    items: list[Inspected],
+    include_fixes: bool | Callable[[str], bool],
+    progress: ScanProgress | None = None,
+    mode_of: Callable[[str], str] | None = None,
+) -> list[ViolationGroup]:
+    """Group violations by rule code with a one-line rule summary.
+
+    `include_fixes` may decide per file (called with `Inspected.path`);
+    `mode_of`, when given, labels each violation with its package's
+    learning mode. The grouping runs in a worker thread, so a large
+    result does not hold up other tool calls.
+    """
+    if progress is not None:
+        await progress.update(Stage.GROUP, message=f'Grouping {len(items)} violations by rule')
+    rules = await _runner.rules()
+    return await asyncio.to_thread(_group, items, rules, include_fixes, mode_of)
+
+
+def _group(
+    items: list[Inspected],
+    rules: dict[str, RuleDoc],
+    include_fixes: bool | Callable[[str], bool],
+    mode_of: Callable[[str], str] | None,
+) -> list[ViolationGroup]:
     groups: list[ViolationGroup] = []
     for code, grouped in groupby(sorted(items, key=lambda i: i.violation.code), key=lambda i: i.violation.code):
         members = list(grouped)
-        doc = _runner.rule(code)
+        doc = rules.get(code)
         first = members[0].violation
         # ruff rule summaries may be message templates ("... argument `{name}`");
         # fall back to the concrete message when placeholders are present
@@ -127,9 +442,10 @@ def _build_groups(items: list[_Inspected], include_fixes: bool) -> list[Violatio
                         col=item.violation.col,
                         message=item.violation.message,
                         before=item.before,
-                        after=item.after if include_fixes else None,
+                        after=item.after if _reveals(include_fixes, item.path) else None,
                         fixable=item.after is not None,
                         fix_applicability=item.violation.fix.applicability if item.violation.fix else None,
+                        mode=mode_of(item.path) if mode_of is not None else None,
                     )
                     for item in members
                 ],
@@ -138,86 +454,353 @@ def _build_groups(items: list[_Inspected], include_fixes: bool) -> list[Violatio
     return groups
 
 
+def _reveals(include_fixes: bool | Callable[[str], bool], path: str) -> bool:
+    return include_fixes if isinstance(include_fixes, bool) else include_fixes(path)
+
+
+def _progress_page(session: Session, cursor: str, page_size: int | None, max_bytes: int | None) -> Progress:
+    """Serve a later page of the session's last `check_my_fix` result."""
+    page = _pages.next(cursor, Progress, page_size, owner=session.id, max_bytes=max_bytes)
+    if page is None:
+        return Progress(
+            verdict='error',
+            attempts=session.attempts,
+            max_retry=session.max_retry,
+            instruction=instructions.CURSOR_EXPIRED,
+        )
+    return page
+
+
 @mcp.tool()
-def review_code(path: str = '.', mode: str | None = None) -> ReviewResponse:
+async def review_code(  # noqa: PLR0913 - the parameters are the tool's MCP schema
+    path: str = '.',
+    mode: str | None = None,
+    scope: str = 'all',
+    select: list[str] | None = None,
+    ignore: list[str] | None = None,
+    page_size: int | None = None,
+    cursor: str | None = None,
+    max_response_bytes: int | None = None,
+    ctx: Context | None = None,
+) -> ReviewResponse:
     """Check code at the given path with ruff and build a teaching report.
 
     In auto mode (default) this is a one-shot report: explain, then auto-fix.
     In beginner/advanced mode it starts a learning session - the user fixes the
     code themselves and progress is verified via `check_my_fix(session_id)`.
 
+    Large results are paged: when `next_cursor` is set, call again with
+    `cursor=next_cursor` to get the next page without re-running ruff.
+    Each page is also kept within `max_response_bytes`: past that, groups
+    list only their first violations in detail and count the rest.
+    Clients that send a progress token get progress notifications while
+    ruff runs and its results are enriched and grouped. A scan that takes
+    longer than the project's configured `timeout` is stopped and reported
+    with status `timeout`.
+
+    With `scope="changed"` only the files that differ from the last git
+    commit (or are untracked) are linted, so the review costs as much as
+    the change rather than the repository; `scope="hunks"` further keeps
+    only violations on changed lines. Git is only read locally. A
+    session keeps its scope: `check_my_fix` re-lists the changed files.
+
+    `select` and `ignore` narrow ruff to a family of rules (`--select` /
+    `--extend-ignore` on top of the project's ruff config), which is much
+    cheaper than linting everything; a session re-checks with the same
+    rules.
+
     Args:
         path: File or directory to check (default: current directory).
         mode: Learning mode (beginner, advanced, auto). Falls back to the
             project's .ruff-tutor.toml, then to auto.
+        scope: Files to review: all (default), changed or hunks.
+        select: Rule codes or prefixes to check instead of the project's selection (e.g. ["PERF", "B"]).
+        ignore: Rule codes or prefixes to leave out.
+        page_size: Maximum violations per page (default 100).
+        cursor: `next_cursor` from a previous response, to fetch the next page.
+        max_response_bytes: Approximate size limit of the response (default 64 KiB).
+        ctx: Request context injected by FastMCP (not a tool argument).
 
     """
-    config = load_config(path, mode_override=mode)
+    if cursor is not None:
+        page = _pages.next(cursor, ReviewResponse, page_size, max_bytes=max_response_bytes)
+        if page is None:
+            return ReviewResponse(status='error', mode=mode or '', total=0, instruction=instructions.CURSOR_EXPIRED)
+        return page
+
+    rules = _rule_selection(select, ignore)
+    unknown = await _unknown_selectors(rules)
+    if unknown:
+        return ReviewResponse(
+            status='error', mode=mode or '', total=0, instruction=instructions.unknown_rules_instruction(unknown)
+        )
+
+    progress = ScanProgress(ctx.report_progress if ctx else None)
+    target = _Target(path, mode, load_config(path, mode_override=mode))
+    report = await _review(target, _review_scope(scope), progress, rules)
+    return _pages.first(report, page_size, max_bytes=max_response_bytes)
+
+
+def _rule_selection(select: list[str] | None, ignore: list[str] | None) -> RuleSelection | None:
+    """Normalize the requested selectors; None when neither narrows the project's rules."""
+    rules = RuleSelection(
+        select=tuple(dict.fromkeys(code.strip().upper() for code in select or [] if code.strip())),
+        ignore=tuple(dict.fromkeys(code.strip().upper() for code in ignore or [] if code.strip())),
+    )
+    return rules if rules.select or rules.ignore else None
+
+
+async def _unknown_selectors(rules: RuleSelection | None) -> list[str]:
+    """Return the selectors no known rule code starts with; ruff would refuse to run with them."""
+    if rules is None:
+        return []
+    codes = await _runner.rules()
+    if not codes:
+        # without the catalogue, ruff itself is left to judge
+        return []
+    return [
+        selector
+        for selector in rules.select + rules.ignore
+        if selector != 'ALL' and not any(code.startswith(selector) for code in codes)
+    ]
+
+
+def _review_scope(scope: str) -> ReviewScope:
+    try:
+        return ReviewScope(scope)
+    except ValueError:
+        logger.warning(f'Invalid scope: {scope}, reviewing all files')
+        return ReviewScope.ALL
+
+
+async def _review(
+    target: _Target, review_scope: ReviewScope, progress: ScanProgress, rules: RuleSelection | None
+) -> ReviewResponse:
+    path, mode, config = target.path, target.mode, target.config
     current_mode = config.mode.value
-    logger.info(f'Reviewing {path} in {current_mode} mode')
+    logger.info(f'Reviewing {review_scope.value} files of {path} in {current_mode} mode')
 
-    items = _inspect(path)
-    if items is None:
-        return ReviewResponse(status='error', mode=current_mode, total=0, instruction=instructions.ERROR)
+    try:
+        changed = await _changed_lines(path, review_scope)
+    except GitError as e:
+        logger.warning(f'Failed to list changed files under {path}: {e}')
+        return ReviewResponse(status='error', mode=current_mode, total=0, instruction=instructions.GIT_ERROR)
+    if changed is not None and not any(is_source(file) for file in changed):
+        return ReviewResponse(status='clean', mode=current_mode, total=0, instruction=instructions.NO_CHANGED_FILES)
+
+    # taken before ruff runs, so an edit racing the scan is re-linted on the next check
+    snapshot = target.snapshot if changed is None else None
+    if snapshot is None:
+        previous = _memo.latest_snapshot(str(Path(path).resolve()))
+        snapshot = await asyncio.to_thread(take_snapshot, path, previous=previous, only=changed)
+    scan = _scan if changed is None else _scan_changed
+    failure: Literal['timeout', 'error'] = 'error'
+    try:
+        found = await scan(path, snapshot, config, progress, rules)
+    except RuffTimeoutError as e:
+        logger.warning(f'Review of {path} timed out: {e}')
+        found, failure = None, 'timeout'
+    if found is None:
+        instruction = instructions.TIMEOUT if failure == 'timeout' else instructions.ERROR
+        return ReviewResponse(status=failure, mode=current_mode, total=0, instruction=instruction)
+    items = found if changed is None else _within(found, changed)
     if not items:
         return ReviewResponse(status='clean', mode=current_mode, total=0, instruction=instructions.CLEAN)
 
-    if config.mode is TutorMode.AUTO:
+    # in a monorepo each package's own .ruff-tutor.toml decides how its violations are taught
+    files, packages = await asyncio.to_thread(_package_policies, items, mode)
+    modes = {policy.mode for policy in packages.values()}
+    current_mode = modes.pop() if len(modes) == 1 else 'mixed'
+    max_retry = max(policy.max_retry for policy in packages.values())
+    # kept in the session even when they agree, so a re-check can tell a package it has not seen yet
+    reported = packages if len(set(packages.values())) > 1 else {}
+    if reported:
+        logger.info(f'Violations span {len(packages)} packages with different settings')
+
+    if current_mode == TutorMode.AUTO.value:
         return ReviewResponse(
             status='violations_found',
             mode=current_mode,
             total=len(items),
-            groups=_build_groups(items, include_fixes=True),
+            groups=await _build_groups(items, include_fixes=True, progress=progress),
             instruction=instructions.AUTO,
         )
 
-    session = _store.create(
+    session = await asyncio.to_thread(
+        _store.create,
         path=path,
         mode=current_mode,
-        max_retry=config.max_retry,
+        max_retry=max_retry,
         tracked=[TrackedViolation(fingerprint=item.fingerprint, ref=item.ref) for item in items],
+        # every finding in scope, off changed lines too, so a re-check can reuse them for unchanged files
+        last_scan=ScanState.from_items(snapshot, found),
     )
+    session.packages = packages
+    session.mode_override = mode
+    session.scope = review_scope.value
+    session.rules = rules
+    await asyncio.to_thread(_store.save, session)
     logger.info(f'Started session {session.id} with {len(items)} violations')
     return ReviewResponse(
         status='violations_found',
         mode=current_mode,
         total=len(items),
-        groups=_build_groups(items, include_fixes=config.mode is TutorMode.BEGINNER),
+        groups=await _build_groups(
+            items,
+            include_fixes=lambda path: files[path].mode != TutorMode.ADVANCED.value,
+            progress=progress,
+            mode_of=(lambda path: files[path].mode) if current_mode == 'mixed' else None,
+        ),
         session_id=session.id,
-        max_retry=config.max_retry,
+        max_retry=max_retry,
+        packages=_package_configs(reported, _scan_base(path)),
         instruction=instructions.lesson_instruction(current_mode),
     )
 
 
 @mcp.tool()
-def check_my_fix(session_id: str) -> Progress:
+async def review_paths(  # noqa: PLR0913 - the parameters are the tool's MCP schema
+    paths: list[str],
+    mode: str | None = None,
+    select: list[str] | None = None,
+    ignore: list[str] | None = None,
+    page_size: int | None = None,
+    max_response_bytes: int | None = None,
+    ctx: Context | None = None,
+) -> BatchReviewResponse:
+    """Review several files or directories at once, with a single ruff run for all of them.
+
+    Cheaper than calling `review_code` once per path: ruff starts and
+    discovers its configuration once. Returns one review per distinct
+    path, in order, each as `review_code(path, mode, select=select,
+    ignore=ignore)` would return it - in beginner/advanced mode each starts
+    its own session. `max_response_bytes` is shared among the reviews;
+    later pages of a review come from `review_code(cursor=...)`.
+
+    Args:
+        paths: Files or directories to check.
+        mode: Learning mode (beginner, advanced, auto). Falls back to each
+            path's .ruff-tutor.toml, then to auto.
+        select: Rule codes or prefixes to check instead of the project's selection (e.g. ["PERF", "B"]).
+        ignore: Rule codes or prefixes to leave out.
+        page_size: Maximum violations per page of each review (default 100).
+        max_response_bytes: Approximate size limit of the whole response (default 64 KiB).
+        ctx: Request context injected by FastMCP (not a tool argument).
+
+    """
+    paths = list(dict.fromkeys(paths))
+    rules = _rule_selection(select, ignore)
+    unknown = await _unknown_selectors(rules)
+    if unknown:
+        return BatchReviewResponse(instruction=instructions.unknown_rules_instruction(unknown))
+
+    progress = ScanProgress(ctx.report_progress if ctx else None)
+    targets = [_Target(path, mode, load_config(path, mode_override=mode)) for path in paths]
+    timed_out = await _prefetch(targets, progress, rules)
+    budget = (max_response_bytes or DEFAULT_MAX_RESPONSE_BYTES) // max(len(paths), 1)
+    reviews: list[ReviewResponse] = []
+    for target in targets:
+        if target.path in timed_out:
+            current_mode = target.config.mode.value
+            report = ReviewResponse(status='timeout', mode=current_mode, total=0, instruction=instructions.TIMEOUT)
+        else:
+            report = await _review(target, ReviewScope.ALL, progress, rules)
+        report.path = target.path
+        reviews.append(_pages.first(report, page_size, max_bytes=budget))
+    return BatchReviewResponse(reviews=reviews, instruction=instructions.BATCH)
+
+
+@mcp.tool()
+async def check_my_fix(
+    session_id: str,
+    page_size: int | None = None,
+    cursor: str | None = None,
+    max_response_bytes: int | None = None,
+    ctx: Context | None = None,
+) -> Progress:
     """Re-check the session's code and report learning progress.
 
     Reports which violations the user fixed, which remain, and which are new.
     The server tracks attempts; after max_retry attempts the correct fixes are
-    revealed.
+    revealed. Large results are paged and size-limited like `review_code`'s;
+    fetching a page with `cursor` neither re-checks nor uses up an attempt.
+    Re-checks report progress and time out like `review_code`; a timed-out
+    re-check (verdict `timeout`) does not use up an attempt.
 
     Args:
         session_id: Session ID returned by `review_code`.
+        page_size: Maximum violations per page (default 100).
+        cursor: `next_cursor` from a previous response, to fetch the next page.
+        max_response_bytes: Approximate size limit of the response (default 64 KiB).
+        ctx: Request context injected by FastMCP (not a tool argument).
 
     """
-    session = _store.get(session_id)
+    # calls for one session run one at a time, so a re-check never races another
+    async with _session_locks(session_id):
+        return await _check_session(session_id, page_size, cursor, max_response_bytes, ctx)
+
+
+async def _check_session(
+    session_id: str, page_size: int | None, cursor: str | None, max_bytes: int | None, ctx: Context | None
+) -> Progress:
+    session = await asyncio.to_thread(_store.get, session_id)
     if session is None:
+        reason = await asyncio.to_thread(_store.eviction_reason, session_id)
         return Progress(
-            verdict='session_not_found',
+            verdict='session_not_found' if reason is None else 'evicted',
             attempts=0,
             max_retry=0,
-            instruction=instructions.SESSION_NOT_FOUND,
+            instruction=instructions.SESSION_NOT_FOUND if reason is None else instructions.evicted_instruction(reason),
+        )
+
+    if cursor is not None:
+        return _progress_page(session, cursor, page_size, max_bytes)
+    return await _check_progress(session, page_size, max_bytes, ctx)
+
+
+async def _check_progress(
+    session: Session, page_size: int | None, max_bytes: int | None, ctx: Context | None
+) -> Progress:
+    try:
+        changed = await _changed_lines(session.path, ReviewScope(session.scope))
+    except GitError as e:
+        logger.warning(f'Session {session.id}: failed to list changed files: {e}')
+        return Progress(
+            verdict='error', attempts=session.attempts, max_retry=session.max_retry, instruction=instructions.GIT_ERROR
         )
 
-    items = _inspect(session.path)
+    last_scan = session.last_scan
+    previous = last_scan.snapshot if last_scan else None
+    snapshot = await asyncio.to_thread(take_snapshot, session.path, previous=previous, only=changed)
+    if last_scan is not None and last_scan.snapshot.changes(snapshot) == ([], []):
+        # nothing saved since the last check: skip ruff and do not use up an attempt
+        session.last_scan = ScanState(snapshot=snapshot, findings=last_scan.findings)
+        await asyncio.to_thread(_store.save, session)
+        logger.info(f'Session {session.id}: no changes detected')
+        return Progress(
+            verdict='no_changes',
+            attempts=session.attempts,
+            max_retry=session.max_retry,
+            instruction=instructions.NO_CHANGES,
+        )
+
+    progress = ScanProgress(ctx.report_progress if ctx else None)
+    failure: Literal['timeout', 'error'] = 'error'
+    try:
+        items = await _recheck(session, snapshot, progress)
+    except RuffTimeoutError as e:
+        logger.warning(f'Session {session.id}: re-check timed out: {e}')
+        items, failure = None, 'timeout'
     if items is None:
+        # a failed re-check does not use up an attempt
         return Progress(
-            verdict='error',
+            verdict=failure,
             attempts=session.attempts,
             max_retry=session.max_retry,
-            instruction=instructions.ERROR,
+            instruction=instructions.TIMEOUT if failure == 'timeout' else instructions.ERROR,
         )
+    if changed is not None:
+        items = _within(items, changed)
 
     session.attempts += 1
 
@@ -225,6 +808,7 @@ def check_my_fix(session_id: str) -> Progress:
         fixed, _ = split_progress(session.initial, session.refs, [])
         session.last_fixed = len(fixed)
         session.last_remaining = 0
+        await asyncio.to_thread(_store.save, session)
         logger.info(f'Session {session.id}: all violations fixed')
         return Progress(
             verdict='passed',
@@ -245,32 +829,38 @@ def check_my_fix(session_id: str) -> Progress:
     session.last_fixed = len(fixed)
     session.last_remaining = len(remaining_items) + len(new_items)
     session.track_new([TrackedViolation(fingerprint=item.fingerprint, ref=item.ref) for item in new_items])
+    if new_items:
+        await _add_packages(session, new_items)
+    await asyncio.to_thread(_store.save, session)
 
     verdict: Literal['answer_revealed', 'keep_trying']
     if session.attempts >= session.max_retry:
-        verdict, include_fixes = 'answer_revealed', True
-        instruction = instructions.ANSWER_REVEALED
+        verdict, instruction = 'answer_revealed', instructions.ANSWER_REVEALED
     else:
-        verdict, include_fixes = 'keep_trying', session.mode == TutorMode.BEGINNER.value
-        instruction = instructions.keep_trying_instruction(session.mode)
+        verdict, instruction = 'keep_trying', instructions.keep_trying_instruction(session.mode)
+    # each package's retry limit decides when its fixes are revealed; the session ends at the largest
+    include_fixes = session.reveals_fix
+    mixed = len({policy.mode for policy in session.packages.values()}) > 1
+    mode_of = (lambda path: session.policy_for(path).mode) if mixed else None
 
     logger.info(
         f'Session {session.id}: attempt {session.attempts}/{session.max_retry}, '
         f'{len(fixed)} fixed / {len(remaining_items)} remaining / {len(new_items)} new'
     )
-    return Progress(
+    report = Progress(
         verdict=verdict,
         attempts=session.attempts,
         max_retry=session.max_retry,
         fixed=fixed,
-        remaining=_build_groups(remaining_items, include_fixes=include_fixes),
-        new=_build_groups(new_items, include_fixes=include_fixes),
+        remaining=await _build_groups(remaining_items, include_fixes, progress=progress, mode_of=mode_of),
+        new=await _build_groups(new_items, include_fixes, progress=progress, mode_of=mode_of),
         instruction=instruction,
     )
+    return _pages.first(report, page_size, owner=session.id, max_bytes=max_bytes)
 
 
 @mcp.tool()
-def explain_rule(code: str) -> RuleDoc:
+async def explain_rule(code: str) -> RuleDoc:
     """Fetch the full documentation for a ruff rule (e.g. "E712").
 
     Use this for rules worth teaching in depth; the `explanation` field
@@ -280,7 +870,7 @@ def explain_rule(code: str) -> RuleDoc:
         code: Ruff rule code.
 
     """
-    doc = _runner.rule(code)
+    doc = await _runner.rule(code)
     if doc is None:
         return RuleDoc(
             code=code,
@@ -293,21 +883,24 @@ def explain_rule(code: str) -> RuleDoc:
 
 
 @mcp.tool()
-def end_session(session_id: str) -> SessionSummary:
+async def end_session(session_id: str) -> SessionSummary:
     """Close a learning session and get a summary of the results.
 
     Args:
         session_id: Session ID returned by `review_code`.
 
     """
-    session = _store.remove(session_id)
+    # waits for a `check_my_fix` in flight, which would otherwise save the session back
+    async with _session_locks(session_id):
+        session = await asyncio.to_thread(_store.remove, session_id)
     if session is None:
+        reason = await asyncio.to_thread(_store.eviction_reason, session_id)
         return SessionSummary(
             session_id=session_id,
             fixed_count=0,
             remaining_count=0,
             attempts=0,
-            instruction=instructions.SESSION_NOT_FOUND,
+            instruction=instructions.SESSION_NOT_FOUND if reason is None else instructions.evicted_instruction(reason),
         )
     return SessionSummary(
         session_id=session_id,
@@ -319,8 +912,26 @@ def end_session(session_id: str) -> SessionSummary:
     )
 
 
+@mcp.tool()
+async def diagnostics() -> Diagnostics:
+    """Report the server's memory budgets and how much of them is in use.
+
+    Covers the learning sessions (count, estimated size, limits, evictions)
+    and the memo of full-scan results (size, limits, hit rate).
+    """
+    return Diagnostics(sessions=await asyncio.to_thread(_store.usage), scan_memo=_memo.usage())
+
+
 def main() -> None:
     """Start the MCP server."""
+    global _store  # noqa: PLW0603 - picked once at startup, before any tool runs
+    config = load_config()
+    ttl_seconds = config.session_ttl_hours * 60 * 60
+    if config.session_store is SessionStoreKind.SQLITE:
+        _store = SqliteSessionStore(ttl_seconds=ttl_seconds)
+        logger.info(f'Keeping sessions in {_store.path}')
+    else:
+        _store = SessionStore(max_bytes=int(config.session_memory_mb * 1024 * 1024), idle_ttl_seconds=ttl_seconds)
     mcp.run()
 
 
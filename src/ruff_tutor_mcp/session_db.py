@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+from pydantic import ValidationError
+
+from ruff_tutor_mcp.cache import user_cache_dir
+from ruff_tutor_mcp.models import RuffViolation, SessionUsage
+from ruff_tutor_mcp.ruff_runner import RuleSelection
+from ruff_tutor_mcp.sessions import (
+    DEFAULT_SESSION_TTL_SECONDS,
+    Fingerprint,
+    Inspected,
+    ScanState,
+    Session,
+    TeachingPolicy,
+    TrackedRef,
+    TrackedViolation,
+    new_session,
+)
+from ruff_tutor_mcp.snapshots import FileState, Snapshot, is_package_marker, is_ruff_config
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+SESSION_DB_FILE_NAME = 'sessions.sqlite3'
+
+# how long a writer waits for another process's transaction before giving up
+BUSY_TIMEOUT_SECONDS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    max_retry INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_fixed INTEGER NOT NULL,
+    last_remaining INTEGER NOT NULL,
+    -- JSON list of [fingerprint, count, [[file, row, code, message], ...]]
+    baseline TEXT NOT NULL,
+    -- taken_at_ns of the last scan's snapshot; NULL when there is no last scan
+    scanned_at_ns INTEGER,
+    expires_at REAL NOT NULL,
+    -- JSON object of package directory -> [mode, max_retry] (`Session.packages`)
+    packages TEXT NOT NULL,
+    -- mode the review was asked for (`Session.mode_override`); NULL to follow each package's config
+    mode_override TEXT,
+    -- files the session covers: all, changed or hunks (`Session.scope`)
+    scope TEXT NOT NULL,
+    -- JSON [select, ignore] lists of rule selectors (`Session.rules`); NULL for the project's own rules
+    rules TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires_at);
+CREATE TABLE IF NOT EXISTS scan_files (
+    session_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    -- snapshot state; NULL for a file with findings that was not in the snapshot
+    mtime_ns INTEGER,
+    size INTEGER,
+    digest TEXT,
+    -- JSON list of the file's enriched violations
+    findings TEXT NOT NULL,
+    PRIMARY KEY (session_id, path)
+) WITHOUT ROWID;
+-- purged sessions, kept for another TTL so `check_my_fix` can say they expired
+CREATE TABLE IF NOT EXISTS evicted_sessions (
+    id TEXT PRIMARY KEY,
+    reason TEXT NOT NULL,
+    evicted_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+# the (mtime_ns, size, digest) of a scan row for a file that is not in the snapshot
+_NO_STATE = (None, None, None)
+
+
+class SqliteSessionStore:
+    """Sessions kept in a SQLite database, so they survive restarts and are not capped by count or memory.
+
+    The database runs in WAL mode; every row is looked up by session id.
+    A session expires `ttl_seconds` after it was last read or saved. `get`
+    returns a copy loaded from the database: changes are written back with
+    `save`. Database errors are logged and treated like a missing session.
+    One connection is shared by all threads, one call at a time.
+    """
+
+    def __init__(self, path: Path | None = None, ttl_seconds: float = DEFAULT_SESSION_TTL_SECONDS) -> None:
+        self.path = path or user_cache_dir() / SESSION_DB_FILE_NAME
+        self.ttl_seconds = ttl_seconds
+        self._db: sqlite3.Connection | None = None
+        self.evictions = 0
+        # reentrant: `remove` reads the session it deletes
+        self._lock = threading.RLock()
+
+    def create(
+        self,
+        path: str,
+        mode: str,
+        max_retry: int,
+        tracked: list[TrackedViolation],
+        last_scan: ScanState | None = None,
+    ) -> Session:
+        session = new_session(path, mode, max_retry, tracked, last_scan)
+        self.purge_expired()
+        self.save(session)
+        return session
+
+    def get(self, session_id: str) -> Session | None:
+        try:
+            with self._lock:
+                db = self._connect()
+                row = db.execute(
+                    'SELECT * FROM sessions WHERE id = ? AND expires_at > ?', (session_id, time.time())
+                ).fetchone()
+                if row is None:
+                    return None
+                files = db.execute('SELECT * FROM scan_files WHERE session_id = ?', (session_id,)).fetchall()
+                with db:
+                    db.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (self._expiry(), session_id))
+            return _to_session(row, files)
+        # ValueError also covers a baseline written in an older layout
+        except (sqlite3.Error, ValueError, KeyError, TypeError, ValidationError) as e:
+            logger.warning(f'Failed to load session {session_id}: {e}')
+            return None
+
+    def save(self, session: Session) -> None:
+        scan = session.last_scan
+        row = (
+            session.id,
+            session.path,
+            session.mode,
+            session.max_retry,
+            session.attempts,
+            session.last_fixed,
+            session.last_remaining,
+            json.dumps(_dump_baseline(session)),
+            scan.snapshot.taken_at_ns if scan else None,
+            self._expiry(),
+            json.dumps({path: [policy.mode, policy.max_retry] for path, policy in session.packages.items()}),
+            session.mode_override,
+            session.scope,
+            json.dumps([session.rules.select, session.rules.ignore]) if session.rules is not None else None,
+        )
+        try:
+            with self._lock:
+                db = self._connect()
+                with db:
+                    stored = db.execute('SELECT scanned_at_ns FROM sessions WHERE id = ?', (session.id,)).fetchone()
+                    db.execute(
+                        'INSERT OR REPLACE INTO sessions (id, path, mode, max_retry, attempts, last_fixed, '
+                        'last_remaining, baseline, scanned_at_ns, expires_at, packages, mode_override, scope, rules) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        row,
+                    )
+                    if scan is None:
+                        db.execute('DELETE FROM scan_files WHERE session_id = ?', (session.id,))
+                    # the same snapshot means the same last scan, already written
+                    elif stored is None or stored['scanned_at_ns'] != scan.snapshot.taken_at_ns:
+                        _write_scan(db, session.id, scan)
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to save session {session.id}: {e}')
+
+    def remove(self, session_id: str) -> Session | None:
+        with self._lock:
+            session = self.get(session_id)
+            if session is None:
+                return None
+            try:
+                db = self._connect()
+                with db:
+                    db.execute('DELETE FROM scan_files WHERE session_id = ?', (session_id,))
+                    db.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+            except sqlite3.Error as e:
+                logger.warning(f'Failed to remove session {session_id}: {e}')
+            return session
+
+    def purge_expired(self) -> int:
+        """Delete expired sessions and return how many there were."""
+        try:
+            with self._lock:
+                db = self._connect()
+                with db:
+                    now = time.time()
+                    db.execute(
+                        'INSERT OR REPLACE INTO evicted_sessions '
+                        "SELECT id, 'idle', ? FROM sessions WHERE expires_at <= ?",
+                        (now, now),
+                    )
+                    db.execute('DELETE FROM evicted_sessions WHERE evicted_at <= ?', (now - self.ttl_seconds,))
+                    db.execute(
+                        'DELETE FROM scan_files WHERE session_id IN (SELECT id FROM sessions WHERE expires_at <= ?)',
+                        (now,),
+                    )
+                    purged = db.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to purge expired sessions: {e}')
+            return 0
+        if purged:
+            self.evictions += purged
+            logger.debug(f'Purged {purged} expired session(s)')
+        return purged
+
+    def eviction_reason(self, session_id: str) -> str | None:
+        try:
+            with self._lock:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT 'idle' FROM sessions WHERE id = ? AND expires_at <= ? "
+                        'UNION ALL SELECT reason FROM evicted_sessions WHERE id = ?',
+                        (session_id, time.time(), session_id),
+                    )
+                    .fetchone()
+                )
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to look up session {session_id}: {e}')
+            return None
+        return row[0] if row is not None else None
+
+    def usage(self) -> SessionUsage:
+        sessions = size = 0
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._connect()
+                sessions, baseline_bytes = db.execute(
+                    'SELECT count(*), coalesce(sum(length(baseline)), 0) FROM sessions WHERE expires_at > ?', (now,)
+                ).fetchone()
+                (findings_bytes,) = db.execute(
+                    'SELECT coalesce(sum(length(findings)), 0) FROM scan_files WHERE session_id IN '
+                    '(SELECT id FROM sessions WHERE expires_at > ?)',
+                    (now,),
+                ).fetchone()
+                size = baseline_bytes + findings_bytes
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to measure the session database: {e}')
+        return SessionUsage(
+            store='sqlite', sessions=sessions, bytes=size, idle_ttl_seconds=self.ttl_seconds, evictions=self.evictions
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode = WAL')
+            # WAL keeps the database consistent on a crash with NORMAL; only the last commits may be lost
+            db.execute('PRAGMA synchronous = NORMAL')
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _expiry(self) -> float:
+        return time.time() + self.ttl_seconds
+
+
+def _dump_baseline(session: Session) -> list[list[Any]]:
+    baseline: list[list[Any]] = []
+    for fingerprint in session.initial.keys() | session.refs.keys():
+        refs = [[ref.file, ref.row, ref.code, ref.message] for ref in session.refs.get(fingerprint, [])]
+        baseline.append([fingerprint, session.initial[fingerprint], refs])
+    return baseline
+
+
+def _write_scan(db: sqlite3.Connection, session_id: str, scan: ScanState) -> None:
+    """Bring the session's scan rows up to `scan`, rewriting only the files whose findings may have changed.
+
+    A re-check re-lints only the files whose content changed, unless a
+    ruff config changed or an `__init__.py` came or went, so the other files
+    keep the findings stored for them; only their stat is refreshed.
+    """
+    stored: dict[str, tuple[Any, ...]] = {
+        row['path']: (row['mtime_ns'], row['size'], row['digest'])
+        for row in db.execute(
+            'SELECT path, mtime_ns, size, digest FROM scan_files WHERE session_id = ?', (session_id,)
+        )
+    }
+    # (mtime_ns, size, digest) per file
+    current: dict[str, tuple[Any, ...]] = dict.fromkeys(scan.findings, _NO_STATE)
+    current.update({path: (state.mtime_ns, state.size, state.digest) for path, state in scan.snapshot.files.items()})
+    packages_changed = any(
+        is_package_marker(path) and (path in scan.snapshot.files) != (stored.get(path, _NO_STATE)[2] is not None)
+        for path in scan.snapshot.files.keys() | stored.keys()
+    )
+    configs_changed = any(
+        is_ruff_config(path) and current.get(path, _NO_STATE)[2] != stored.get(path, _NO_STATE)[2]
+        for path in current.keys() | stored.keys()
+    )
+    rewritten: list[tuple[Any, ...]] = []
+    touched: list[tuple[Any, ...]] = []
+    for path, state in sorted(current.items()):
+        old = stored.get(path)
+        if packages_changed or configs_changed or old is None or state[2] is None or old[2] != state[2]:
+            findings = json.dumps([_dump_inspected(item) for item in scan.findings.get(path, [])])
+            rewritten.append((session_id, path, *state, findings))
+        elif old != state:
+            touched.append((state[0], state[1], session_id, path))
+    removed = [(session_id, path) for path in stored.keys() - current.keys()]
+    db.executemany('DELETE FROM scan_files WHERE session_id = ? AND path = ?', removed)
+    db.executemany('INSERT OR REPLACE INTO scan_files VALUES (?, ?, ?, ?, ?, ?)', rewritten)
+    db.executemany('UPDATE scan_files SET mtime_ns = ?, size = ? WHERE session_id = ? AND path = ?', touched)
+    logger.debug(
+        f'Session {session_id}: wrote {len(rewritten)}, refreshed {len(touched)}, dropped {len(removed)} file(s)'
+    )
+
+
+def _to_session(row: sqlite3.Row, files: list[sqlite3.Row]) -> Session:
+    initial: Counter[Fingerprint] = Counter()
+    refs: dict[Fingerprint, list[TrackedRef]] = {}
+    for fingerprint, count, raw_refs in json.loads(row['baseline']):
+        if count:
+            initial[fingerprint] = count
+        if raw_refs:
+            refs[fingerprint] = [TrackedRef.of(*ref) for ref in raw_refs]
+
+    last_scan: ScanState | None = None
+    if row['scanned_at_ns'] is not None:
+        states = {
+            file['path']: FileState(mtime_ns=file['mtime_ns'], size=file['size'], digest=file['digest'])
+            for file in files
+            if file['digest'] is not None
+        }
+        findings = {
+            file['path']: [_load_inspected(item) for item in items]
+            for file in files
+            if (items := json.loads(file['findings']))
+        }
+        last_scan = ScanState(snapshot=Snapshot(files=states, taken_at_ns=row['scanned_at_ns']), findings=findings)
+
+    return Session(
+        id=row['id'],
+        path=row['path'],
+        mode=row['mode'],
+        max_retry=row['max_retry'],
+        initial=initial,
+        refs=refs,
+        attempts=row['attempts'],
+        last_fixed=row['last_fixed'],
+        last_remaining=row['last_remaining'],
+        last_scan=last_scan,
+        packages={
+            path: TeachingPolicy(mode=mode, max_retry=max_retry)
+            for path, (mode, max_retry) in json.loads(row['packages']).items()
+        },
+        mode_override=row['mode_override'],
+        scope=row['scope'],
+        rules=_load_rules(row['rules']),
+    )
+
+
+def _load_rules(raw: str | None) -> RuleSelection | None:
+    if raw is None:
+        return None
+    select, ignore = json.loads(raw)
+    return RuleSelection(select=tuple(select), ignore=tuple(ignore))
+
+
+def _dump_inspected(item: Inspected) -> dict[str, Any]:
+    return {
+        'violation': item.violation.model_dump(),
+        'path': item.path,
+        'file': item.file,
+        'line': item.line,
+        'before': item.before,
+        'after': item.after,
+    }
+
+
+def _load_inspected(raw: dict[str, Any]) -> Inspected:
+    return Inspected(
+        violation=RuffViolation.model_validate(raw['violation']),
+        path=raw['path'],
+        file=raw['file'],
+        line=raw['line'],
+        before=raw['before'],
+        after=raw['after'],
+    )
@@ -1,22 +1,124 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import sys
+import threading
+import time
 import uuid
+import weakref
 from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
+from pathlib import PurePath
+from typing import Protocol
 
 from loguru import logger
 
-from ruff_tutor_mcp.models import ViolationRef
+from ruff_tutor_mcp.models import RuffViolation, SessionUsage, ViolationRef
+from ruff_tutor_mcp.ruff_runner import RuleSelection
+from ruff_tutor_mcp.snapshots import Snapshot
 
-# (relative file path, rule code, stripped text of the violated line)
-Fingerprint = tuple[str, str, str]
+# 64-bit digest of (relative file path, rule code, stripped text of the violated line)
+Fingerprint = int
 
-MAX_SESSIONS = 8
+FINGERPRINT_BYTES = 8
+
+# backstop for many small sessions; the memory budget usually evicts first
+MAX_SESSIONS = 64
+MAX_SESSION_BYTES = 256 * 1024 * 1024
+DEFAULT_SESSION_TTL_SECONDS = 24 * 60 * 60
+
+# evicted session ids remembered, so `check_my_fix` can say a session was evicted
+MAX_EVICTED_IDS = 1024
+
+# approximate bytes of one `Inspected` besides its strings (objects, ints, fix edits)
+INSPECTED_OVERHEAD_BYTES = 600
+# approximate bytes of one baseline violation: its fingerprint's counter and refs entries, and the ref itself
+TRACKED_BYTES = 350
+# approximate bytes of one file in a snapshot: its path and `FileState`
+SNAPSHOT_FILE_BYTES = 300
+SESSION_OVERHEAD_BYTES = 2048
 
 
 def make_fingerprint(file: str, code: str, line_text: str) -> Fingerprint:
-    """Build a fingerprint that survives line-number shifts caused by edits."""
-    return (file, code, line_text.strip())
+    """Build a fingerprint that survives line-number shifts caused by edits.
+
+    Only a digest of the parts is kept, so a large baseline does not hold
+    every violated line twice. Among 10,000 distinct violations the odds of
+    any two sharing a digest are about 1 in 10^11.
+    """
+    parts = f'{file}\0{code}\0{line_text.strip()}'.encode()
+    return int.from_bytes(hashlib.blake2b(parts, digest_size=FINGERPRINT_BYTES).digest())
+
+
+@dataclass(frozen=True, slots=True)
+class TrackedRef:
+    """A session's compact record of one violation, reported as a `ViolationRef` once fixed."""
+
+    file: str
+    row: int
+    code: str
+    message: str
+
+    @classmethod
+    def of(cls, file: str, row: int, code: str, message: str) -> TrackedRef:
+        # paths, codes and messages repeat across a tree's violations; interned, each is stored once
+        return cls(file=sys.intern(file), row=row, code=sys.intern(code), message=sys.intern(message))
+
+    def to_model(self) -> ViolationRef:
+        return ViolationRef(file=self.file, row=self.row, code=self.code, message=self.message)
+
+
+@dataclass
+class Inspected:
+    """A violation enriched with source context for teaching."""
+
+    violation: RuffViolation
+    # resolved absolute path of the file, matching `Snapshot` keys
+    path: str
+    file: str
+    line: str
+    before: str
+    after: str | None
+
+    @property
+    def fingerprint(self) -> Fingerprint:
+        return make_fingerprint(self.file, self.violation.code, self.line)
+
+    @property
+    def ref(self) -> TrackedRef:
+        return TrackedRef.of(self.file, self.violation.row, self.violation.code, self.violation.message)
+
+    @property
+    def estimated_size(self) -> int:
+        """Approximate bytes this item keeps alive."""
+        violation = self.violation
+        texts = [self.path, self.file, self.line, self.before, self.after, violation.message, violation.filename]
+        if violation.fix is not None:
+            texts += [violation.fix.message, *(edit.content for edit in violation.fix.edits)]
+        return INSPECTED_OVERHEAD_BYTES + sum(len(text) for text in texts if text)
+
+
+@dataclass
+class ScanState:
+    """State of the scan scope at a session's last scan, with that scan's findings per file.
+
+    Lets `check_my_fix` re-lint only the files edited since then.
+    """
+
+    snapshot: Snapshot
+    findings: dict[str, list[Inspected]]
+
+    @classmethod
+    def from_items(cls, snapshot: Snapshot, items: list[Inspected]) -> ScanState:
+        findings: dict[str, list[Inspected]] = {}
+        for item in items:
+            findings.setdefault(item.path, []).append(item)
+        return cls(snapshot=snapshot, findings=findings)
+
+    @property
+    def items(self) -> list[Inspected]:
+        return [item for path in sorted(self.findings) for item in self.findings[path]]
 
 
 @dataclass
@@ -24,7 +126,15 @@ class TrackedViolation:
     """A violation paired with its fingerprint for session tracking."""
 
     fingerprint: Fingerprint
-    ref: ViolationRef
+    ref: TrackedRef
+
+
+@dataclass(frozen=True, slots=True)
+class TeachingPolicy:
+    """How violations in one package are taught: its learning mode and retry limit."""
+
+    mode: str
+    max_retry: int
 
 
 @dataclass
@@ -36,10 +146,34 @@ class Session:
     mode: str
     max_retry: int
     initial: Counter[Fingerprint]
-    refs: dict[Fingerprint, list[ViolationRef]]
+    refs: dict[Fingerprint, list[TrackedRef]]
     attempts: int = 0
     last_fixed: int = 0
     last_remaining: int = 0
+    last_scan: ScanState | None = None
+    # directory of each package's config file -> its policy, for every package with violations so far.
+    # Files under no config file belong to the filesystem root's entry.
+    packages: dict[str, TeachingPolicy] = field(default_factory=dict)
+    # the mode the review was asked for, which overrides every package's; None to follow each package's config
+    mode_override: str | None = None
+    # files the session covers (`ReviewScope`): all under `path`, or only those changed in the git working tree
+    scope: str = 'all'
+    # rules every check of the session is narrowed to; None for the project's own selection
+    rules: RuleSelection | None = None
+
+    def policy_for(self, path: str) -> TeachingPolicy:
+        """Return the policy of the package holding the resolved file `path`."""
+        if self.packages:
+            for parent in PurePath(path).parents:
+                policy = self.packages.get(str(parent))
+                if policy is not None:
+                    return policy
+        return TeachingPolicy(mode=self.mode, max_retry=self.max_retry)
+
+    def reveals_fix(self, path: str) -> bool:
+        """Whether fixes are shown for violations in `path`: always, except in advanced mode before its retry limit."""
+        policy = self.policy_for(path)
+        return policy.mode != 'advanced' or self.attempts >= policy.max_retry
 
     def track_new(self, tracked: list[TrackedViolation]) -> None:
         """Fold newly appeared violations into the baseline so later checks treat them as remaining."""
@@ -47,51 +181,205 @@ class Session:
             self.initial[item.fingerprint] += 1
             self.refs.setdefault(item.fingerprint, []).append(item.ref)
 
+    @property
+    def estimated_size(self) -> int:
+        """Approximate bytes of the baseline and the last scan."""
+        size = SESSION_OVERHEAD_BYTES
+        for refs in self.refs.values():
+            size += sum(TRACKED_BYTES + len(ref.message) for ref in refs)
+        if self.last_scan is not None:
+            size += SNAPSHOT_FILE_BYTES * len(self.last_scan.snapshot.files)
+            size += sum(item.estimated_size for items in self.last_scan.findings.values() for item in items)
+        return size
+
     @property
     def rules_covered(self) -> list[str]:
-        return sorted({code for _, code, _ in self.initial})
+        return sorted({ref.code for refs in self.refs.values() for ref in refs})
+
+
+def new_session(
+    path: str, mode: str, max_retry: int, tracked: list[TrackedViolation], last_scan: ScanState | None = None
+) -> Session:
+    """Start a session whose baseline is `tracked`."""
+    refs: dict[Fingerprint, list[TrackedRef]] = {}
+    for item in tracked:
+        refs.setdefault(item.fingerprint, []).append(item.ref)
+    return Session(
+        id=uuid.uuid4().hex[:8],
+        path=path,
+        mode=mode,
+        max_retry=max_retry,
+        initial=Counter(item.fingerprint for item in tracked),
+        refs=refs,
+        last_remaining=len(tracked),
+        last_scan=last_scan,
+    )
+
+
+class SessionBackend(Protocol):
+    """Where sessions live between tool calls.
+
+    A session returned by `get` may be a copy: changes to it are only kept
+    once passed to `save`.
+    """
+
+    def create(
+        self,
+        path: str,
+        mode: str,
+        max_retry: int,
+        tracked: list[TrackedViolation],
+        last_scan: ScanState | None = None,
+    ) -> Session: ...
+
+    def get(self, session_id: str) -> Session | None: ...
+
+    def save(self, session: Session) -> None: ...
+
+    def remove(self, session_id: str) -> Session | None: ...
+
+    def eviction_reason(self, session_id: str) -> str | None:
+        """Why the session was dropped before it was ended: `idle` or `memory`; None if it never existed."""
+        ...
+
+    def usage(self) -> SessionUsage: ...
+
+
+class SessionLocks:
+    """One asyncio lock per session id, held by a tool call while it reads, changes and saves that session.
+
+    Without it two concurrent `check_my_fix` calls could both re-check the
+    same edit, counting the attempt twice and tracking new violations twice.
+    A lock is only kept while some call holds or waits for it.
+    """
+
+    def __init__(self) -> None:
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def __call__(self, session_id: str) -> asyncio.Lock:
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = self._locks[session_id] = asyncio.Lock()
+        return lock
+
+
+@dataclass
+class _Entry:
+    session: Session
+    size: int
+    last_used: float
 
 
 @dataclass
 class SessionStore:
-    """In-memory session store with least-recently-used eviction."""
+    """In-memory session store; safe to use from several threads.
+
+    Sessions unused for `idle_ttl_seconds` are dropped. Once the sessions'
+    estimated size passes `max_bytes`, or there are more than
+    `max_sessions`, the least recently used are evicted; the session just
+    created or saved is always kept. Sizes are re-estimated on every `save`.
+    """
 
     max_sessions: int = MAX_SESSIONS
-    _sessions: OrderedDict[str, Session] = field(default_factory=OrderedDict)
+    max_bytes: int = MAX_SESSION_BYTES
+    idle_ttl_seconds: float = DEFAULT_SESSION_TTL_SECONDS
+    evictions: int = 0
+    _sessions: OrderedDict[str, _Entry] = field(default_factory=OrderedDict)
+    _bytes: int = 0
+    _evicted: OrderedDict[str, str] = field(default_factory=OrderedDict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
 
-    def create(self, path: str, mode: str, max_retry: int, tracked: list[TrackedViolation]) -> Session:
-        refs: dict[Fingerprint, list[ViolationRef]] = {}
-        for item in tracked:
-            refs.setdefault(item.fingerprint, []).append(item.ref)
-        session = Session(
-            id=uuid.uuid4().hex[:8],
-            path=path,
-            mode=mode,
-            max_retry=max_retry,
-            initial=Counter(item.fingerprint for item in tracked),
-            refs=refs,
-            last_remaining=len(tracked),
-        )
-        self._sessions[session.id] = session
-        while len(self._sessions) > self.max_sessions:
-            evicted_id, _ = self._sessions.popitem(last=False)
-            logger.debug(f'Evicted oldest session: {evicted_id}')
+    def create(
+        self,
+        path: str,
+        mode: str,
+        max_retry: int,
+        tracked: list[TrackedViolation],
+        last_scan: ScanState | None = None,
+    ) -> Session:
+        session = new_session(path, mode, max_retry, tracked, last_scan)
+        with self._lock:
+            self._put(session)
         return session
 
     def get(self, session_id: str) -> Session | None:
-        session = self._sessions.get(session_id)
-        if session is not None:
+        with self._lock:
+            self._drop_idle()
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
             # refresh recency so an actively used session is not the next evicted
+            entry.last_used = time.monotonic()
             self._sessions.move_to_end(session_id)
-        return session
+            return entry.session
+
+    def save(self, session: Session) -> None:
+        # sessions are held by reference, so changes are already in place; only size and recency are refreshed
+        with self._lock:
+            if session.id in self._sessions:
+                self._put(session)
 
     def remove(self, session_id: str) -> Session | None:
-        return self._sessions.pop(session_id, None)
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                return None
+            self._bytes -= entry.size
+            return entry.session
+
+    def eviction_reason(self, session_id: str) -> str | None:
+        with self._lock:
+            self._drop_idle()
+            return self._evicted.get(session_id)
+
+    def usage(self) -> SessionUsage:
+        with self._lock:
+            self._drop_idle()
+            return SessionUsage(
+                store='memory',
+                sessions=len(self._sessions),
+                bytes=self._bytes,
+                max_sessions=self.max_sessions,
+                max_bytes=self.max_bytes,
+                idle_ttl_seconds=self.idle_ttl_seconds,
+                evictions=self.evictions,
+            )
+
+    def _put(self, session: Session) -> None:
+        old = self._sessions.pop(session.id, None)
+        if old is not None:
+            self._bytes -= old.size
+        entry = _Entry(session=session, size=session.estimated_size, last_used=time.monotonic())
+        self._sessions[session.id] = entry
+        self._bytes += entry.size
+        self._drop_idle()
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            self._evict(next(iter(self._sessions)), 'memory')
+        if self._bytes > self.max_bytes:
+            logger.warning(f'Session {session.id} alone takes ~{entry.size} bytes, over the session memory budget')
+
+    def _drop_idle(self) -> None:
+        deadline = time.monotonic() - self.idle_ttl_seconds
+        # least recently used first, so the idle ones lead
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if entry.last_used > deadline:
+                break
+            self._evict(session_id, 'idle')
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        entry = self._sessions.pop(session_id)
+        self._bytes -= entry.size
+        self.evictions += 1
+        self._evicted[session_id] = reason
+        while len(self._evicted) > MAX_EVICTED_IDS:
+            self._evicted.popitem(last=False)
+        logger.debug(f'Evicted session {session_id} ({reason}, ~{entry.size} bytes)')
 
 
 def split_progress(
     initial: Counter[Fingerprint],
-    refs: dict[Fingerprint, list[ViolationRef]],
+    refs: dict[Fingerprint, list[TrackedRef]],
     current: list[Fingerprint],
 ) -> tuple[list[ViolationRef], list[bool]]:
     """Partition current violations against the session baseline.
@@ -119,7 +407,7 @@ def split_progress(
             continue
         # which of several identical occurrences was fixed is unknowable;
         # report distinct refs up to the fixed count, padding with the last one
-        fixed.extend(candidates[:count])
-        fixed.extend([candidates[-1]] * (count - len(candidates)))
+        fixed.extend(ref.to_model() for ref in candidates[:count])
+        fixed.extend([candidates[-1].to_model()] * (count - len(candidates)))
 
     return fixed, remaining_flags
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+import tomllib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+# files ruff lints by default
+SOURCE_SUFFIXES = frozenset({'.py', '.pyi', '.ipynb'})
+
+# files whose change can alter ruff's results for every other file
+RUFF_CONFIG_FILE_NAMES = frozenset({'pyproject.toml', 'ruff.toml', '.ruff.toml'})
+
+# files whose arrival or removal can alter ruff's results for their neighbours (e.g. INP001)
+PACKAGE_MARKER_NAMES = frozenset({'__init__.py', '__init__.pyi'})
+
+# ruff's default `exclude` directories; nothing below them is ever linted
+EXCLUDED_DIR_NAMES = frozenset(
+    {
+        '.bzr',
+        '.direnv',
+        '.eggs',
+        '.git',
+        '.git-rewrite',
+        '.hg',
+        '.ipynb_checkpoints',
+        '.mypy_cache',
+        '.nox',
+        '.pants.d',
+        '.pyenv',
+        '.pytest_cache',
+        '.pytype',
+        '.ruff_cache',
+        '.svn',
+        '.tox',
+        '.venv',
+        '.vscode',
+        '__pypackages__',
+        '_build',
+        'buck-out',
+        'dist',
+        'node_modules',
+        'site-packages',
+        'venv',
+    }
+)
+
+# a file modified within this window of a snapshot may share its mtime with a
+# later edit (coarse filesystem timestamps), so its stat alone is not trusted
+RACY_WINDOW_NS = 2_000_000_000
+
+
+@dataclass(frozen=True)
+class FileState:
+    """Stat and content digest of one file at snapshot time."""
+
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Per-file states for a scan scope, keyed by resolved absolute path."""
+
+    files: dict[str, FileState]
+    taken_at_ns: int
+
+    @property
+    def digest(self) -> str:
+        """Content digest of the whole scope: every file's path and content digest.
+
+        Stat data is left out, so touching a file without editing it keeps
+        the digest. Ruff configs are in scope, along with the configs they
+        `extend`, so it covers the config chain.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for path in sorted(self.files):
+            digest.update(f'{path}\0{self.files[path].digest}\n'.encode())
+        return digest.hexdigest()
+
+    def changes(self, current: Snapshot) -> tuple[list[str], list[str]]:
+        """Return (changed_or_added, removed) paths between this snapshot and a newer one.
+
+        Files whose stat changed but whose content did not (e.g. re-saved
+        without edits) are not reported.
+        """
+        changed = [
+            path
+            for path, state in current.files.items()
+            if (old := self.files.get(path)) is None or old.digest != state.digest
+        ]
+        removed = [path for path in self.files if path not in current.files]
+        return changed, removed
+
+
+def take_snapshot(
+    path: str | Path, previous: Snapshot | None = None, only: Iterable[str | Path] | None = None
+) -> Snapshot:
+    """Record the state of every lintable file and ruff config affecting `path`.
+
+    With `previous`, files whose stat is unchanged (and not racily recent)
+    reuse the previous digest instead of being read again. With `only`,
+    those files stand in for the ones found under `path` (see `scope_files`).
+    """
+    taken_at_ns = time.time_ns()
+    files: dict[str, FileState] = {}
+    for file in scope_files(Path(path).resolve(), only):
+        try:
+            stat = file.stat()
+        except OSError:
+            continue
+        key = str(file)
+        old = previous.files.get(key) if previous is not None else None
+        if (
+            previous is not None
+            and old is not None
+            and old.mtime_ns == stat.st_mtime_ns
+            and old.size == stat.st_size
+            and old.mtime_ns < previous.taken_at_ns - RACY_WINDOW_NS
+        ):
+            files[key] = old
+            continue
+        try:
+            digest = hashlib.blake2b(file.read_bytes(), digest_size=16).hexdigest()
+        except OSError:
+            continue
+        files[key] = FileState(mtime_ns=stat.st_mtime_ns, size=stat.st_size, digest=digest)
+    return Snapshot(files=files, taken_at_ns=taken_at_ns)
+
+
+def tree_state(*paths: str | Path) -> str:
+    """Return a cheap digest of the stat data (path, mtime, size) of everything `paths` cover.
+
+    Includes the ruff configs above each path and the configs they
+    `extend`, so it changes whenever a source or config in scope is saved.
+    Only configs are read, to follow their `extend`.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        for file in scope_files(Path(path).resolve()):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            digest.update(f'{file}\0{stat.st_mtime_ns}\0{stat.st_size}\n'.encode())
+    return digest.hexdigest()
+
+
+def is_ruff_config(path: str) -> bool:
+    # any other TOML in a snapshot is there because a ruff config `extend`s it
+    return Path(path).name in RUFF_CONFIG_FILE_NAMES or Path(path).suffix == '.toml'
+
+
+def is_package_marker(path: str | Path) -> bool:
+    return Path(path).name in PACKAGE_MARKER_NAMES
+
+
+def is_source(path: str | Path) -> bool:
+    return Path(path).suffix in SOURCE_SUFFIXES
+
+
+def scope_files(root: Path, only: Iterable[str | Path] | None = None) -> list[Path]:
+    """Return the ruff configs affecting `root` followed by the source files it covers.
+
+    The configs include those any config in scope pulls in through
+    `extend`. With `only`, the given files are listed instead of walking `root`.
+    """
+    if only is not None:
+        # with no walk to find it, the root's own config is looked up with its ancestors
+        ancestors = [root.parent, *root.parent.parents] if root.is_file() else [root, *root.parents]
+        files = sorted(Path(file) for file in only)
+    elif root.is_file():
+        ancestors, files = [root.parent, *root.parent.parents], [root]
+    else:
+        ancestors, files = list(root.parents), _walk(root)
+    # configs above the scan root are discovered (and honored) by ruff too
+    configs = [
+        directory / name
+        for directory in ancestors
+        for name in sorted(RUFF_CONFIG_FILE_NAMES)
+        if (directory / name).is_file()
+    ]
+    listed = {*configs, *files}
+    extended = [
+        config
+        for config in _extended_configs([*configs, *(file for file in files if file.name in RUFF_CONFIG_FILE_NAMES)])
+        if config not in listed
+    ]
+    return configs + extended + files
+
+
+def _extended_configs(configs: list[Path]) -> list[Path]:
+    """Return `configs` and, transitively, every existing config their `extend` points at."""
+    found = dict.fromkeys(configs)
+    pending = list(configs)
+    while pending:
+        extended = _extends(pending.pop())
+        if extended is not None and extended not in found and extended.is_file():
+            found[extended] = None
+            pending.append(extended)
+    return list(found)
+
+
+def _extends(config: Path) -> Path | None:
+    """Return the config `config` extends, resolved as ruff does: relative to its own directory."""
+    try:
+        settings = tomllib.loads(config.read_text(encoding='utf-8'))
+    except (OSError, UnicodeDecodeError, tomllib.TOMLDecodeError):
+        return None
+    if config.name == 'pyproject.toml':
+        tool = settings.get('tool')
+        settings = tool.get('ruff') if isinstance(tool, dict) else None
+    extend = settings.get('extend') if isinstance(settings, dict) else None
+    if not isinstance(extend, str):
+        return None
+    return (config.parent / Path(os.path.expandvars(extend)).expanduser()).resolve()
+
+
+def _walk(root: Path) -> list[Path]:
+    files: list[Path] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if name not in EXCLUDED_DIR_NAMES)
+        directory = Path(dirpath)
+        files.extend(
+            directory / name for name in sorted(filenames) if is_source(name) or name in RUFF_CONFIG_FILE_NAMES
+        )
+    return files
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import shutil
+from pathlib import Path
+
+from loguru import logger
+
+from ruff_tutor_mcp.snapshots import is_ruff_config, is_source
+
+# deadline for each local git call; they read the index and the working tree only
+GIT_TIMEOUT_SECONDS = 30
+
+# `@@ -a,b +c,d @@` of a zero-context hunk; `d` is left out when it is 1
+_HUNK_HEADER = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+# resolved file -> changed line numbers (1-based), or None when the whole file counts as changed
+ChangedLines = dict[str, set[int] | None]
+
+
+class GitError(Exception):
+    """git is missing, failed, or the path is not inside a git working tree."""
+
+
+async def working_tree_changes(path: str | Path, *, hunks: bool = False) -> ChangedLines:
+    """Return the lintable files and ruff configs under `path` that differ from HEAD or are untracked.
+
+    Only the local repository is read (`git status`, plus `git diff` with
+    `hunks`); nothing is fetched. Deleted files are left out. With `hunks`,
+    each tracked file maps to the lines added or modified since HEAD;
+    untracked files, and every file of a repository without commits,
+    count as changed throughout.
+
+    Raises GitError when git cannot answer.
+    """
+    target = Path(path).resolve()
+    top = Path((await _git(target if target.is_dir() else target.parent, 'rev-parse', '--show-toplevel')).strip())
+    status = await _git(top, 'status', '--porcelain=v1', '-z', '--untracked-files=all', '--', str(target))
+    changed: ChangedLines = {}
+    entries = iter(status.split('\0'))
+    for entry in entries:
+        if not entry:
+            continue
+        code, name = entry[:2], entry[3:]
+        if code[0] in 'RC':
+            # a rename or copy is followed by its source path
+            next(entries, None)
+        file = (top / name).resolve()
+        if (is_source(file) or is_ruff_config(str(file))) and file.is_file():
+            changed[str(file)] = None
+    if hunks and changed and await _has_head(top):
+        diff = await _git(top, 'diff', '-U0', '--no-color', '--no-ext-diff', 'HEAD', '--', str(target))
+        for name, lines in _parse_hunks(diff, top).items():
+            if name in changed:
+                changed[name] = lines
+    logger.debug(f'{len(changed)} changed file(s) under {target}')
+    return changed
+
+
+def _parse_hunks(diff: str, top: Path) -> dict[str, set[int]]:
+    """Map each file of a zero-context diff to the new-side line numbers its hunks touch."""
+    lines: dict[str, set[int]] = {}
+    current: set[int] | None = None
+    for line in diff.splitlines():
+        if line.startswith('+++ '):
+            name = line[4:]
+            # deletions (`/dev/null`) and quoted unusual names are left out, so count as changed throughout
+            current = lines.setdefault(str((top / name[2:]).resolve()), set()) if name.startswith('b/') else None
+        elif current is not None and (match := _HUNK_HEADER.match(line)):
+            start, count = int(match[1]), int(match[2] or 1)
+            current.update(range(start, start + count))
+    return lines
+
+
+async def _has_head(top: Path) -> bool:
+    try:
+        await _git(top, 'rev-parse', '--verify', '--quiet', 'HEAD')
+    except GitError:
+        return False
+    return True
+
+
+async def _git(cwd: Path, *args: str) -> str:
+    git = shutil.which('git')
+    if git is None:
+        msg = 'git is not installed'
+        raise GitError(msg)
+    command = [git, '-c', 'core.quotepath=off', *args]
+    logger.debug(f'Running: {" ".join(command)}')
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # read-only: never take the index lock a concurrent git command may need
+            env={**os.environ, 'GIT_OPTIONAL_LOCKS': '0'},
+        )
+    except OSError as e:
+        msg = f'Failed to run git in {cwd}: {e}'
+        raise GitError(msg) from e
+    try:
+        async with asyncio.timeout(GIT_TIMEOUT_SECONDS):
+            stdout, stderr = await process.communicate()
+    except TimeoutError as e:
+        process.kill()
+        await process.wait()
+        msg = f'git {args[0]} did not finish within {GIT_TIMEOUT_SECONDS} seconds'
+        raise GitError(msg) from e
+    if process.returncode != 0:
+        msg = f'git {args[0]} failed ({process.returncode}): {stderr.decode("utf-8", "replace").strip()}'
+        raise GitError(msg)
+    return stdout.decode('utf-8', 'replace')
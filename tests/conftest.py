@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+from typing import TYPE_CHECKING
+
+import pytest
+
+from ruff_tutor_mcp.cache import CACHE_DIR_ENV
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch) -> Path:
+    # keep every test off the real user cache directory
+    cache_dir = tmp_path_factory.mktemp('cache')
+    monkeypatch.setenv(CACHE_DIR_ENV, str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return 'asyncio'
+
+
+@pytest.fixture
+def git() -> Callable[..., None]:
+    """Return a runner of git commands in a directory, committing as a fixed author."""
+    executable = shutil.which('git')
+    if executable is None:
+        pytest.skip('git is not installed')
+
+    def run(repo: Path, *args: str) -> None:
+        identity = ['-c', 'user.name=Ruff Tutor', '-c', 'user.email=tutor@example.com', '-c', 'commit.gpgsign=false']
+        subprocess.run([executable, *identity, *args], cwd=repo, check=True, capture_output=True)  # noqa: S603
+
+    return run
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from ruff_tutor_mcp import instructions
+from ruff_tutor_mcp.budget import MIN_RESPONSE_BYTES, fit_to_budget, headers_fit
+from ruff_tutor_mcp.models import Progress, ReviewResponse, ViolationDetail, ViolationGroup, ViolationRef
+
+
+def group(code: str, count: int, files: int = 1) -> ViolationGroup:
+    return ViolationGroup(
+        code=code,
+        rule_name='rule',
+        summary='summary',
+        count=count,
+        violations=[
+            ViolationDetail(
+                file=f'pkg/module_{row % files}.py',
+                row=row,
+                col=1,
+                message='a rather long message about what went wrong here',
+                before='x = "' + 'y' * 200 + '"',
+                after='x = "' + 'z' * 200 + '"',
+            )
+            for row in range(1, count + 1)
+        ],
+    )
+
+
+def review(*groups: ViolationGroup) -> ReviewResponse:
+    total = sum(g.count for g in groups)
+    return ReviewResponse(status='violations_found', mode='auto', total=total, groups=list(groups), instruction='go')
+
+
+class TestFitToBudget:
+    def test_small_response_is_untouched(self) -> None:
+        response = review(group('A', 3))
+        assert fit_to_budget(response, 64 * 1024) is response
+
+    def test_large_response_keeps_first_violations_per_group(self) -> None:
+        response = review(group('A', 300, files=30), group('B', 5))
+        budget = 16 * 1024
+        fitted = fit_to_budget(response, budget)
+
+        assert len(fitted.model_dump_json()) <= budget
+        a, b = fitted.groups
+        # up to the same number of detailed examples per group, the rest counted
+        assert len(a.violations) > len(b.violations) == 5
+        assert len(a.violations) + a.omitted == a.count == 300
+        assert len(b.violations) + b.omitted == b.count == 5
+        assert a.violations[0].row == 1
+        assert a.omitted_files
+        assert set(a.omitted_files) <= {f'pkg/module_{n}.py' for n in range(30)}
+        assert instructions.TRUNCATED in fitted.instruction
+        assert fitted.total == 305
+
+    def test_tiny_budget_is_raised_to_the_minimum(self) -> None:
+        fitted = fit_to_budget(review(group('A', 300)), 10)
+        assert len(fitted.model_dump_json()) <= MIN_RESPONSE_BYTES
+
+    def test_oversized_fixed_list_is_cut(self) -> None:
+        fixed = [ViolationRef(file=f'm{n}.py', row=n, code='F401', message='unused import') for n in range(2000)]
+        progress = Progress(verdict='keep_trying', attempts=1, max_retry=2, fixed=fixed, instruction='go')
+        fitted = fit_to_budget(progress, 16 * 1024)
+        assert len(fitted.model_dump_json()) <= 16 * 1024
+        assert len(fitted.fixed) + fitted.fixed_omitted == 2000
+        assert fitted.fixed_omitted > 0
+        assert instructions.TRUNCATED in fitted.instruction
+
+
+class TestHeadersFit:
+    def test_none_when_every_header_fits(self) -> None:
+        assert headers_fit(review(group('A', 300), group('B', 5)), 16 * 1024) is None
+
+    def test_counts_the_violations_of_the_groups_that_fit(self) -> None:
+        response = review(*(group(f'R{n:03}', 1) for n in range(300)))
+        shown = headers_fit(response, 16 * 1024)
+        assert shown is not None
+        assert 0 < shown < 300
+
+    def test_first_group_is_always_shown(self) -> None:
+        long = group('A', 2).model_copy(update={'summary': 'x' * MIN_RESPONSE_BYTES})
+        assert headers_fit(review(long, group('B', 1)), MIN_RESPONSE_BYTES) == 2
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import time
+from typing import TYPE_CHECKING
+
+from ruff_tutor_mcp.cache import (
+    CACHE_DIR_ENV,
+    LAST_USED_FILE_NAME,
+    RuffCacheDirs,
+    RuleDocCache,
+    user_cache_dir,
+)
+from ruff_tutor_mcp.models import RuleDoc
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+
+RULES = {
+    'E712': RuleDoc(
+        code='E712',
+        name='true-false-comparison',
+        summary='Avoid equality comparisons to `True`',
+        explanation='## What it does\n...',
+        fix_availability='Always',
+        url='https://docs.astral.sh/ruff/rules/true-false-comparison/',
+    )
+}
+
+
+class TestUserCacheDir:
+    def test_env_override(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+        assert user_cache_dir() == tmp_path
+
+    def test_xdg_cache_home(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.delenv(CACHE_DIR_ENV)
+        monkeypatch.setattr('sys.platform', 'linux')
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+        assert user_cache_dir() == tmp_path / 'ruff-tutor-mcp'
+
+
+class TestRuleDocCache:
+    def test_round_trip(self, tmp_path: Path) -> None:
+        cache = RuleDocCache(str(tmp_path / 'ruff'))
+        assert cache.load() is None
+        cache.save(RULES)
+        assert cache.load() == RULES
+
+    def test_other_binary_invalidates(self, tmp_path: Path) -> None:
+        RuleDocCache(str(tmp_path / 'ruff')).save(RULES)
+        assert RuleDocCache(str(tmp_path / 'other' / 'ruff')).load() is None
+
+    def test_other_version_invalidates(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        cache = RuleDocCache(str(tmp_path / 'ruff'))
+        cache.save(RULES)
+        monkeypatch.setattr('ruff_tutor_mcp.cache.metadata.version', lambda name: '0.0.0')
+        assert cache.load() is None
+
+    def test_corrupt_file_is_ignored(self, tmp_path: Path) -> None:
+        cache = RuleDocCache(str(tmp_path / 'ruff'))
+        cache.path.parent.mkdir(parents=True, exist_ok=True)
+        cache.path.write_text('not json')
+        assert cache.load() is None
+
+
+def last_used(directory: Path, days_ago: float) -> None:
+    stamp = time.time() - days_ago * 24 * 60 * 60
+    os.utime(directory / LAST_USED_FILE_NAME, (stamp, stamp))
+
+
+class TestRuffCacheDirs:
+    def test_one_directory_per_workspace(self, tmp_path: Path) -> None:
+        (tmp_path / 'a').mkdir()
+        (tmp_path / 'b').mkdir()
+        (tmp_path / 'a' / 'x.py').write_text('')
+        caches = RuffCacheDirs()
+        first = caches.for_workspace(tmp_path / 'a')
+        assert first is not None
+        assert first.is_dir()
+        assert not first.is_relative_to(tmp_path)
+        # a file belongs to the workspace of its directory
+        assert caches.for_workspace(tmp_path / 'a' / 'x.py') == first
+        assert caches.for_workspace(tmp_path / 'b') != first
+
+    def test_prune_removes_unused_workspaces(self, tmp_path: Path) -> None:
+        caches = RuffCacheDirs(max_age_days=7)
+        fresh = caches.for_workspace(tmp_path / 'fresh')
+        stale = caches.for_workspace(tmp_path / 'stale')
+        assert fresh is not None
+        assert stale is not None
+        last_used(stale, days_ago=30)
+        assert caches.prune() == [stale]
+        assert fresh.exists()
+        assert not stale.exists()
+
+    def test_prune_enforces_size_cap_oldest_first(self, tmp_path: Path) -> None:
+        caches = RuffCacheDirs(max_bytes=1500)
+        directories = []
+        for index, name in enumerate(['old', 'mid', 'new']):
+            directory = caches.for_workspace(tmp_path / name)
+            assert directory is not None
+            (directory / 'data').write_bytes(b'x' * 600)
+            last_used(directory, days_ago=3 - index)
+            directories.append(directory)
+        assert caches.prune() == [directories[0]]
+        assert [d.exists() for d in directories] == [False, True, True]
+
+    def test_prune_keeps_most_recent_even_over_cap(self, tmp_path: Path) -> None:
+        caches = RuffCacheDirs(max_bytes=10, max_age_days=1)
+        directory = caches.for_workspace(tmp_path)
+        assert directory is not None
+        (directory / 'data').write_bytes(b'x' * 100)
+        last_used(directory, days_ago=30)
+        assert caches.prune() == []
@@ -2,21 +2,25 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import time
+from pathlib import Path
 
 import pytest
 from pydantic import ValidationError
 
+from ruff_tutor_mcp import config as config_module
 from ruff_tutor_mcp.config import (
     CONFIG_FILE_NAME,
+    DISCOVERY_TTL_SECONDS,
+    ConfigIndex,
+    RuffBackend,
+    SessionStoreKind,
     TutorConfig,
     TutorMode,
+    clear_config_cache,
     load_config,
 )
 
-if TYPE_CHECKING:
-    from pathlib import Path
-
 # Test constants
 DEFAULT_MAX_RETRY = 2
 CUSTOM_MAX_RETRY = 5
@@ -41,6 +45,7 @@ class TestTutorConfig:
         config = TutorConfig.default()
         assert config.mode == TutorMode.AUTO
         assert config.max_retry == DEFAULT_MAX_RETRY
+        assert config.backend == RuffBackend.CLI
 
     def test_custom_config(self) -> None:
         """Verify that custom configuration is created correctly."""
@@ -74,6 +79,36 @@ class TestLoadConfig:
         assert config.mode == TutorMode.ADVANCED
         assert config.max_retry == FILE_MAX_RETRY
 
+    def test_load_backend_from_file(self, tmp_path: Path) -> None:
+        """Verify that the ruff backend can be selected in the config file."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('backend = "server"\n')
+
+        config = load_config(tmp_path)
+        assert config.backend == RuffBackend.SERVER
+
+    def test_load_timeout_from_file(self, tmp_path: Path) -> None:
+        """Verify that the per-check timeout can be set in the config file."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('timeout = 2.5\n')
+
+        config = load_config(tmp_path)
+        assert config.timeout == 2.5
+
+    def test_load_session_store_from_file(self, tmp_path: Path) -> None:
+        """Verify that the sqlite session store and its TTL can be selected in the config file."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('session_store = "sqlite"\nsession_ttl_hours = 2\n')
+
+        config = load_config(tmp_path)
+        assert config.session_store == SessionStoreKind.SQLITE
+        assert config.session_ttl_hours == 2
+
+    def test_load_session_memory_budget_from_file(self, tmp_path: Path) -> None:
+        """Verify that the memory session store's budget can be set in the config file."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('session_memory_mb = 32\n')
+
+        config = load_config(tmp_path)
+        assert config.session_store == SessionStoreKind.MEMORY
+        assert config.session_memory_mb == 32
+
     def test_mode_override(self, tmp_path: Path) -> None:
         """Verify that mode_override can override the mode."""
         config_file = tmp_path / CONFIG_FILE_NAME
@@ -105,3 +140,130 @@ class TestLoadConfig:
 
         config = load_config(tmp_path)
         assert config.mode == TutorMode.AUTO
+
+
+class TestConfigCache:
+    """Tests for the cached config file discovery and parsing."""
+
+    @pytest.fixture
+    def searches(self, monkeypatch: pytest.MonkeyPatch) -> list[Path]:
+        calls: list[Path] = []
+        find = config_module._find_config_file  # noqa: SLF001
+
+        def spy(start_path: Path) -> Path | None:
+            calls.append(start_path)
+            return find(start_path)
+
+        monkeypatch.setattr(config_module, '_find_config_file', spy)
+        return calls
+
+    def test_repeated_load_does_not_search_again(self, tmp_path: Path, searches: list[Path]) -> None:
+        """Verify that the parent directories are searched once per path."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('mode = "beginner"\n')
+
+        assert load_config(tmp_path).mode == TutorMode.BEGINNER
+        assert load_config(tmp_path).mode == TutorMode.BEGINNER
+        assert len(searches) == 1
+
+    def test_edit_applies_at_once(self, tmp_path: Path) -> None:
+        """Verify that a changed config file is parsed again on the next load."""
+        config_file = tmp_path / CONFIG_FILE_NAME
+        config_file.write_text('mode = "beginner"\n')
+        assert load_config(tmp_path).mode == TutorMode.BEGINNER
+
+        config_file.write_text('mode = "advanced"\n')
+        assert load_config(tmp_path).mode == TutorMode.ADVANCED
+
+    def test_removed_file_is_searched_again(self, tmp_path: Path) -> None:
+        """Verify that a removed config file falls back to the next one up."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('mode = "beginner"\n')
+        subdir = tmp_path / 'subdir'
+        subdir.mkdir()
+        (subdir / CONFIG_FILE_NAME).write_text('mode = "advanced"\n')
+        assert load_config(subdir).mode == TutorMode.ADVANCED
+
+        (subdir / CONFIG_FILE_NAME).unlink()
+        assert load_config(subdir).mode == TutorMode.BEGINNER
+
+    def test_negative_lookup_expires(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Verify that a config file created after a failed search is found once the search expires."""
+        now = 1_000.0
+        monkeypatch.setattr('ruff_tutor_mcp.config.time.monotonic', lambda: now)
+        assert load_config(tmp_path).max_retry == DEFAULT_MAX_RETRY
+
+        (tmp_path / CONFIG_FILE_NAME).write_text(f'max_retry = {CUSTOM_MAX_RETRY}\n')
+        assert load_config(tmp_path).max_retry == DEFAULT_MAX_RETRY
+        now += DISCOVERY_TTL_SECONDS
+        assert load_config(tmp_path).max_retry == CUSTOM_MAX_RETRY
+
+    def test_override_does_not_change_cached_config(self, tmp_path: Path) -> None:
+        """Verify that a mode override applies to one call only."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('mode = "beginner"\n')
+
+        assert load_config(tmp_path, mode_override='advanced').mode == TutorMode.ADVANCED
+        assert load_config(tmp_path).mode == TutorMode.BEGINNER
+
+    def test_warm_load_is_faster_than_cold(self, tmp_path: Path) -> None:
+        """Micro-benchmark: a warm load skips the parent search and the TOML parse."""
+        (tmp_path / CONFIG_FILE_NAME).write_text('mode = "beginner"\nmax_retry = 3\nbackend = "cli"\n')
+        deep = tmp_path.joinpath(*(f'level{n}' for n in range(30)))
+        deep.mkdir(parents=True)
+
+        def best_of(runs: int, *, cold: bool) -> float:
+            timings = []
+            for _ in range(runs):
+                if cold:
+                    clear_config_cache()
+                start = time.perf_counter()
+                load_config(deep)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        cold = best_of(20, cold=True)
+        warm = best_of(20, cold=False)
+        # typically 10x or more; a wide margin keeps the test stable on a busy machine
+        assert warm * 3 < cold
+
+
+class TestConfigIndex:
+    """Tests for per-package config resolution."""
+
+    @pytest.fixture
+    def monorepo(self, tmp_path: Path) -> Path:
+        (tmp_path / CONFIG_FILE_NAME).write_text('mode = "auto"\n')
+        for name, mode in (('a', 'beginner'), ('b', 'advanced')):
+            (tmp_path / name / 'src' / 'deep').mkdir(parents=True)
+            (tmp_path / name / CONFIG_FILE_NAME).write_text(f'mode = "{mode}"\n')
+        (tmp_path / 'tools').mkdir()
+        return tmp_path
+
+    def test_nearest_config_per_file(self, monorepo: Path) -> None:
+        """Verify that each file gets the config of its closest package."""
+        index = ConfigIndex()
+        assert index.config_for(monorepo / 'a' / 'src' / 'deep' / 'x.py').mode == TutorMode.BEGINNER
+        assert index.config_for(monorepo / 'b' / 'src' / 'y.py').mode == TutorMode.ADVANCED
+        assert index.config_for(monorepo / 'tools' / 'z.py').mode == TutorMode.AUTO
+        assert index.config_file_for(monorepo / 'a' / 'x.py') == monorepo / 'a' / CONFIG_FILE_NAME
+
+    def test_each_directory_is_checked_once(self, monorepo: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Verify that files sharing directories share the walk up to their config file."""
+        checked: list[Path] = []
+        is_file = Path.is_file
+
+        def spy(self: Path) -> bool:
+            checked.append(self.parent)
+            return is_file(self)
+
+        monkeypatch.setattr(Path, 'is_file', spy)
+        index = ConfigIndex()
+        deep = monorepo / 'a' / 'src' / 'deep'
+        for name in ('x.py', 'y.py', 'z.py'):
+            index.config_for(deep / name)
+        index.config_for(monorepo / 'a' / 'src' / 'w.py')
+        assert checked == [deep, deep.parent, monorepo / 'a']
+
+    def test_mode_override_applies_to_every_package(self, monorepo: Path) -> None:
+        """Verify that an explicit mode wins over every package's config."""
+        index = ConfigIndex(mode_override='advanced')
+        assert index.config_for(monorepo / 'a' / 'x.py').mode == TutorMode.ADVANCED
+        assert index.config_for(monorepo / 'tools' / 'z.py').mode == TutorMode.ADVANCED
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-from ruff_tutor_mcp.fixes import render_fix, source_line
+import random
+
+import pytest
+
+from ruff_tutor_mcp.fixes import LineIndex, render_fix, source_line
 from ruff_tutor_mcp.models import FixEdit, RuffFix, RuffViolation
 
 
@@ -18,21 +22,34 @@ def make_violation(row: int, edits: list[FixEdit] | None = None) -> RuffViolatio
     )
 
 
+class TestLineIndex:
+    def test_offsets_match_normalized_text(self) -> None:
+        index = LineIndex('ab\r\ncd\rxyz')
+        assert index.text == 'ab\ncd\nxyz'
+        assert index.lines == ['ab', 'cd', 'xyz']
+        assert index.offset(3, 2) == index.text.index('yz')
+
+    def test_offset_is_clamped_to_file_end(self) -> None:
+        index = LineIndex('x = 1\n')
+        assert index.offset(1, 99) == len(index.text)
+        assert index.offset(99, 1) == len(index.text)
+
+
 class TestSourceLine:
     def test_returns_line_text(self) -> None:
-        assert source_line('a\nb\nc\n', 2) == 'b'
+        assert source_line(LineIndex('a\nb\nc\n'), 2) == 'b'
 
     def test_out_of_range_returns_empty(self) -> None:
-        assert source_line('a\n', 5) == ''
+        assert source_line(LineIndex('a\n'), 5) == ''
 
     def test_normalizes_crlf(self) -> None:
-        assert source_line('a\r\nb\r\n', 2) == 'b'
+        assert source_line(LineIndex('a\r\nb\r\n'), 2) == 'b'
 
 
 class TestRenderFix:
     def test_no_fix_returns_line_and_none(self) -> None:
         violation = make_violation(row=2)
-        before, after = render_fix('a\nif x == True:\nc\n', violation)
+        before, after = render_fix(LineIndex('a\nif x == True:\nc\n'), violation)
         assert before == 'if x == True:'
         assert after is None
 
@@ -40,7 +57,7 @@ class TestRenderFix:
         source = 'a = 1\nif x == True:\n    pass\n'
         # replace "x == True" (row 2, cols 4-13) with "x"
         edits = [FixEdit(content='x', row=2, col=4, end_row=2, end_col=13)]
-        before, after = render_fix(source, make_violation(row=2, edits=edits))
+        before, after = render_fix(LineIndex(source), make_violation(row=2, edits=edits))
         assert before == 'if x == True:'
         assert after == 'if x:'
 
@@ -48,7 +65,7 @@ class TestRenderFix:
         source = 'import os\nx = 1\n'
         # delete line 1 including its newline (F401-style edit)
         edits = [FixEdit(content='', row=1, col=1, end_row=2, end_col=1)]
-        before, after = render_fix(source, make_violation(row=1, edits=edits))
+        before, after = render_fix(LineIndex(source), make_violation(row=1, edits=edits))
         assert before == 'import os\nx = 1'
         assert after == 'x = 1'
 
@@ -56,7 +73,7 @@ class TestRenderFix:
         source = 'import os\ndef f():\n    pass\n'
         # I001-style: rewrite the import block adding blank lines
         edits = [FixEdit(content='import os\n\n\n', row=1, col=1, end_row=2, end_col=1)]
-        before, after = render_fix(source, make_violation(row=1, edits=edits))
+        before, after = render_fix(LineIndex(source), make_violation(row=1, edits=edits))
         assert before == 'import os\ndef f():'
         assert after == 'import os\n\n\ndef f():'
 
@@ -66,13 +83,65 @@ class TestRenderFix:
             FixEdit(content='[', row=1, col=5, end_row=1, end_col=6),
             FixEdit(content=']', row=3, col=7, end_row=3, end_col=8),
         ]
-        before, after = render_fix(source, make_violation(row=1, edits=edits))
+        before, after = render_fix(LineIndex(source), make_violation(row=1, edits=edits))
         assert before == 'a = (1,\n     2,\n     3)'
         assert after == 'a = [1,\n     2,\n     3]'
 
     def test_edit_beyond_file_end_is_clamped(self) -> None:
         source = 'x = 1'
         edits = [FixEdit(content='', row=1, col=1, end_row=99, end_col=1)]
-        before, after = render_fix(source, make_violation(row=1, edits=edits))
+        before, after = render_fix(LineIndex(source), make_violation(row=1, edits=edits))
         assert before == 'x = 1'
         assert after == ''
+
+
+def whole_file_after(source: str, violation: RuffViolation) -> str:
+    """Apply every edit to the full text, then cut the affected lines out (the reference)."""
+    source = source.replace('\r\n', '\n').replace('\r', '\n')
+    lines = source.split('\n')
+    starts = [0] + [index + 1 for index, char in enumerate(source) if char == '\n']
+
+    def offset(row: int, col: int) -> int:
+        return min(starts[row - 1] + col - 1, len(source)) if row - 1 < len(starts) else len(source)
+
+    assert violation.fix is not None
+    edits = violation.fix.edits
+    result = source
+    for start, end, content in sorted(
+        ((offset(e.row, e.col), offset(e.end_row, e.end_col), e.content) for e in edits), reverse=True
+    ):
+        result = result[:start] + content + result[end:]
+    new_lines = result.split('\n')
+    delta = len(new_lines) - len(lines)
+    return '\n'.join(new_lines[min(e.row for e in edits) - 1 : max(e.end_row for e in edits) + delta])
+
+
+def random_case(rng: random.Random) -> tuple[str, RuffViolation]:
+    words = ['', 'x', 'if x == True:', '    pass', 'import os', '(1,', '2)']
+    lines = [rng.choice(words) for _ in range(rng.randint(1, 12))]
+    source = rng.choice(['\n', '\r\n']).join(lines) + rng.choice(['', '\n'])
+
+    # ruff's edits never overlap and point at real positions (or past the end of the file)
+    positions = [(row, col) for row, line in enumerate(lines, 1) for col in range(1, len(line) + 2)]
+    positions += [(len(lines) + 1, 1), (len(lines) + 2, 1)]
+    bounds = sorted(rng.choices(positions, k=2 * rng.randint(1, 3)))
+    edits = [
+        FixEdit(
+            content=''.join(rng.choice(['', 'y', '\n', 'z = 0\n']) for _ in range(rng.randint(0, 3))),
+            row=row,
+            col=col,
+            end_row=end_row,
+            end_col=end_col,
+        )
+        for (row, col), (end_row, end_col) in zip(bounds[::2], bounds[1::2], strict=True)
+    ]
+    rng.shuffle(edits)
+    return source, make_violation(row=edits[0].row, edits=edits)
+
+
+class TestWindowedFix:
+    @pytest.mark.parametrize('seed', range(500))
+    def test_matches_whole_file_application(self, seed: int) -> None:
+        source, violation = random_case(random.Random(seed))  # noqa: S311
+        _, after = render_fix(LineIndex(source), violation)
+        assert after == whole_file_after(source, violation)
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import aclosing
+from typing import TYPE_CHECKING
+
+import pytest
+
+from ruff_tutor_mcp.flights import SingleFlight
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator
+
+pytestmark = pytest.mark.anyio
+
+
+class Producer:
+    """A stream whose items are released one by one by the test."""
+
+    def __init__(self, error: Exception | None = None) -> None:
+        self.starts = 0
+        self.closed = False
+        self.error = error
+        self.released = asyncio.Queue[int | None]()
+
+    async def stream(self) -> AsyncGenerator[int, None]:
+        self.starts += 1
+        try:
+            while (item := await self.released.get()) is not None:
+                yield item
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.closed = True
+
+
+async def consume(flights: SingleFlight[int], producer: Producer, key: str = 'scan') -> list[int]:
+    async with aclosing(flights.stream(key, producer.stream)) as items:
+        return [item async for item in items]
+
+
+class TestSingleFlight:
+    async def test_concurrent_callers_share_one_producer(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        producer = Producer()
+        first = asyncio.create_task(consume(flights, producer))
+        await producer.released.put(1)
+        await asyncio.sleep(0.01)
+        # a late caller replays what was produced before it joined
+        second = asyncio.create_task(consume(flights, producer))
+        await asyncio.sleep(0.01)
+        for item in (2, None):
+            await producer.released.put(item)
+        assert await first == [1, 2]
+        assert await second == [1, 2]
+        assert producer.starts == 1
+
+    async def test_finished_flight_is_not_reused(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        producer = Producer()
+        await producer.released.put(None)
+        await consume(flights, producer)
+        await producer.released.put(None)
+        await consume(flights, producer)
+        assert producer.starts == 2
+        assert not flights.in_flight('scan')
+
+    async def test_different_keys_run_separately(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        producer = Producer()
+        tasks = [asyncio.create_task(consume(flights, producer, key)) for key in ('a', 'b')]
+        await asyncio.sleep(0.01)
+        for _ in tasks:
+            await producer.released.put(None)
+        await asyncio.gather(*tasks)
+        assert producer.starts == 2
+
+    async def test_error_reaches_every_caller(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        producer = Producer(error=ValueError('boom'))
+        tasks = [asyncio.create_task(consume(flights, producer)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        await producer.released.put(None)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    async def test_cancelled_caller_leaves_others_running(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        producer = Producer()
+        leaving = asyncio.create_task(consume(flights, producer))
+        staying = asyncio.create_task(consume(flights, producer))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        await asyncio.sleep(0.01)
+        assert not producer.closed
+        for item in (1, None):
+            await producer.released.put(item)
+        assert await staying == [1]
+
+    async def test_last_caller_leaving_stops_producer(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        producer = Producer()
+        task = asyncio.create_task(consume(flights, producer))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert producer.closed
+        assert not flights.in_flight('scan')
+
+    async def test_caller_past_the_replay_limit_starts_its_own_run(self) -> None:
+        flights: SingleFlight[int] = SingleFlight(max_replay=2)
+        producer, own = Producer(), Producer()
+        first = asyncio.create_task(consume(flights, producer))
+        for item in (1, 2, 3):
+            await producer.released.put(item)
+        await asyncio.sleep(0.01)
+        assert not flights.in_flight('scan')
+
+        late = asyncio.create_task(consume(flights, own))
+        await asyncio.sleep(0.01)
+        for queue in (producer.released, own.released):
+            await queue.put(4)
+            await queue.put(None)
+        assert await first == [1, 2, 3, 4]
+        assert await late == [4]
+        assert (producer.starts, own.starts) == (1, 1)
+
+    async def test_items_every_caller_has_read_are_dropped(self) -> None:
+        flights: SingleFlight[int] = SingleFlight(max_replay=2)
+        producer = Producer()
+        task = asyncio.create_task(consume(flights, producer))
+        await asyncio.sleep(0.01)
+        flight = flights._flights['scan']  # noqa: SLF001
+        for item in range(10):
+            await producer.released.put(item)
+        await asyncio.sleep(0.01)
+        assert (flight.items, flight.offset) == ([], 10)
+        await producer.released.put(None)
+        assert await task == list(range(10))
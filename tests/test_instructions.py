@@ -19,6 +19,12 @@ class TestLessonInstruction:
     def test_auto_applies_fixes(self) -> None:
         assert 'apply the fixes to the code automatically' in instructions.AUTO
 
+    def test_mixed_follows_each_violation_mode(self) -> None:
+        text = instructions.lesson_instruction('mixed')
+        assert '`mode`' in text
+        assert 'do NOT reveal' in text
+        assert 'check_my_fix' in text
+
 
 class TestKeepTryingInstruction:
     def test_beginner_variant(self) -> None:
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from ruff_tutor_mcp.memo import ScanKey, ScanMemo
+from ruff_tutor_mcp.models import RuffViolation
+from ruff_tutor_mcp.sessions import INSPECTED_OVERHEAD_BYTES, Inspected
+from ruff_tutor_mcp.snapshots import Snapshot
+
+
+def key(path: str = '/repo', tree: str = 'tree') -> ScanKey:
+    return ScanKey(path=path, backend='cli', tree=tree, ruff_version='0.0.0')
+
+
+def snapshot() -> Snapshot:
+    return Snapshot(files={}, taken_at_ns=0)
+
+
+def inspected(before: str = 'x') -> Inspected:
+    violation = RuffViolation(code='F401', message='unused', filename='/repo/a.py', row=1, col=1, end_row=1, end_col=2)
+    return Inspected(violation=violation, path='/repo/a.py', file='a.py', line=before, before=before, after=None)
+
+
+class TestScanMemo:
+    def test_hit_and_miss_are_counted(self) -> None:
+        memo = ScanMemo()
+        assert memo.get(key()) is None
+        items = [inspected()]
+        memo.put(key(), snapshot(), items)
+        assert memo.get(key()) is items
+        assert memo.get(key(tree='edited')) is None
+        assert (memo.stats.hits, memo.stats.misses, memo.stats.entries) == (1, 2, 1)
+
+    def test_membership_is_not_counted(self) -> None:
+        memo = ScanMemo()
+        memo.put(key(), snapshot(), [inspected()])
+        assert key() in memo
+        assert key(tree='edited') not in memo
+        assert (memo.stats.hits, memo.stats.misses) == (0, 0)
+
+    def test_evicts_least_recently_used_by_count(self) -> None:
+        memo = ScanMemo(max_entries=2)
+        for name in ('a', 'b'):
+            memo.put(key(path=name), snapshot(), [inspected()])
+        memo.get(key(path='a'))
+        memo.put(key(path='c'), snapshot(), [inspected()])
+        assert memo.get(key(path='b')) is None
+        assert memo.get(key(path='a')) is not None
+        assert memo.stats.evictions == 1
+
+    def test_evicts_by_size(self) -> None:
+        memo = ScanMemo(max_bytes=3 * INSPECTED_OVERHEAD_BYTES)
+        memo.put(key(path='a'), snapshot(), [inspected()])
+        memo.put(key(path='b'), snapshot(), [inspected(), inspected()])
+        assert memo.get(key(path='a')) is None
+        assert memo.get(key(path='b')) is not None
+        assert memo.stats.bytes <= memo.max_bytes
+
+    def test_result_over_budget_is_not_kept(self) -> None:
+        memo = ScanMemo(max_bytes=INSPECTED_OVERHEAD_BYTES)
+        memo.put(key(), snapshot(), [inspected('x' * 1000)])
+        assert memo.get(key()) is None
+        assert memo.stats.entries == 0
+
+    def test_replacing_an_entry_keeps_size_accurate(self) -> None:
+        memo = ScanMemo()
+        memo.put(key(), snapshot(), [inspected()])
+        size = memo.stats.bytes
+        memo.put(key(), snapshot(), [inspected()])
+        assert memo.stats.bytes == size
+
+    def test_latest_snapshot_of_path(self) -> None:
+        memo = ScanMemo()
+        old, new = snapshot(), snapshot()
+        memo.put(key(tree='old'), old, [])
+        memo.put(key(tree='new'), new, [])
+        memo.put(key(path='/other'), snapshot(), [])
+        assert memo.latest_snapshot('/repo') is new
+        assert memo.latest_snapshot('/missing') is None
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from ruff_tutor_mcp import instructions
+from ruff_tutor_mcp.models import Progress, ReviewResponse, ViolationDetail, ViolationGroup
+from ruff_tutor_mcp.pagination import ResultPages, paginate
+
+
+def group(code: str, count: int) -> ViolationGroup:
+    return ViolationGroup(
+        code=code,
+        rule_name='',
+        summary='',
+        count=count,
+        violations=[
+            ViolationDetail(file='a.py', row=row, col=1, message='', before='') for row in range(1, count + 1)
+        ],
+    )
+
+
+def review(*groups: ViolationGroup) -> ReviewResponse:
+    total = sum(g.count for g in groups)
+    return ReviewResponse(status='violations_found', mode='auto', total=total, groups=list(groups), instruction='go')
+
+
+def rows(groups: list[ViolationGroup]) -> list[tuple[str, int]]:
+    return [(g.code, v.row) for g in groups for v in g.violations]
+
+
+class TestPaginate:
+    def test_splits_groups_across_pages(self) -> None:
+        sections = [[group('A', 3), group('B', 2)]]
+        (first,), offset = paginate(sections, 0, 2)
+        assert rows(first) == [('A', 1), ('A', 2)]
+        assert offset == 2
+        (second,), offset = paginate(sections, 2, 2)
+        assert rows(second) == [('A', 3), ('B', 1)]
+        # a split group keeps its full count on every page
+        assert second[0].count == 3
+        (last,), offset = paginate(sections, 4, 2)
+        assert rows(last) == [('B', 2)]
+        assert offset is None
+
+    def test_pages_through_sections_in_order(self) -> None:
+        (remaining, new), offset = paginate([[group('A', 2)], [group('B', 2)]], 1, 2)
+        assert rows(remaining) == [('A', 2)]
+        assert rows(new) == [('B', 1)]
+        assert offset == 3
+
+
+class TestResultPages:
+    def test_small_result_is_returned_whole(self) -> None:
+        pages = ResultPages()
+        response = review(group('A', 2))
+        assert pages.first(response, page_size=2) is response
+
+    def test_cursor_walks_all_pages(self) -> None:
+        pages = ResultPages()
+        page = pages.first(review(group('A', 3), group('B', 2)), page_size=2)
+        seen = rows(page.groups)
+        assert instructions.MORE_PAGES in page.instruction
+        while page.next_cursor is not None:
+            next_page = pages.next(page.next_cursor, ReviewResponse, page_size=2)
+            assert next_page is not None
+            page = next_page
+            seen += rows(page.groups)
+        assert seen == [('A', 1), ('A', 2), ('A', 3), ('B', 1), ('B', 2)]
+        assert page.instruction == 'go'
+        assert page.total == 5
+
+    def test_groups_whose_headers_overflow_the_budget_go_to_later_pages(self) -> None:
+        pages = ResultPages()
+        response = review(*(group(f'R{n:03}', 1) for n in range(200)))
+        page = pages.first(response, page_size=1000, max_bytes=8 * 1024)
+        seen = [g.code for g in page.groups]
+        assert page.next_cursor is not None
+        while page.next_cursor is not None:
+            assert len(page.model_dump_json()) <= 8 * 1024
+            next_page = pages.next(page.next_cursor, ReviewResponse, page_size=1000, max_bytes=8 * 1024)
+            assert next_page is not None
+            page = next_page
+            seen += [g.code for g in page.groups]
+        # every group is listed, each on exactly one page
+        assert seen == [g.code for g in response.groups]
+
+    def test_cursor_is_bound_to_kind_and_owner(self) -> None:
+        pages = ResultPages()
+        progress = Progress(verdict='keep_trying', attempts=1, max_retry=2, remaining=[group('A', 3)], instruction='')
+        page = pages.first(progress, page_size=1, owner='s1')
+        assert page.next_cursor is not None
+        assert pages.next(page.next_cursor, Progress, owner='s2') is None
+        assert pages.next(page.next_cursor, ReviewResponse, owner='s1') is None
+        assert pages.next(page.next_cursor, Progress, owner='s1') is not None
+
+    def test_oldest_result_expires(self) -> None:
+        pages = ResultPages(max_results=1)
+        first = pages.first(review(group('A', 2)), page_size=1)
+        pages.first(review(group('B', 2)), page_size=1)
+        assert first.next_cursor is not None
+        assert pages.next(first.next_cursor, ReviewResponse) is None
+
+    def test_malformed_cursor(self) -> None:
+        assert ResultPages().next('garbage', ReviewResponse) is None
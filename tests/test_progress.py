@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import pytest
+
+from ruff_tutor_mcp.progress import PROGRESS_TOTAL, ScanProgress, Stage
+
+pytestmark = pytest.mark.anyio
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.calls: list[tuple[float, float | None, str | None]] = []
+
+    async def __call__(self, progress: float, total: float | None, message: str | None) -> None:
+        self.calls.append((progress, total, message))
+
+
+class TestScanProgress:
+    async def test_stages_map_onto_one_increasing_scale(self) -> None:
+        recorder = Recorder()
+        progress = ScanProgress(recorder)
+        await progress.update(Stage.RUFF, message='Running ruff')
+        await progress.update(Stage.RUFF, 1, 1)
+        await progress.update(Stage.ENRICH, 1, 1)
+        await progress.update(Stage.GROUP, 1, 1)
+        values = [value for value, _, _ in recorder.calls]
+        assert values == [0.0, 60.0, 90.0, 100.0]
+        assert {total for _, total, _ in recorder.calls} == {PROGRESS_TOTAL}
+        assert recorder.calls[0][2] == 'Running ruff'
+
+    async def test_never_goes_backwards(self) -> None:
+        recorder = Recorder()
+        progress = ScanProgress(recorder)
+        await progress.update(Stage.ENRICH, 1, 1)
+        await progress.update(Stage.RUFF, 1, 2)
+        await progress.update(Stage.ENRICH, 1, 1)
+        assert [value for value, _, _ in recorder.calls] == [90.0]
+
+    async def test_throttles_within_a_stage(self) -> None:
+        recorder = Recorder()
+        progress = ScanProgress(recorder)
+        for done in range(1, 100):
+            await progress.update(Stage.RUFF, done, 100)
+        # the first update goes out at once, the rest fall inside the interval
+        assert len(recorder.calls) == 1
+        await progress.update(Stage.RUFF, 100, 100)
+        assert recorder.calls[-1][0] == 60.0
+
+    async def test_unknown_total_creeps_within_the_stage(self) -> None:
+        recorder = Recorder()
+        progress = ScanProgress(recorder)
+        await progress.update(Stage.ENRICH, 1000)
+        ((value, _, _),) = recorder.calls
+        assert 60.0 < value < 90.0
+
+    async def test_failing_hook_does_not_break_the_scan(self) -> None:
+        async def broken(_progress: float, _total: float | None, _message: str | None) -> None:
+            raise ConnectionError
+
+        await ScanProgress(broken).update(Stage.RUFF)
+
+    async def test_without_hook_is_a_no_op(self) -> None:
+        await ScanProgress().update(Stage.GROUP, 1, 1)
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from ruff_tutor_mcp.ruff_lsp import FILE_CHANGED, LspConnection, LspError, RuffServerRunner
+from ruff_tutor_mcp.ruff_runner import RuffRunner, RuffTimeoutError
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable
+
+pytestmark = pytest.mark.anyio
+
+
+def position(line: int, character: int) -> dict[str, int]:
+    return {'line': line, 'character': character}
+
+
+E712_DIAGNOSTIC = {
+    'code': 'E712',
+    'codeDescription': {'href': 'https://docs.astral.sh/ruff/rules/true-false-comparison'},
+    'message': 'Avoid equality comparisons to `True`',
+    'range': {'start': position(2, 3), 'end': position(2, 12)},
+    'data': {
+        'code': 'E712',
+        'title': 'Replace with `x`',
+        'edits': [{'newText': 'x', 'range': {'start': position(2, 3), 'end': position(2, 12)}}],
+        'noqa_edit': None,
+    },
+}
+SYNTAX_DIAGNOSTIC = {
+    'code': 'invalid-syntax',
+    'message': 'SyntaxError: Expected an expression',
+    'range': {'start': position(0, 4), 'end': position(0, 5)},
+}
+
+
+class FakeRuffServer:
+    """An in-process LSP peer standing in for `ruff server`.
+
+    Acts as the connection's writer: every message written by the client is
+    recorded and answered through `reader`. The diagnostics returned for a
+    document are looked up by file name.
+    """
+
+    def __init__(self, diagnostics: dict[str, list[dict[str, Any]]] | None = None) -> None:
+        self.reader = asyncio.StreamReader()
+        self.diagnostics = diagnostics or {}
+        self.received: list[dict[str, Any]] = []
+        self.open_documents: set[str] = set()
+        # a hung server never answers diagnostic requests
+        self.hung = False
+        self._buffer = b''
+
+    def methods(self) -> list[str]:
+        return [message['method'] for message in self.received if 'method' in message]
+
+    def params(self, method: str) -> list[Any]:
+        return [message['params'] for message in self.received if message.get('method') == method]
+
+    def crash(self) -> None:
+        self.reader.feed_eof()
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while b'\r\n\r\n' in self._buffer:
+            header, _, rest = self._buffer.partition(b'\r\n\r\n')
+            length = int(header.split(b':')[1])
+            if len(rest) < length:
+                return
+            self._buffer = rest[length:]
+            self._handle(json.loads(rest[:length]))
+
+    async def drain(self) -> None:
+        await asyncio.sleep(0)
+
+    def close(self) -> None:
+        if not self.reader.at_eof():
+            self.reader.feed_eof()
+
+    def _handle(self, message: dict[str, Any]) -> None:
+        self.received.append(message)
+        method = message.get('method')
+        params = message.get('params') or {}
+        if method == 'initialize':
+            # ruff registers its file watchers with a request of its own
+            self._send({'jsonrpc': '2.0', 'id': 'watchers', 'method': 'client/registerCapability', 'params': {}})
+            self._reply(message, {'capabilities': {'positionEncoding': 'utf-32'}})
+        elif method == 'textDocument/didOpen':
+            self.open_documents.add(params['textDocument']['uri'])
+        elif method == 'textDocument/didClose':
+            self.open_documents.discard(params['textDocument']['uri'])
+        elif method == 'textDocument/diagnostic' and not self.hung:
+            name = Path(params['textDocument']['uri']).name
+            self._reply(message, {'kind': 'full', 'items': self.diagnostics.get(name, [])})
+        elif method == 'shutdown':
+            self._reply(message, None)
+
+    def _reply(self, request: dict[str, Any], result: Any) -> None:  # noqa: ANN401
+        self._send({'jsonrpc': '2.0', 'id': request['id'], 'result': result})
+
+    def _send(self, message: dict[str, Any]) -> None:
+        body = json.dumps(message).encode()
+        self.reader.feed_data(b'Content-Length: %d\r\n\r\n%b' % (len(body), body))
+
+
+@pytest.fixture
+async def fake() -> FakeRuffServer:
+    # the StreamReader binds to the loop it is created in
+    return FakeRuffServer()
+
+
+@pytest.fixture
+async def runner(fake: FakeRuffServer) -> AsyncIterator[RuffServerRunner]:
+    async def connect() -> LspConnection:
+        return LspConnection(fake.reader, fake)
+
+    lsp_runner = RuffServerRunner(connect=connect)
+    yield lsp_runner
+    await lsp_runner.close()
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["E712"]\n')
+    (tmp_path / 'b.py').write_text('x = 1\nprint(x)\nif x == True:\n    pass\n')
+    (tmp_path / 'a.py').write_text('x = (\n')
+    (tmp_path / 'notes.txt').write_text('not python\n')
+    return tmp_path
+
+
+async def collect(lsp_runner: RuffServerRunner, *paths: str) -> list[Any]:
+    return [violation async for violation in lsp_runner.stream_check(*paths)]
+
+
+class TestLspConnection:
+    async def test_request_and_server_request_acknowledged(self, fake: FakeRuffServer) -> None:
+        connection = LspConnection(fake.reader, fake)
+        result = await connection.request('initialize', {})
+        assert result == {'capabilities': {'positionEncoding': 'utf-32'}}
+        await asyncio.sleep(0)
+        assert {'jsonrpc': '2.0', 'id': 'watchers', 'result': None} in fake.received
+        await connection.close()
+        assert connection.closed
+        assert 'shutdown' in fake.methods()
+        assert 'exit' in fake.methods()
+
+    async def test_pending_request_fails_when_peer_goes_away(self, fake: FakeRuffServer) -> None:
+        connection = LspConnection(fake.reader, fake)
+        pending = asyncio.ensure_future(connection.request('unanswered'))
+        await asyncio.sleep(0)
+        fake.crash()
+        with pytest.raises(LspError):
+            await pending
+        await connection.close()
+
+
+class TestStreamCheck:
+    async def test_maps_diagnostics_to_violations(
+        self, runner: RuffServerRunner, fake: FakeRuffServer, project: Path
+    ) -> None:
+        fake.diagnostics = {'a.py': [SYNTAX_DIAGNOSTIC], 'b.py': [E712_DIAGNOSTIC]}
+        violations = await collect(runner, str(project))
+
+        # file order, like ruff's CLI output
+        assert [Path(v.filename).name for v in violations] == ['a.py', 'b.py']
+        syntax, e712 = violations
+        assert syntax.code == 'invalid-syntax'
+        assert (syntax.row, syntax.col) == (1, 5)
+        assert e712.code == 'E712'
+        assert (e712.row, e712.col, e712.end_row, e712.end_col) == (3, 4, 3, 13)
+        assert e712.url == 'https://docs.astral.sh/ruff/rules/true-false-comparison'
+        assert e712.fix is not None
+        assert e712.fix.applicability == 'unknown'
+        assert e712.fix.message == 'Replace with `x`'
+        assert [(edit.content, edit.row, edit.col, edit.end_row, edit.end_col) for edit in e712.fix.edits] == [
+            ('x', 3, 4, 3, 13)
+        ]
+        assert not fake.open_documents
+
+    async def test_opens_only_python_sources_and_closes_them(
+        self, runner: RuffServerRunner, fake: FakeRuffServer, project: Path
+    ) -> None:
+        assert await collect(runner, str(project)) == []
+        opened = [Path(params['textDocument']['uri']).name for params in fake.params('textDocument/didOpen')]
+        assert sorted(opened) == ['a.py', 'b.py']
+        assert not fake.open_documents
+
+    async def test_skips_files_ruff_excludes(
+        self, runner: RuffServerRunner, fake: FakeRuffServer, project: Path, git: Callable[..., None]
+    ) -> None:
+        (project / 'ruff.toml').write_text('extend-exclude = ["vendor"]\n[lint]\nselect = ["E712"]\n')
+        (project / 'vendor').mkdir()
+        (project / 'vendor' / 'c.py').write_text('x = 1\n')
+        (project / 'generated.py').write_text('x = 1\n')
+        (project / '.gitignore').write_text('generated.py\n')
+        git(project, 'init', '-q')
+
+        await collect(runner, str(project))
+        opened = [Path(params['textDocument']['uri']).name for params in fake.params('textDocument/didOpen')]
+        assert sorted(opened) == ['a.py', 'b.py']
+
+    async def test_file_list_is_kept_until_the_tree_changes(
+        self, runner: RuffServerRunner, project: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        listed: list[tuple[str, ...]] = []
+        original = RuffRunner.list_files
+
+        async def spy(
+            self: RuffRunner, *paths: str, force_exclude: bool = False, time_limit: float | None = None
+        ) -> list[Path]:
+            listed.append(paths)
+            return await original(self, *paths, force_exclude=force_exclude, time_limit=time_limit)
+
+        monkeypatch.setattr(RuffRunner, 'list_files', spy)
+        await collect(runner, str(project))
+        await collect(runner, str(project))
+        assert len(listed) == 1
+        (project / 'c.py').write_text('x = 1\n')
+        await collect(runner, str(project))
+        assert len(listed) == 2
+
+    async def test_registers_project_root_once(
+        self, runner: RuffServerRunner, fake: FakeRuffServer, project: Path
+    ) -> None:
+        await collect(runner, str(project / 'b.py'))
+        await collect(runner, str(project))
+        assert fake.methods().count('initialize') == 1
+        folders = fake.params('workspace/didChangeWorkspaceFolders')
+        assert [folder['event']['added'][0]['uri'] for folder in folders] == [project.as_uri()]
+
+    async def test_config_change_is_notified(
+        self, runner: RuffServerRunner, fake: FakeRuffServer, project: Path
+    ) -> None:
+        await collect(runner, str(project))
+        assert fake.params('workspace/didChangeWatchedFiles') == []
+        (project / 'ruff.toml').write_text('[lint]\nselect = ["E712", "F401"]\n')
+        await collect(runner, str(project))
+        changes = fake.params('workspace/didChangeWatchedFiles')
+        assert changes == [{'changes': [{'uri': (project / 'ruff.toml').as_uri(), 'type': FILE_CHANGED}]}]
+
+    async def test_restarts_after_server_exit(
+        self, runner: RuffServerRunner, fake: FakeRuffServer, project: Path
+    ) -> None:
+        await collect(runner, str(project))
+        fake.crash()
+        await asyncio.sleep(0)
+        replacement = FakeRuffServer()
+
+        async def reconnect() -> LspConnection:
+            return LspConnection(replacement.reader, replacement)
+
+        runner._connect = reconnect  # noqa: SLF001
+        await collect(runner, str(project))
+        assert replacement.methods().count('initialize') == 1
+
+    async def test_timeout_replaces_hung_server(
+        self, runner: RuffServerRunner, fake: FakeRuffServer, project: Path
+    ) -> None:
+        fake.hung = True
+        with pytest.raises(RuffTimeoutError):
+            async for _ in runner.stream_check(str(project), time_limit=0.1):
+                pass
+        fake.crash()
+        replacement = FakeRuffServer()
+
+        async def reconnect() -> LspConnection:
+            return LspConnection(replacement.reader, replacement)
+
+        runner._connect = reconnect  # noqa: SLF001
+        await collect(runner, str(project))
+        assert replacement.methods().count('initialize') == 1
+
+
+class TestIntegration:
+    """Tests against the real bundled `ruff server`."""
+
+    async def test_matches_cli_results(self, tmp_path: Path) -> None:
+        (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401", "E712", "UP"]\n')
+        (tmp_path / 'sample.py').write_text('import os\nx = 1\nif x == True:\n    print("%s" % x)\n')
+        (tmp_path / 'broken.py').write_text('x = (\n')
+
+        lsp_runner = RuffServerRunner()
+        try:
+            from_server = await collect(lsp_runner, str(tmp_path))
+            # the server picks up config edits without a restart
+            (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401"]\n')
+            after_edit = await collect(lsp_runner, str(tmp_path))
+        finally:
+            await lsp_runner.close()
+        (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401", "E712", "UP"]\n')
+        from_cli = await RuffRunner().check(str(tmp_path))
+        assert from_cli is not None
+
+        def key(violation: Any) -> tuple[Any, ...]:  # noqa: ANN401
+            fix = violation.fix
+            edits = [(e.content, e.row, e.col, e.end_row, e.end_col) for e in fix.edits] if fix else []
+            return (Path(violation.filename).name, violation.code, violation.row, violation.col, edits)
+
+        assert [key(v) for v in from_server] == [key(v) for v in from_cli]
+        assert {v.code for v in after_edit} == {'invalid-syntax', 'F401'}
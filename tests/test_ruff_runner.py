@@ -1,23 +1,42 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import subprocess
+import threading
 from typing import TYPE_CHECKING
 
-from ruff_tutor_mcp.ruff_runner import RuffRunner
+import pytest
+
+from ruff_tutor_mcp.cache import LAST_USED_FILE_NAME, RuffCacheDirs
+from ruff_tutor_mcp.ruff_runner import RuffError, RuffRunner, RuleSelection
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Awaitable, Callable
     from pathlib import Path
 
-    import pytest
+pytestmark = pytest.mark.anyio
+
+CompletedStr = subprocess.CompletedProcess[str]
+
+
+def returning(*outputs: subprocess.CompletedProcess[str]) -> Callable[[list[str]], Awaitable[CompletedStr]]:
+    """Build a fake `_run` that returns `outputs` in order, repeating the last one."""
+    queue = list(outputs)
+
+    async def run(_args: list[str]) -> CompletedStr:
+        return queue.pop(0) if len(queue) > 1 else queue[0]
 
+    return run
 
-def completed(stdout: str, stderr: str = '', returncode: int = 0) -> subprocess.CompletedProcess[str]:
+
+def completed(stdout: str, stderr: str = '', returncode: int = 0) -> CompletedStr:
     return subprocess.CompletedProcess(args=['ruff'], returncode=returncode, stdout=stdout, stderr=stderr)
 
 
-CHECK_OUTPUT = json.dumps(
-    [
+CHECK_OUTPUT = '\n'.join(
+    json.dumps(item)
+    for item in [
         {
             'code': 'E712',
             'message': 'Avoid equality comparisons to `True`',
@@ -48,85 +67,279 @@ CHECK_OUTPUT = json.dumps(
 )
 
 
+def streaming(stdout: str, error: str | None = None) -> Callable[..., AsyncIterator[str]]:
+    """Build a fake `_stream` that yields `stdout` line by line, then optionally fails."""
+
+    async def stream(_args: list[str], **_kwargs: object) -> AsyncIterator[str]:
+        for line in stdout.splitlines():
+            yield line
+        if error is not None:
+            raise RuffError(error)
+
+    return stream
+
+
 class TestCheck:
-    def test_parses_violations_with_fix(self, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def test_parses_violations_with_fix(self, monkeypatch: pytest.MonkeyPatch) -> None:
         runner = RuffRunner()
-        monkeypatch.setattr(runner, '_run', lambda args: completed(CHECK_OUTPUT))
-        violations = runner.check('.')
+        monkeypatch.setattr(runner, '_stream', streaming(CHECK_OUTPUT))
+        violations = await runner.check('.')
         assert violations is not None
         assert violations[0].code == 'E712'
         assert violations[0].fix is not None
         assert violations[0].fix.edits[0].content == 'x'
         assert violations[0].fix.edits[0].end_col == 13
 
-    def test_null_code_becomes_syntax_error(self, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def test_null_code_becomes_syntax_error(self, monkeypatch: pytest.MonkeyPatch) -> None:
         runner = RuffRunner()
-        monkeypatch.setattr(runner, '_run', lambda args: completed(CHECK_OUTPUT))
-        violations = runner.check('.')
+        monkeypatch.setattr(runner, '_stream', streaming(CHECK_OUTPUT))
+        violations = await runner.check('.')
         assert violations is not None
         assert violations[1].code == 'syntax-error'
         assert violations[1].fix is None
 
-    def test_unparsable_output_returns_none(self, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def test_unparsable_output_returns_none(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        runner = RuffRunner()
+        monkeypatch.setattr(runner, '_stream', streaming('not json'))
+        assert await runner.check('.') is None
+
+    async def test_ruff_failure_returns_none(self, monkeypatch: pytest.MonkeyPatch) -> None:
         runner = RuffRunner()
-        monkeypatch.setattr(runner, '_run', lambda args: completed('not json', stderr='boom'))
-        assert runner.check('.') is None
+        monkeypatch.setattr(runner, '_stream', streaming('', error='boom'))
+        assert await runner.check('.') is None
+
+
+class TestStreamCheck:
+    async def test_yields_violations_before_output_ends(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        runner = RuffRunner()
+        # the failure only surfaces after the first record was already delivered
+        monkeypatch.setattr(runner, '_stream', streaming(CHECK_OUTPUT.splitlines()[0], error='boom'))
+        stream = runner.stream_check('.')
+        first = await anext(stream)
+        assert first.code == 'E712'
+        with pytest.raises(RuffError):
+            await anext(stream)
+
+
+RULE_OUTPUT = json.dumps(
+    [
+        {
+            'name': 'true-false-comparison',
+            'code': 'E712',
+            'summary': 'Avoid equality comparisons to `True`',
+            'explanation': '## What it does\n...',
+            'fix_availability': 'Always',
+        },
+        {
+            'name': 'unused-import',
+            'code': 'F401',
+            'summary': '`{name}` imported but unused',
+            'explanation': '## What it does\n...',
+            'fix_availability': 'Sometimes',
+        },
+    ]
+)
 
 
 class TestRule:
-    def test_parses_and_caches(self, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def test_loads_catalogue_once(self, monkeypatch: pytest.MonkeyPatch) -> None:
         runner = RuffRunner()
         calls: list[list[str]] = []
 
-        def fake_run(args: list[str]) -> subprocess.CompletedProcess[str]:
+        async def fake_run(args: list[str]) -> subprocess.CompletedProcess[str]:
             calls.append(args)
-            return completed(
-                json.dumps(
-                    {
-                        'name': 'true-false-comparison',
-                        'code': 'E712',
-                        'summary': 'Avoid equality comparisons to `True`',
-                        'explanation': '## What it does\n...',
-                        'fix_availability': 'Always',
-                    }
-                )
-            )
+            return completed(RULE_OUTPUT)
 
         monkeypatch.setattr(runner, '_run', fake_run)
-        first = runner.rule('E712')
-        second = runner.rule('E712')
+        first = await runner.rule('E712')
+        second = await runner.rule('E712')
+        other = await runner.rule('F401')
         assert first is not None
         assert first.name == 'true-false-comparison'
         assert first.url == 'https://docs.astral.sh/ruff/rules/true-false-comparison/'
         assert second is first
-        assert len(calls) == 1
+        assert other is not None
+        assert other.name == 'unused-import'
+        assert calls == [['rule', '--all', '--output-format=json']]
 
-    def test_unknown_rule_returns_none_and_caches(self, monkeypatch: pytest.MonkeyPatch) -> None:
+    async def test_unknown_rule_returns_none_without_extra_calls(self, monkeypatch: pytest.MonkeyPatch) -> None:
         runner = RuffRunner()
         calls: list[list[str]] = []
 
-        def fake_run(args: list[str]) -> subprocess.CompletedProcess[str]:
+        async def fake_run(args: list[str]) -> subprocess.CompletedProcess[str]:
             calls.append(args)
-            return completed('', stderr='invalid rule', returncode=2)
+            return completed(RULE_OUTPUT)
 
         monkeypatch.setattr(runner, '_run', fake_run)
-        assert runner.rule('ZZZ999') is None
-        assert runner.rule('ZZZ999') is None
+        assert await runner.rule('ZZZ999') is None
+        assert await runner.rule('ZZZ999') is None
+        assert len(calls) == 1
+
+    async def test_concurrent_first_lookups_share_one_load(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        runner = RuffRunner()
+        calls: list[list[str]] = []
+
+        async def slow_run(args: list[str]) -> subprocess.CompletedProcess[str]:
+            calls.append(args)
+            await asyncio.sleep(0.05)
+            return completed(RULE_OUTPUT)
+
+        monkeypatch.setattr(runner, '_run', slow_run)
+        docs = await asyncio.gather(*(runner.rule('E712') for _ in range(100)))
+        assert all(doc is not None for doc in docs)
         assert len(calls) == 1
 
+    async def test_failed_load_is_retried(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        runner = RuffRunner()
+        monkeypatch.setattr(
+            runner, '_run', returning(completed('', stderr='boom', returncode=2), completed(RULE_OUTPUT))
+        )
+        assert await runner.rule('E712') is None
+        assert await runner.rule('E712') is not None
+
+    async def test_catalogue_persists_across_runners(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        first = RuffRunner()
+        monkeypatch.setattr(first, '_run', returning(completed(RULE_OUTPUT)))
+        assert await first.rule('E712') is not None
+
+        # a fresh process (e.g. after a client restart) reads the disk cache instead of ruff
+        second = RuffRunner()
+        calls: list[list[str]] = []
+
+        async def fake_run(args: list[str]) -> subprocess.CompletedProcess[str]:
+            calls.append(args)
+            return completed('', returncode=2)
+
+        monkeypatch.setattr(second, '_run', fake_run)
+        doc = await second.rule('E712')
+        assert doc is not None
+        assert doc.name == 'true-false-comparison'
+        assert calls == []
+
 
 class TestIntegration:
     """Tests against the real bundled ruff binary."""
 
-    def test_check_real_file(self, tmp_path: Path) -> None:
+    async def test_check_real_file(self, tmp_path: Path) -> None:
         (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401", "E712"]\n')
         (tmp_path / 'sample.py').write_text('import os\nx = 1\nif x == True:\n    pass\n')
-        violations = RuffRunner().check(str(tmp_path))
+        violations = await RuffRunner().check(str(tmp_path))
         assert violations is not None
         assert sorted(v.code for v in violations) == ['E712', 'F401']
 
-    def test_rule_real_lookup(self) -> None:
-        doc = RuffRunner().rule('F401')
+    async def test_check_narrowed_to_rule_selection(self, tmp_path: Path) -> None:
+        (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401", "E712"]\n')
+        (tmp_path / 'sample.py').write_text('import os\nx = 1\nif x == True:\n    pass\n')
+        runner = RuffRunner()
+        # `select` replaces the project's selection; `ignore` is added to it
+        selected = await runner.check(str(tmp_path), rules=RuleSelection(select=('E', 'F')))
+        assert sorted(v.code for v in selected or []) == ['E712', 'F401']
+        narrowed = await runner.check(str(tmp_path), rules=RuleSelection(select=('E7', 'F'), ignore=('F401',)))
+        assert [v.code for v in narrowed or []] == ['E712']
+
+    async def test_check_invalid_config_returns_none(self, tmp_path: Path) -> None:
+        (tmp_path / 'ruff.toml').write_text('[lint\n')
+        (tmp_path / 'sample.py').write_text('import os\n')
+        assert await RuffRunner().check(str(tmp_path)) is None
+
+    async def test_check_uses_private_cache_dir(self, tmp_path: Path) -> None:
+        (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401"]\n')
+        (tmp_path / 'sample.py').write_text('import os\n')
+        runner = RuffRunner()
+        assert await runner.check(str(tmp_path)) is not None
+        assert await runner.check(str(tmp_path)) is not None
+        # ruff's cache lands in the server's cache root, never in the project
+        assert not (tmp_path / '.ruff_cache').exists()
+        cache_dir = RuffCacheDirs().for_workspace(tmp_path)
+        assert cache_dir is not None
+        assert any(path.name != LAST_USED_FILE_NAME for path in cache_dir.iterdir())
+
+    async def test_cache_dir_is_prepared_off_the_event_loop(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        (tmp_path / 'sample.py').write_text('import os\n')
+        threads: list[threading.Thread] = []
+        original = RuffCacheDirs.for_workspace
+
+        def spy(self: RuffCacheDirs, path: str | Path) -> Path | None:
+            threads.append(threading.current_thread())
+            return original(self, path)
+
+        monkeypatch.setattr(RuffCacheDirs, 'for_workspace', spy)
+        assert await RuffRunner().check(str(tmp_path)) is not None
+        assert threads
+        assert threading.main_thread() not in threads
+
+    async def test_stream_check_closes_early(self, tmp_path: Path) -> None:
+        (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401"]\n')
+        (tmp_path / 'sample.py').write_text('import os\nimport sys\n')
+        stream = RuffRunner().stream_check(str(tmp_path))
+        assert (await anext(stream)).code == 'F401'
+        # stopping mid-stream kills ruff instead of leaving it running
+        await stream.aclose()
+
+    async def test_cancelled_check_kills_ruff(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        fake_ruff = tmp_path / 'ruff'
+        fake_ruff.write_text('#!/bin/sh\nexec sleep 30\n')
+        fake_ruff.chmod(0o755)
+        runner = RuffRunner()
+        monkeypatch.setattr(runner, '_ruff_bin', str(fake_ruff))
+        processes: list[asyncio.subprocess.Process] = []
+        started = asyncio.Event()
+        create = asyncio.create_subprocess_exec
+
+        async def spy(*args: str, **kwargs: object) -> asyncio.subprocess.Process:
+            process = await create(*args, **kwargs)  # type: ignore[arg-type]
+            processes.append(process)
+            started.set()
+            return process
+
+        monkeypatch.setattr(asyncio, 'create_subprocess_exec', spy)
+        task = asyncio.ensure_future(runner.check(str(tmp_path)))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # a cancelled tool call (MCP notifications/cancelled) must not leave ruff running
+        assert processes[0].returncode is not None
+
+    async def test_identical_concurrent_checks_share_one_run(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401"]\n')
+        (tmp_path / 'sample.py').write_text('import os\n')
+        runner = RuffRunner()
+        commands: list[tuple[str, ...]] = []
+        create = asyncio.create_subprocess_exec
+
+        async def spy(*args: str, **kwargs: object) -> asyncio.subprocess.Process:
+            commands.append(args)
+            return await create(*args, **kwargs)  # type: ignore[arg-type]
+
+        monkeypatch.setattr(asyncio, 'create_subprocess_exec', spy)
+        results = await asyncio.gather(*(runner.check(str(tmp_path)) for _ in range(3)))
+        assert [[v.code for v in result or []] for result in results] == [['F401']] * 3
+        assert sum('check' in command for command in commands) == 1
+
+        # an edit changes the tree state, so the next check runs ruff again
+        (tmp_path / 'sample.py').write_text('import os\nimport sys\n')
+        assert len(await runner.check(str(tmp_path)) or []) == 2
+        assert sum('check' in command for command in commands) == 2
+
+    async def test_rule_real_lookup(self) -> None:
+        doc = await RuffRunner().rule('F401')
         assert doc is not None
         assert doc.name == 'unused-import'
         assert 'unused' in doc.explanation.lower()
+
+    async def test_rules_real_catalogue(self) -> None:
+        rules = await RuffRunner().rules()
+        assert 'E712' in rules
+        assert rules['E712'].name == 'true-false-comparison'
+
+
+class TestRuleSelection:
+    def test_args(self) -> None:
+        assert RuleSelection().args == []
+        assert RuleSelection(select=('PERF', 'B')).args == ['--select=PERF,B']
+        assert RuleSelection(ignore=('B008',)).args == ['--extend-ignore=B008']
@@ -1,19 +1,91 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import asyncio
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Any
 
 import pytest
+from mcp.shared.memory import create_connected_server_and_client_session
 
-from ruff_tutor_mcp import server
+from ruff_tutor_mcp import instructions, server
+from ruff_tutor_mcp.memo import ScanMemo
+from ruff_tutor_mcp.ruff_lsp import RuffServerRunner
+from ruff_tutor_mcp.ruff_runner import RuffRunner, RuleSelection
+from ruff_tutor_mcp.session_db import SqliteSessionStore
+from ruff_tutor_mcp.sessions import SessionStore
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, AsyncIterator, Callable, Iterable
     from pathlib import Path
 
+    from ruff_tutor_mcp.models import RuffViolation, ViolationGroup
+    from ruff_tutor_mcp.progress import ScanProgress
+    from ruff_tutor_mcp.snapshots import Snapshot
+
+pytestmark = pytest.mark.anyio
+
 DIRTY_CODE = 'import os\nx = 1\nif x == True:\n    pass\n'
 PARTIALLY_FIXED_CODE = 'x = 1\nif x == True:\n    pass\n'
 CLEAN_CODE = 'x = 1\nif x:\n    pass\n'
 
 
+@pytest.fixture
+def check_calls(monkeypatch: pytest.MonkeyPatch) -> list[tuple[str, ...]]:
+    """Record the paths of every ruff check run by the server."""
+    calls: list[tuple[str, ...]] = []
+    original = RuffRunner.stream_check
+
+    def spy(  # noqa: PLR0913 - mirrors `RuffRunner.stream_check`
+        self: RuffRunner,
+        *paths: str,
+        force_exclude: bool = False,
+        workspace: str | None = None,
+        progress: ScanProgress | None = None,
+        time_limit: float | None = None,
+        rules: RuleSelection | None = None,
+    ) -> AsyncGenerator[RuffViolation, None]:
+        calls.append(paths)
+        return original(
+            self,
+            *paths,
+            force_exclude=force_exclude,
+            workspace=workspace,
+            progress=progress,
+            time_limit=time_limit,
+            rules=rules,
+        )
+
+    monkeypatch.setattr(RuffRunner, 'stream_check', spy)
+    return calls
+
+
+@pytest.fixture
+async def lsp_runner(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[RuffServerRunner]:
+    """Give the test its own `ruff server`, shut down afterwards."""
+    runner = RuffServerRunner()
+    monkeypatch.setattr(server, '_lsp_runner', runner)
+    yield runner
+    await runner.close()
+
+
+@pytest.fixture
+def hang_ruff(tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch) -> Callable[[], None]:
+    """Return a switch that makes the server's ruff hang until it is killed.
+
+    The fake ruff is a shell whose child keeps the output pipes open, so only
+    killing the whole process group lets the scan end.
+    """
+    fake_ruff = tmp_path_factory.mktemp('bin') / 'ruff'
+    fake_ruff.write_text('#!/bin/sh\nsleep 30\n')
+    fake_ruff.chmod(0o755)
+
+    def hang() -> None:
+        monkeypatch.setattr(server._runner, '_ruff_bin', str(fake_ruff))  # noqa: SLF001
+
+    return hang
+
+
 @pytest.fixture
 def project(tmp_path: Path) -> Path:
     # 対象プロジェクト側の ruff 設定が尊重されることも兼ねて、ルールを固定する
@@ -23,8 +95,8 @@ def project(tmp_path: Path) -> Path:
 
 
 class TestReviewCode:
-    def test_auto_mode_returns_one_shot_report(self, project: Path) -> None:
-        response = server.review_code(str(project), mode='auto')
+    async def test_auto_mode_returns_one_shot_report(self, project: Path) -> None:
+        response = await server.review_code(str(project), mode='auto')
         assert response.status == 'violations_found'
         assert response.mode == 'auto'
         assert response.session_id is None
@@ -33,41 +105,149 @@ class TestReviewCode:
         fixables = [v for g in response.groups for v in g.violations if v.fixable]
         assert all(v.after is not None for v in fixables)
 
-    def test_beginner_mode_starts_session_with_fixes(self, project: Path) -> None:
-        response = server.review_code(str(project), mode='beginner')
+    async def test_beginner_mode_starts_session_with_fixes(self, project: Path) -> None:
+        response = await server.review_code(str(project), mode='beginner')
         assert response.session_id is not None
         assert response.max_retry is not None
         e712 = next(g for g in response.groups if g.code == 'E712')
         assert e712.violations[0].after == 'if x:'
         assert e712.violations[0].before == 'if x == True:'
 
-    def test_advanced_mode_never_includes_fixes(self, project: Path) -> None:
-        response = server.review_code(str(project), mode='advanced')
+    async def test_advanced_mode_never_includes_fixes(self, project: Path) -> None:
+        response = await server.review_code(str(project), mode='advanced')
         assert response.session_id is not None
         assert all(v.after is None for g in response.groups for v in g.violations)
         # fixable であることは伝わる（答えは見せない）
         assert any(v.fixable for g in response.groups for v in g.violations)
 
-    def test_clean_code(self, tmp_path: Path) -> None:
+    async def test_sources_are_read_and_grouped_off_the_event_loop(
+        self, project: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        threads: list[threading.Thread] = []
+        read_source, group = server._read_source, server._group  # noqa: SLF001
+
+        def reading(filename: str) -> str:
+            threads.append(threading.current_thread())
+            return read_source(filename)
+
+        def grouping(*args: Any) -> list[ViolationGroup]:  # noqa: ANN401
+            threads.append(threading.current_thread())
+            return group(*args)
+
+        monkeypatch.setattr(server, '_read_source', reading)
+        monkeypatch.setattr(server, '_group', grouping)
+        assert (await server.review_code(str(project), mode='auto')).total == 2
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+    async def test_clean_code(self, tmp_path: Path) -> None:
         (tmp_path / 'ruff.toml').write_text('[lint]\nselect = ["F401", "E712"]\n')
         (tmp_path / 'sample.py').write_text(CLEAN_CODE)
-        response = server.review_code(str(tmp_path), mode='beginner')
+        response = await server.review_code(str(tmp_path), mode='beginner')
         assert response.status == 'clean'
         assert response.session_id is None
 
-    def test_mode_from_config_file(self, project: Path) -> None:
+    async def test_mode_from_config_file(self, project: Path) -> None:
         (project / '.ruff-tutor.toml').write_text('mode = "advanced"\n')
-        response = server.review_code(str(project))
+        response = await server.review_code(str(project))
         assert response.mode == 'advanced'
 
+    @pytest.mark.usefixtures('lsp_runner')
+    async def test_unchanged_project_is_not_rescanned(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        first = await server.review_code(str(project), mode='auto')
+        # a retry in another mode reuses the memoized scan
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert len(check_calls) == 1
+        assert lesson.total == first.total
+
+        (project / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
+        assert (await server.review_code(str(project), mode='auto')).total == 1
+        assert len(check_calls) == 2
+
+    @pytest.mark.usefixtures('lsp_runner')
+    async def test_extended_config_edit_is_not_a_memo_hit(self, tmp_path: Path) -> None:
+        (tmp_path / 'shared.toml').write_text('[lint]\nselect = ["F401"]\n')
+        project = tmp_path / 'project'
+        project.mkdir()
+        (project / 'ruff.toml').write_text('extend = "../shared.toml"\n')
+        (project / 'sample.py').write_text(DIRTY_CODE)
+        assert (await server.review_code(str(project), mode='auto')).total == 1
+
+        (tmp_path / 'shared.toml').write_text('[lint]\nselect = ["F401", "E712"]\n')
+        assert (await server.review_code(str(project), mode='auto')).total == 2
+
+    async def test_server_backend(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        (project / '.ruff-tutor.toml').write_text('backend = "server"\n')
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert check_calls == []
+        assert sorted(g.code for g in lesson.groups) == ['E712', 'F401']
+        e712 = next(g for g in lesson.groups if g.code == 'E712')
+        assert e712.violations[0].after == 'if x:'
+
+        assert lesson.session_id is not None
+        (project / 'sample.py').write_text(CLEAN_CODE)
+        progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'passed'
+        assert check_calls == []
+
+    async def test_pages_without_rerunning_ruff(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        response = await server.review_code(str(project), mode='auto', page_size=1)
+        assert response.total == 2
+        assert [g.code for g in response.groups] == ['E712']
+        assert response.next_cursor is not None
+        runs = len(check_calls)
+
+        second = await server.review_code(str(project), mode='auto', page_size=1, cursor=response.next_cursor)
+        assert [g.code for g in second.groups] == ['F401']
+        assert second.next_cursor is None
+        assert len(check_calls) == runs
+
+    async def test_response_stays_within_budget(self, project: Path) -> None:
+        (project / 'sample.py').write_text(''.join(f'import module_{n}\n' for n in range(300)))
+        response = await server.review_code(str(project), mode='auto', page_size=1000, max_response_bytes=8 * 1024)
+        assert len(response.model_dump_json()) <= 8 * 1024
+        (f401,) = response.groups
+        assert f401.count == 300
+        assert len(f401.violations) + f401.omitted == 300
+        assert f401.omitted_files == ['sample.py']
+
+    async def test_timeout(self, project: Path, hang_ruff: Callable[[], None]) -> None:
+        (project / '.ruff-tutor.toml').write_text('timeout = 0.2\n')
+        hang_ruff()
+        async with asyncio.timeout(10):
+            response = await server.review_code(str(project))
+        assert response.status == 'timeout'
+        assert response.instruction == instructions.TIMEOUT
+
+    async def test_unknown_cursor(self, project: Path) -> None:
+        response = await server.review_code(str(project), cursor='missing:1')
+        assert response.status == 'error'
+
+    async def test_reports_progress_to_mcp_client(self, project: Path) -> None:
+        updates: list[tuple[float, float | None, str | None]] = []
+
+        async def on_progress(progress: float, total: float | None, message: str | None) -> None:
+            updates.append((progress, total, message))
+
+        async with create_connected_server_and_client_session(server.mcp) as client:
+            result = await client.call_tool(
+                'review_code', {'path': str(project), 'mode': 'auto'}, progress_callback=on_progress
+            )
+        assert not result.isError
+        values = [progress for progress, _, _ in updates]
+        assert values == sorted(set(values))
+        assert values[0] == 0.0
+        assert updates[0][2] == 'Running ruff'
+        assert any(message and message.startswith('Grouping') for _, _, message in updates)
+
 
 class TestCheckMyFix:
-    def test_partial_fix_reports_progress(self, project: Path) -> None:
-        lesson = server.review_code(str(project), mode='beginner')
+    async def test_partial_fix_reports_progress(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
         assert lesson.session_id is not None
         (project / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
 
-        progress = server.check_my_fix(lesson.session_id)
+        progress = await server.check_my_fix(lesson.session_id)
         assert progress.verdict == 'keep_trying'
         assert progress.attempts == 1
         assert [ref.code for ref in progress.fixed] == ['F401']
@@ -76,81 +256,575 @@ class TestCheckMyFix:
         # beginner の keep_trying では引き続き after を見せる
         assert progress.remaining[0].violations[0].after is not None
 
-    def test_advanced_keep_trying_hides_fixes(self, project: Path) -> None:
-        lesson = server.review_code(str(project), mode='advanced')
+    async def test_advanced_keep_trying_hides_fixes(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='advanced')
         assert lesson.session_id is not None
         (project / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
 
-        progress = server.check_my_fix(lesson.session_id)
+        progress = await server.check_my_fix(lesson.session_id)
         assert progress.verdict == 'keep_trying'
         assert all(v.after is None for g in progress.remaining for v in g.violations)
 
-    def test_full_fix_passes(self, project: Path) -> None:
-        lesson = server.review_code(str(project), mode='beginner')
+    async def test_added_init_file_clears_violations_of_untouched_files(self, project: Path) -> None:
+        (project / 'ruff.toml').write_text('[lint]\nselect = ["F401", "INP001"]\n')
+        (project / 'sample.py').unlink()
+        (project / 'pkg').mkdir()
+        (project / 'pkg' / 'm.py').write_text('import os\n')
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        assert sorted(g.code for g in lesson.groups) == ['F401', 'INP001']
+
+        (project / 'pkg' / '__init__.py').write_text('')
+        progress = await server.check_my_fix(lesson.session_id)
+        assert [ref.code for ref in progress.fixed] == ['INP001']
+        assert [g.code for g in progress.remaining] == ['F401']
+
+    async def test_full_fix_passes(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
         assert lesson.session_id is not None
         (project / 'sample.py').write_text(CLEAN_CODE)
 
-        progress = server.check_my_fix(lesson.session_id)
+        progress = await server.check_my_fix(lesson.session_id)
         assert progress.verdict == 'passed'
         assert sorted(ref.code for ref in progress.fixed) == ['E712', 'F401']
         assert progress.remaining == []
 
-    def test_answer_revealed_after_max_retry(self, project: Path) -> None:
+    async def test_answer_revealed_after_max_retry(self, project: Path) -> None:
         (project / '.ruff-tutor.toml').write_text('mode = "advanced"\nmax_retry = 2\n')
-        lesson = server.review_code(str(project))
+        lesson = await server.review_code(str(project))
         assert lesson.session_id is not None
 
-        first = server.check_my_fix(lesson.session_id)
+        (project / 'sample.py').write_text(f'# first try\n{DIRTY_CODE}')
+        first = await server.check_my_fix(lesson.session_id)
         assert first.verdict == 'keep_trying'
 
-        second = server.check_my_fix(lesson.session_id)
+        (project / 'sample.py').write_text(f'# second try\n{DIRTY_CODE}')
+        second = await server.check_my_fix(lesson.session_id)
         assert second.verdict == 'answer_revealed'
         # リトライ上限に達したら advanced でも答えを開示する
         fixables = [v for g in second.remaining for v in g.violations if v.fixable]
         assert fixables
         assert all(v.after is not None for v in fixables)
 
-    def test_new_violation_is_reported_and_tracked(self, project: Path) -> None:
-        lesson = server.review_code(str(project), mode='beginner')
+    async def test_new_violation_is_reported_and_tracked(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
         assert lesson.session_id is not None
         # F401 は直したが、新たな E712 違反を書いてしまった
         (project / 'sample.py').write_text('x = 1\nif x == True:\n    pass\nif x == False:\n    pass\n')
 
-        progress = server.check_my_fix(lesson.session_id)
+        progress = await server.check_my_fix(lesson.session_id)
         assert progress.verdict == 'keep_trying'
         assert [g.code for g in progress.new] == ['E712']
 
         # 次のチェックでは new がベースラインに編入され remaining として扱われる
-        second = server.check_my_fix(lesson.session_id)
+        (project / 'sample.py').write_text('x = 1\nif x == True:\n    pass\nif x == False:\n    pass\n# retry\n')
+        second = await server.check_my_fix(lesson.session_id)
         assert second.new == []
 
-    def test_unknown_session(self) -> None:
-        progress = server.check_my_fix('does-not-exist')
+    async def test_unchanged_tree_skips_ruff_and_keeps_attempts(
+        self, project: Path, check_calls: list[tuple[str, ...]]
+    ) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        runs = len(check_calls)
+
+        progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'no_changes'
+        assert progress.attempts == 0
+        assert len(check_calls) == runs
+
+        # re-saving identical content is still "no changes"
+        (project / 'sample.py').write_text(DIRTY_CODE)
+        assert (await server.check_my_fix(lesson.session_id)).verdict == 'no_changes'
+
+        (project / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
+        progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'keep_trying'
+        assert progress.attempts == 1
+
+    async def test_relints_only_changed_files(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        (project / 'other.py').write_text('import sys\n')
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        assert lesson.total == 3
+        (project / 'sample.py').write_text(CLEAN_CODE)
+
+        progress = await server.check_my_fix(lesson.session_id)
+        assert check_calls[-1] == (str(project / 'sample.py'),)
+        # the untouched file's violation is carried over from the previous scan
+        assert [g.code for g in progress.remaining] == ['F401']
+        assert progress.remaining[0].violations[0].file == 'other.py'
+        assert sorted(ref.code for ref in progress.fixed) == ['E712', 'F401']
+
+    async def test_config_change_triggers_full_scan(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        (project / 'ruff.toml').write_text('[lint]\nselect = ["E712"]\n')
+
+        progress = await server.check_my_fix(lesson.session_id)
+        assert check_calls[-1] == (str(project),)
+        assert [ref.code for ref in progress.fixed] == ['F401']
+
+    async def test_ruff_failure_is_reported_as_error(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        (project / 'ruff.toml').write_text('[lint\n')
+
+        progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'error'
+        assert progress.attempts == 0
+
+    async def test_timeout_does_not_use_an_attempt(self, project: Path, hang_ruff: Callable[[], None]) -> None:
+        # long enough for the real ruff to start the session
+        (project / '.ruff-tutor.toml').write_text('timeout = 1\n')
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        (project / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
+        hang_ruff()
+
+        async with asyncio.timeout(10):
+            progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'timeout'
+        assert progress.attempts == 0
+
+    async def test_concurrent_checks_of_one_session(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        # fixes F401 on `os` and introduces a new F401 on `sys`
+        (project / 'sample.py').write_text('import sys\n' + PARTIALLY_FIXED_CODE)
+
+        results = await asyncio.gather(*(server.check_my_fix(lesson.session_id) for _ in range(200)))
+        # only the first call re-checks; the others find nothing new since
+        assert sorted({result.verdict for result in results}) == ['keep_trying', 'no_changes']
+        assert [result.verdict for result in results].count('keep_trying') == 1
+        assert {result.attempts for result in results} == {1}
+
+        session = server._store.get(lesson.session_id)  # noqa: SLF001
+        assert session is not None
+        assert session.attempts == 1
+        assert sorted(session.initial.values()) == [1, 1, 1]
+        summary = await server.end_session(lesson.session_id)
+        assert (summary.attempts, summary.fixed_count, summary.remaining_count) == (1, 1, 2)
+
+    async def test_pages_remaining_then_new(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+        (project / 'sample.py').write_text('import os\nimport sys\nx = 1\nif x == True:\n    pass\n')
+
+        progress = await server.check_my_fix(lesson.session_id, page_size=2)
+        assert [g.code for g in progress.remaining] == ['E712', 'F401']
+        assert progress.new == []
+        assert progress.next_cursor is not None
+        runs = len(check_calls)
+
+        page = await server.check_my_fix(lesson.session_id, page_size=2, cursor=progress.next_cursor)
+        assert page.remaining == []
+        assert [g.code for g in page.new] == ['F401']
+        assert page.attempts == progress.attempts == 1
+        assert len(check_calls) == runs
+
+        # a cursor only works for the session it was issued to
+        other = await server.review_code(str(project), mode='beginner')
+        assert other.session_id is not None
+        expired = await server.check_my_fix(other.session_id, cursor=progress.next_cursor)
+        assert expired.verdict == 'error'
+
+    async def test_unknown_session(self) -> None:
+        progress = await server.check_my_fix('does-not-exist')
         assert progress.verdict == 'session_not_found'
         assert 'review_code' in progress.instruction
 
+    async def test_evicted_session(self, project: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(server, '_store', SessionStore(max_sessions=1))
+        first = await server.review_code(str(project), mode='beginner')
+        await server.review_code(str(project), mode='advanced')
+        assert first.session_id is not None
+
+        progress = await server.check_my_fix(first.session_id)
+        assert progress.verdict == 'evicted'
+        assert 'session_memory_mb' in progress.instruction
+        summary = await server.end_session(first.session_id)
+        assert summary.instruction == progress.instruction
+
+
+class TestMonorepo:
+    @pytest.fixture
+    def monorepo(self, project: Path) -> Path:
+        (project / 'sample.py').unlink()
+        for name, mode, max_retry in (('easy', 'beginner', 1), ('hard', 'advanced', 3)):
+            package = project / 'packages' / name
+            (package / 'src').mkdir(parents=True)
+            (package / '.ruff-tutor.toml').write_text(f'mode = "{mode}"\nmax_retry = {max_retry}\n')
+            (package / 'src' / 'sample.py').write_text(DIRTY_CODE)
+        return project
+
+    async def test_each_package_uses_its_own_config(self, monorepo: Path, check_calls: list[tuple[str, ...]]) -> None:
+        lesson = await server.review_code(str(monorepo))
+        assert len(check_calls) == 1
+        assert (lesson.mode, lesson.max_retry) == ('mixed', 3)
+        assert lesson.instruction == instructions.MIXED
+        assert [(p.path, p.mode, p.max_retry) for p in lesson.packages] == [
+            ('packages/easy', 'beginner', 1),
+            ('packages/hard', 'advanced', 3),
+        ]
+        details = [detail for group in lesson.groups for detail in group.violations]
+        assert {(d.file.split('/')[1], d.mode, d.after is not None) for d in details if d.fixable} == {
+            ('easy', 'beginner', True),
+            ('hard', 'advanced', False),
+        }
+
+        # one attempt reaches the easy package's limit, which reveals its fixes only
+        (monorepo / 'packages' / 'easy' / 'src' / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
+        (monorepo / 'packages' / 'hard' / 'src' / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
+        progress = await server.check_my_fix(lesson.session_id or '')
+        assert (progress.verdict, progress.max_retry) == ('keep_trying', 3)
+        remaining = [detail for group in progress.remaining for detail in group.violations]
+        assert {(d.mode, d.after is not None) for d in remaining} == {('beginner', True), ('advanced', False)}
+
+    async def test_new_violations_in_an_unseen_package_use_its_config(self, monorepo: Path) -> None:
+        strict = monorepo / 'packages' / 'strict'
+        (strict / 'src').mkdir(parents=True)
+        (strict / '.ruff-tutor.toml').write_text('mode = "advanced"\nmax_retry = 3\n')
+        (strict / 'src' / 'sample.py').write_text(CLEAN_CODE)
+        lesson = await server.review_code(str(monorepo))
+        assert [p.path for p in lesson.packages] == ['packages/easy', 'packages/hard']
+
+        (strict / 'src' / 'sample.py').write_text(DIRTY_CODE)
+        progress = await server.check_my_fix(lesson.session_id or '')
+        new = [detail for group in progress.new for detail in group.violations]
+        assert {(d.file.split('/')[1], d.mode) for d in new} == {('strict', 'advanced')}
+        assert all(d.after is None for d in new)
+
+    async def test_new_violations_in_another_package_of_a_one_package_session(self, monorepo: Path) -> None:
+        hard = monorepo / 'packages' / 'hard' / 'src' / 'sample.py'
+        hard.write_text(CLEAN_CODE)
+        lesson = await server.review_code(str(monorepo))
+        assert (lesson.mode, lesson.packages) == ('beginner', [])
+
+        hard.write_text(DIRTY_CODE)
+        progress = await server.check_my_fix(lesson.session_id or '')
+        new = [detail for group in progress.new for detail in group.violations]
+        assert {(d.file.split('/')[1], d.mode) for d in new} == {('hard', 'advanced')}
+        assert all(d.after is None for d in new)
+
+    async def test_explicit_mode_covers_packages_seen_later(self, monorepo: Path) -> None:
+        hard = monorepo / 'packages' / 'hard' / 'src' / 'sample.py'
+        hard.write_text(CLEAN_CODE)
+        lesson = await server.review_code(str(monorepo), mode='beginner')
+
+        hard.write_text(DIRTY_CODE)
+        progress = await server.check_my_fix(lesson.session_id or '')
+        assert all(d.after is not None for group in progress.new for d in group.violations if d.fixable)
+
+    async def test_explicit_mode_keeps_package_retry_limits(self, monorepo: Path) -> None:
+        lesson = await server.review_code(str(monorepo), mode='beginner')
+        assert (lesson.mode, lesson.max_retry) == ('beginner', 3)
+        assert [(p.mode, p.max_retry) for p in lesson.packages] == [('beginner', 1), ('beginner', 3)]
+        assert all(detail.mode is None for group in lesson.groups for detail in group.violations)
+
+    async def test_one_package_is_not_mixed(self, monorepo: Path) -> None:
+        lesson = await server.review_code(str(monorepo / 'packages' / 'hard'))
+        assert (lesson.mode, lesson.max_retry, lesson.packages) == ('advanced', 3, [])
+
+
+class TestChangedScope:
+    @pytest.fixture
+    def repo(self, project: Path, git: Callable[..., None]) -> Path:
+        (project / 'other.py').write_text('import sys\n')
+        git(project, 'init', '-q')
+        git(project, 'add', '.')
+        git(project, 'commit', '-q', '-m', 'initial')
+        return project
+
+    async def test_lints_only_changed_files(self, repo: Path, check_calls: list[tuple[str, ...]]) -> None:
+        (repo / 'sample.py').write_text('import json\n' + DIRTY_CODE)
+        response = await server.review_code(str(repo), mode='auto', scope='changed')
+        assert check_calls == [(str(repo / 'sample.py'),)]
+        assert response.total == 3
+        assert {v.file for g in response.groups for v in g.violations} == {'sample.py'}
+
+    async def test_hunks_keep_violations_on_changed_lines(self, repo: Path) -> None:
+        (repo / 'sample.py').write_text('import json\n' + DIRTY_CODE)
+        response = await server.review_code(str(repo), mode='auto', scope='hunks')
+        assert [(g.code, g.violations[0].row) for g in response.groups] == [('F401', 1)]
+
+    async def test_no_changed_files(self, repo: Path, check_calls: list[tuple[str, ...]]) -> None:
+        response = await server.review_code(str(repo), mode='beginner', scope='changed')
+        assert (response.status, response.instruction) == ('clean', instructions.NO_CHANGED_FILES)
+        assert response.session_id is None
+        assert check_calls == []
+
+    async def test_outside_git_repository(self, project: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv('GIT_CEILING_DIRECTORIES', str(project.parent))
+        response = await server.review_code(str(project), scope='changed')
+        assert (response.status, response.instruction) == ('error', instructions.GIT_ERROR)
+
+    async def test_unknown_scope_reviews_everything(self, repo: Path) -> None:
+        response = await server.review_code(str(repo), mode='auto', scope='staged')
+        assert response.total == 3
+
+    async def test_session_follows_the_working_tree(self, repo: Path, check_calls: list[tuple[str, ...]]) -> None:
+        (repo / 'sample.py').write_text('import json\n' + DIRTY_CODE)
+        lesson = await server.review_code(str(repo), mode='beginner', scope='hunks')
+        assert lesson.session_id is not None
+        assert lesson.total == 1
+
+        # a newly touched file joins the scope; only it is re-linted
+        (repo / 'other.py').write_text('import sys\nimport re\n')
+        progress = await server.check_my_fix(lesson.session_id)
+        assert check_calls[-1] == (str(repo / 'other.py'),)
+        assert [(g.code, g.violations[0].file, g.violations[0].row) for g in progress.new] == [('F401', 'other.py', 2)]
+
+        # reverting the files leaves nothing in scope
+        (repo / 'sample.py').write_text(DIRTY_CODE)
+        (repo / 'other.py').write_text('import sys\n')
+        progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'passed'
+        assert len(check_calls) == 2
+
+
+class TestRuleSelection:
+    async def test_review_is_narrowed(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        selected = await server.review_code(str(project), mode='auto', select=[' e7 '])
+        assert [g.code for g in selected.groups] == ['E712']
+        ignored = await server.review_code(str(project), mode='auto', ignore=['E712'])
+        assert [g.code for g in ignored.groups] == ['F401']
+        # each selection is its own scan, never another's memoized result
+        assert len(check_calls) == 2
+
+    async def test_session_rechecks_with_the_same_rules(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='beginner', select=['E712'])
+        assert lesson.session_id is not None
+        assert lesson.total == 1
+        # the new F401 is outside the selection, so the session is done
+        (project / 'sample.py').write_text('import sys\n' + CLEAN_CODE)
+        progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'passed'
+        assert [ref.code for ref in progress.fixed] == ['E712']
+
+    async def test_unknown_selector(self, project: Path, check_calls: list[tuple[str, ...]]) -> None:
+        response = await server.review_code(str(project), select=['PERF', 'NOPE1'])
+        assert response.status == 'error'
+        assert response.instruction == instructions.unknown_rules_instruction(['NOPE1'])
+        assert check_calls == []
+
+    @pytest.mark.usefixtures('lsp_runner')
+    async def test_server_backend_narrows_with_the_cli(
+        self, project: Path, check_calls: list[tuple[str, ...]]
+    ) -> None:
+        (project / '.ruff-tutor.toml').write_text('backend = "server"\n')
+        response = await server.review_code(str(project), mode='auto', select=['F401'])
+        assert [g.code for g in response.groups] == ['F401']
+        assert check_calls == [(str(project),)]
+
+
+class TestReviewPaths:
+    @pytest.fixture
+    def packages(self, project: Path) -> list[Path]:
+        paths = [project / 'a', project / 'b', project / 'c' / 'sample.py']
+        for path in paths:
+            directory = path.parent if path.suffix else path
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / 'sample.py').write_text(DIRTY_CODE)
+        return paths
+
+    async def test_one_ruff_run_for_all_paths(self, packages: list[Path], check_calls: list[tuple[str, ...]]) -> None:
+        batch = await server.review_paths([str(path) for path in packages], mode='auto')
+        assert check_calls == [tuple(str(path) for path in packages)]
+        assert batch.instruction == instructions.BATCH
+        assert [review.path for review in batch.reviews] == [str(path) for path in packages]
+        for review in batch.reviews:
+            assert (review.status, review.total) == ('violations_found', 2)
+            assert {v.file for g in review.groups for v in g.violations} == {'sample.py'}
+
+    async def test_reviews_match_review_code(self, packages: list[Path], monkeypatch: pytest.MonkeyPatch) -> None:
+        batch = await server.review_paths([str(path) for path in packages], mode='auto')
+        # each path scanned on its own
+        monkeypatch.setattr(server, '_memo', ScanMemo())
+        for path, review in zip(packages, batch.reviews, strict=True):
+            single = await server.review_code(str(path), mode='auto')
+            assert review.model_copy(update={'path': None}) == single
+
+    async def test_nested_path_gets_its_own_run(
+        self, project: Path, packages: list[Path], check_calls: list[tuple[str, ...]]
+    ) -> None:
+        batch = await server.review_paths([str(packages[0]), str(project), str(packages[1])], mode='auto')
+        assert check_calls == [(str(packages[0]),), (str(project),), (str(packages[1]),)]
+        inner, outer, _ = batch.reviews
+        assert {v.file for g in inner.groups for v in g.violations} == {'sample.py'}
+        assert (inner.total, outer.total) == (2, 8)
+        assert 'a/sample.py' in {v.file for g in outer.groups for v in g.violations}
+
+    async def test_excluded_nested_directory(self, project: Path, packages: list[Path]) -> None:
+        (project / 'ruff.toml').write_text('extend-exclude = ["vendor"]\n[lint]\nselect = ["F401", "E712"]\n')
+        (project / 'vendor').mkdir()
+        (project / 'vendor' / 'a.py').write_text('import os\n')
+        vendor = str(project / 'vendor')
+
+        batch = await server.review_paths([str(project), vendor, str(packages[0])], mode='auto')
+        outer, nested, _ = batch.reviews
+        # ruff skips the excluded directory while walking the project, but not when it is named
+        assert 'vendor/a.py' not in {v.file for g in outer.groups for v in g.violations}
+        assert (nested.status, nested.total) == ('violations_found', 1)
+        assert nested.model_copy(update={'path': None}) == await server.review_code(vendor, mode='auto')
+
+    async def test_memoized_paths_are_not_relinted(
+        self, packages: list[Path], check_calls: list[tuple[str, ...]]
+    ) -> None:
+        await server.review_code(str(packages[0]), mode='auto')
+        await server.review_paths([str(path) for path in packages], mode='auto')
+        assert check_calls == [(str(packages[0]),), (str(packages[1]), str(packages[2]))]
+
+    async def test_each_path_is_walked_once(self, packages: list[Path], monkeypatch: pytest.MonkeyPatch) -> None:
+        walked: list[str] = []
+        original = server.take_snapshot
+
+        def spy(path: str | Path, previous: Snapshot | None = None, only: Iterable[str] | None = None) -> Snapshot:
+            walked.append(str(path))
+            return original(path, previous=previous, only=only)
+
+        monkeypatch.setattr(server, 'take_snapshot', spy)
+        await server.review_paths([str(path) for path in packages], mode='beginner')
+        assert walked == [str(path) for path in packages]
+
+    async def test_each_path_gets_its_own_session(self, packages: list[Path]) -> None:
+        batch = await server.review_paths([str(path) for path in packages[:2]], mode='beginner')
+        first, second = batch.reviews
+        assert first.session_id is not None
+        assert second.session_id is not None
+        assert first.session_id != second.session_id
+
+        (packages[0] / 'sample.py').write_text(CLEAN_CODE)
+        progress = await server.check_my_fix(first.session_id)
+        assert progress.verdict == 'passed'
+        assert sorted(ref.code for ref in progress.fixed) == ['E712', 'F401']
+
+    async def test_timeout(self, project: Path, packages: list[Path], hang_ruff: Callable[[], None]) -> None:
+        (project / '.ruff-tutor.toml').write_text('timeout = 1\n')
+        hang_ruff()
+        async with asyncio.timeout(10):
+            batch = await server.review_paths([str(path) for path in packages], mode='auto')
+        assert [review.status for review in batch.reviews] == ['timeout'] * 3
+
+    async def test_rule_selection_and_unknown_selector(self, packages: list[Path]) -> None:
+        batch = await server.review_paths([str(path) for path in packages], mode='auto', select=['E712'])
+        assert [review.total for review in batch.reviews] == [1, 1, 1]
+        refused = await server.review_paths([str(packages[0])], select=['NOPE1'])
+        assert (refused.reviews, refused.instruction) == ([], instructions.unknown_rules_instruction(['NOPE1']))
+
+
+class TestSqliteSessions:
+    async def test_session_survives_restart(
+        self, project: Path, tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        db_path = tmp_path_factory.mktemp('db') / 'sessions.sqlite3'
+        monkeypatch.setattr(server, '_store', SqliteSessionStore(db_path))
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+
+        # a new store on the same database stands in for a restarted server
+        monkeypatch.setattr(server, '_store', SqliteSessionStore(db_path))
+        (project / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
+        progress = await server.check_my_fix(lesson.session_id)
+        assert progress.verdict == 'keep_trying'
+        assert [ref.code for ref in progress.fixed] == ['F401']
+
+        summary = await server.end_session(lesson.session_id)
+        assert (summary.attempts, summary.fixed_count, summary.remaining_count) == (1, 1, 1)
+
+    async def test_locked_database_does_not_block_the_event_loop(
+        self, project: Path, tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        db_path = tmp_path_factory.mktemp('db') / 'sessions.sqlite3'
+        monkeypatch.setattr(server, '_store', SqliteSessionStore(db_path))
+        lesson = await server.review_code(str(project), mode='beginner')
+        assert lesson.session_id is not None
+
+        (project / 'sample.py').write_text(PARTIALLY_FIXED_CODE)
+        # another process holds the write lock
+        blocker = sqlite3.connect(db_path)
+        blocker.execute('BEGIN IMMEDIATE')
+        check = asyncio.create_task(server.check_my_fix(lesson.session_id))
+        await asyncio.sleep(0.3)
+        assert not check.done()
+        blocker.rollback()
+        blocker.close()
+        assert (await check).attempts == 1
+
 
 class TestEndSession:
-    def test_summary_after_pass(self, project: Path) -> None:
-        lesson = server.review_code(str(project), mode='beginner')
+    async def test_summary_after_pass(self, project: Path) -> None:
+        lesson = await server.review_code(str(project), mode='beginner')
         assert lesson.session_id is not None
         (project / 'sample.py').write_text(CLEAN_CODE)
-        server.check_my_fix(lesson.session_id)
+        await server.check_my_fix(lesson.session_id)
 
-        summary = server.end_session(lesson.session_id)
+        summary = await server.end_session(lesson.session_id)
         assert summary.fixed_count == 2
         assert summary.remaining_count == 0
         assert summary.rules_covered == ['E712', 'F401']
         # 終了後は取得できない
-        assert server.end_session(lesson.session_id).rules_covered == []
+        assert (await server.end_session(lesson.session_id)).rules_covered == []
+
+
+class TestDiagnostics:
+    async def test_reports_sessions_and_memo(self, project: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(server, '_store', SessionStore())
+        monkeypatch.setattr(server, '_memo', ScanMemo())
+        await server.review_code(str(project), mode='beginner')
+        await server.review_code(str(project), mode='beginner')
+
+        report = await server.diagnostics()
+        assert (report.sessions.store, report.sessions.sessions, report.sessions.evictions) == ('memory', 2, 0)
+        assert report.sessions.max_bytes is not None
+        assert 0 < report.sessions.bytes <= report.sessions.max_bytes
+        assert (report.scan_memo.entries, report.scan_memo.hits, report.scan_memo.misses) == (1, 1, 1)
+
+    async def test_over_mcp(self) -> None:
+        async with create_connected_server_and_client_session(server.mcp) as client:
+            result = await client.call_tool('diagnostics', {})
+        assert not result.isError
+        assert result.structuredContent is not None
+        assert set(result.structuredContent) == {'sessions', 'scan_memo'}
 
 
 class TestExplainRule:
-    def test_known_rule(self) -> None:
-        doc = server.explain_rule('E712')
+    async def test_known_rule(self) -> None:
+        doc = await server.explain_rule('E712')
         assert doc.name == 'true-false-comparison'
         assert doc.explanation
 
-    def test_unknown_rule(self) -> None:
-        doc = server.explain_rule('ZZZ999')
+    async def test_unknown_rule(self) -> None:
+        doc = await server.explain_rule('ZZZ999')
         assert 'No ruff rule found' in doc.explanation
+
+    async def test_not_blocked_by_running_scan(self, project: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        await server.explain_rule('E712')  # warm the rule catalogue
+        scan_started = asyncio.Event()
+        release_scan = asyncio.Event()
+        original = RuffRunner.stream_check
+
+        async def slow_check(
+            self: RuffRunner,
+            *paths: str,
+            progress: ScanProgress | None = None,
+            time_limit: float | None = None,
+            rules: RuleSelection | None = None,
+        ) -> AsyncGenerator[RuffViolation, None]:
+            del time_limit, rules
+            scan_started.set()
+            await release_scan.wait()
+            async for violation in original(self, *paths, progress=progress):
+                yield violation
+
+        monkeypatch.setattr(RuffRunner, 'stream_check', slow_check)
+        review = asyncio.create_task(server.review_code(str(project), mode='auto'))
+        await scan_started.wait()
+
+        # a cheap lookup completes while the scan is still in flight
+        doc = await asyncio.wait_for(server.explain_rule('F401'), timeout=5)
+        assert doc.name == 'unused-import'
+        assert not review.done()
+
+        release_scan.set()
+        assert (await review).total == 2
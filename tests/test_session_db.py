@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import pytest
+
+from ruff_tutor_mcp.models import FixEdit, RuffFix, RuffViolation
+from ruff_tutor_mcp.ruff_runner import RuleSelection
+from ruff_tutor_mcp.session_db import SqliteSessionStore
+from ruff_tutor_mcp.sessions import (
+    Inspected,
+    ScanState,
+    TeachingPolicy,
+    TrackedRef,
+    TrackedViolation,
+    make_fingerprint,
+)
+from ruff_tutor_mcp.snapshots import FileState, Snapshot
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def tracked(file: str, code: str, line: str) -> TrackedViolation:
+    return TrackedViolation(
+        fingerprint=make_fingerprint(file, code, line),
+        ref=TrackedRef.of(file, 1, code, f'{code} violation'),
+    )
+
+
+def inspected(path: str) -> Inspected:
+    violation = RuffViolation(
+        code='E712',
+        message='Avoid equality comparisons to `True`',
+        filename=path,
+        row=3,
+        col=4,
+        end_row=3,
+        end_col=13,
+        fix=RuffFix(applicability='unsafe', edits=[FixEdit(content='x', row=3, col=4, end_row=3, end_col=13)]),
+    )
+    return Inspected(
+        violation=violation, path=path, file='a.py', line='if x == True:', before='if x == True:', after='if x:'
+    )
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    return tmp_path / 'sessions.sqlite3'
+
+
+class TestSqliteSessionStore:
+    def test_survives_restart(self, db_path: Path) -> None:
+        scan = ScanState(
+            snapshot=Snapshot(
+                files={
+                    '/p/a.py': FileState(mtime_ns=1, size=2, digest='aa'),
+                    '/p/b.py': FileState(mtime_ns=3, size=4, digest='bb'),
+                },
+                taken_at_ns=5,
+            ),
+            findings={'/p/a.py': [inspected('/p/a.py')]},
+        )
+        items = [tracked('a.py', 'E712', 'if x == True:'), tracked('a.py', 'E712', 'if x == True:')]
+        created = SqliteSessionStore(db_path).create(
+            path='/p', mode='beginner', max_retry=3, tracked=items, last_scan=scan
+        )
+
+        loaded = SqliteSessionStore(db_path).get(created.id)
+        assert loaded is not None
+        assert loaded.initial == created.initial
+        assert loaded.refs == created.refs
+        assert (loaded.path, loaded.mode, loaded.max_retry, loaded.last_remaining) == ('/p', 'beginner', 3, 2)
+        assert loaded.last_scan == scan
+
+    def test_changes_are_kept_once_saved(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        session = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        session.attempts = 1
+        assert (store.get(session.id) or session).attempts == 0
+
+        new = tracked('a.py', 'F821', 'y = undefined')
+        session.track_new([new])
+        store.save(session)
+        loaded = store.get(session.id)
+        assert loaded is not None
+        assert loaded.attempts == 1
+        assert loaded.rules_covered == ['F821']
+        assert loaded.last_scan is None
+
+    def test_save_writes_only_the_changed_scan_rows(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        scan = ScanState(
+            snapshot=Snapshot(
+                files={
+                    '/p/a.py': FileState(mtime_ns=1, size=2, digest='aa'),
+                    '/p/b.py': FileState(mtime_ns=3, size=4, digest='bb'),
+                    '/p/c.py': FileState(mtime_ns=5, size=6, digest='cc'),
+                },
+                taken_at_ns=7,
+            ),
+            findings={'/p/a.py': [inspected('/p/a.py')], '/p/b.py': [inspected('/p/b.py')]},
+        )
+        session = store.create(path='/p', mode='beginner', max_retry=3, tracked=[], last_scan=scan)
+        statements: list[str] = []
+        store._connect().set_trace_callback(statements.append)  # noqa: SLF001
+
+        store.save(session)
+        assert not [statement for statement in statements if 'scan_files' in statement]
+
+        # a.py edited and fixed, b.py re-saved as is, c.py untouched
+        session.last_scan = ScanState(
+            snapshot=Snapshot(
+                files={
+                    '/p/a.py': FileState(mtime_ns=8, size=1, digest='a2'),
+                    '/p/b.py': FileState(mtime_ns=9, size=4, digest='bb'),
+                    '/p/c.py': FileState(mtime_ns=5, size=6, digest='cc'),
+                },
+                taken_at_ns=11,
+            ),
+            findings={'/p/b.py': scan.findings['/p/b.py']},
+        )
+        statements.clear()
+        store.save(session)
+        writes = sorted(statement.split()[0] for statement in statements if 'scan_files' in statement)
+        assert writes == ['INSERT', 'SELECT', 'UPDATE']
+        loaded = SqliteSessionStore(db_path).get(session.id)
+        assert loaded is not None
+        assert loaded.last_scan == session.last_scan
+
+    def test_added_init_file_rewrites_every_scan_row(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        module = {'/p/pkg/m.py': FileState(mtime_ns=1, size=2, digest='mm')}
+        scan = ScanState(
+            snapshot=Snapshot(files=module, taken_at_ns=3), findings={'/p/pkg/m.py': [inspected('/p/pkg/m.py')]}
+        )
+        session = store.create(path='/p', mode='beginner', max_retry=3, tracked=[], last_scan=scan)
+
+        # the new `__init__.py` resolves m.py's INP001 without touching m.py
+        session.last_scan = ScanState(
+            snapshot=Snapshot(files={**module, '/p/pkg/__init__.py': FileState(4, 0, 'ii')}, taken_at_ns=5),
+            findings={},
+        )
+        store.save(session)
+        loaded = SqliteSessionStore(db_path).get(session.id)
+        assert loaded is not None
+        assert loaded.last_scan == session.last_scan
+
+    def test_changed_ruff_config_rewrites_every_scan_row(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        files = {'/p/a.py': FileState(mtime_ns=1, size=2, digest='aa')}
+        scan = ScanState(
+            snapshot=Snapshot(files={**files, '/p/ruff.toml': FileState(1, 2, 'r1')}, taken_at_ns=3),
+            findings={'/p/a.py': [inspected('/p/a.py')]},
+        )
+        session = store.create(path='/p', mode='beginner', max_retry=3, tracked=[], last_scan=scan)
+
+        # the new config no longer selects E712
+        session.last_scan = ScanState(
+            snapshot=Snapshot(files={**files, '/p/ruff.toml': FileState(4, 5, 'r2')}, taken_at_ns=6), findings={}
+        )
+        store.save(session)
+        loaded = SqliteSessionStore(db_path).get(session.id)
+        assert loaded is not None
+        assert loaded.last_scan == session.last_scan
+
+    def test_not_capped_at_a_count(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        sessions = [store.create(path='/p', mode='beginner', max_retry=2, tracked=[]) for _ in range(20)]
+        assert all(store.get(session.id) is not None for session in sessions)
+
+    def test_remove(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        session = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        removed = store.remove(session.id)
+        assert removed is not None
+        assert removed.id == session.id
+        assert store.get(session.id) is None
+        assert store.remove(session.id) is None
+
+    def test_expires_after_ttl(self, db_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = 1_000_000.0
+        monkeypatch.setattr('ruff_tutor_mcp.session_db.time.time', lambda: now)
+        store = SqliteSessionStore(db_path, ttl_seconds=60)
+        idle = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        now += 30
+        active = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        now += 45
+        # `active` was used within the last minute; `idle` was not
+        assert store.get(idle.id) is None
+        assert store.get(active.id) is not None
+        assert store.eviction_reason(idle.id) == 'idle'
+        assert store.purge_expired() == 1
+        # still known as evicted for another TTL after it is purged
+        assert store.eviction_reason(idle.id) == 'idle'
+        assert store.eviction_reason(active.id) is None
+        now += 61
+        store.purge_expired()
+        assert store.eviction_reason(idle.id) is None
+
+    def test_usage(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path, ttl_seconds=60)
+        store.create(path='/p', mode='beginner', max_retry=2, tracked=[tracked('a.py', 'F401', 'import os')])
+        usage = store.usage()
+        assert (usage.store, usage.sessions, usage.idle_ttl_seconds) == ('sqlite', 1, 60)
+        assert usage.bytes > 0
+        assert usage.max_bytes is None
+
+    def test_concurrent_threads(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+
+        def churn(_: int) -> int:
+            session = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+            for _ in range(25):
+                loaded = store.get(session.id)
+                assert loaded is not None
+                loaded.attempts += 1
+                store.save(loaded)
+            return (store.get(session.id) or session).attempts
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert list(pool.map(churn, range(16))) == [25] * 16
+
+    def test_uses_wal(self, db_path: Path) -> None:
+        SqliteSessionStore(db_path).create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        with sqlite3.connect(db_path) as db:
+            assert db.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+
+    def test_unreadable_database_is_a_missing_session(self, tmp_path: Path) -> None:
+        store = SqliteSessionStore(tmp_path)  # a directory, not a database file
+        assert store.get('nope') is None
+
+    def test_baseline_in_an_older_layout_is_a_missing_session(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        session = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        with sqlite3.connect(db_path) as db:
+            legacy = '[["a.py", "F401", "import os", 1, []]]'
+            db.execute('UPDATE sessions SET baseline = ? WHERE id = ?', (legacy, session.id))
+        db.close()
+        assert store.get(session.id) is None
+
+    def test_package_policies_survive_restart(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        session = store.create(path='/p', mode='mixed', max_retry=3, tracked=[])
+        session.packages = {'/p/a': TeachingPolicy(mode='beginner', max_retry=1)}
+        store.save(session)
+        loaded = SqliteSessionStore(db_path).get(session.id)
+        assert loaded is not None
+        assert loaded.packages == session.packages
+
+    def test_scope_survives_restart(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        session = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        session.scope = 'hunks'
+        store.save(session)
+        loaded = SqliteSessionStore(db_path).get(session.id)
+        assert loaded is not None
+        assert loaded.scope == 'hunks'
+
+    def test_rule_selection_survives_restart(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        session = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        session.rules = RuleSelection(select=('PERF', 'B'), ignore=('B008',))
+        store.save(session)
+        loaded = SqliteSessionStore(db_path).get(session.id)
+        assert loaded is not None
+        assert loaded.rules == session.rules
+
+    def test_mode_override_survives_restart(self, db_path: Path) -> None:
+        store = SqliteSessionStore(db_path)
+        session = store.create(path='/p', mode='beginner', max_retry=2, tracked=[])
+        session.mode_override = 'beginner'
+        store.save(session)
+        loaded = SqliteSessionStore(db_path).get(session.id)
+        assert loaded is not None
+        assert loaded.mode_override == 'beginner'
@@ -1,26 +1,49 @@
 from __future__ import annotations
 
+import gc
+import tracemalloc
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-from ruff_tutor_mcp.models import ViolationRef
+from ruff_tutor_mcp.models import RuffViolation, ViolationRef
 from ruff_tutor_mcp.sessions import (
+    Fingerprint,
+    Inspected,
+    ScanState,
     SessionStore,
+    TeachingPolicy,
+    TrackedRef,
     TrackedViolation,
     make_fingerprint,
+    new_session,
     split_progress,
 )
+from ruff_tutor_mcp.snapshots import Snapshot
+
+if TYPE_CHECKING:
+    import pytest
 
 
 def tracked(file: str, code: str, line: str) -> TrackedViolation:
     return TrackedViolation(
         fingerprint=make_fingerprint(file, code, line),
-        ref=ViolationRef(file=file, row=1, code=code, message=f'{code} violation'),
+        ref=TrackedRef.of(file, 1, code, f'{code} violation'),
     )
 
 
 class TestMakeFingerprint:
     def test_strips_line_text(self) -> None:
-        assert make_fingerprint('a.py', 'E712', '  if x == True:  ') == ('a.py', 'E712', 'if x == True:')
+        expected = make_fingerprint('a.py', 'E712', 'if x == True:')
+        assert make_fingerprint('a.py', 'E712', '  if x == True:  ') == expected
+
+    def test_is_a_64_bit_digest_of_every_part(self) -> None:
+        fingerprint = make_fingerprint('a.py', 'E712', 'if x == True:')
+        assert 0 <= fingerprint < 2**64
+        assert fingerprint != make_fingerprint('b.py', 'E712', 'if x == True:')
+        assert fingerprint != make_fingerprint('a.py', 'E711', 'if x == True:')
+        # parts are separated, so moving text between them changes the digest
+        assert make_fingerprint('a.py', 'E7', '12x') != make_fingerprint('a.py', 'E712', 'x')
 
     def test_survives_line_shift(self) -> None:
         # the fingerprint has no line number, so moving the line keeps it equal
@@ -65,6 +88,16 @@ class TestSplitProgress:
         assert len(fixed) == 1
         assert flags == [True]
 
+    def test_fixed_duplicates_pad_with_the_last_ref(self) -> None:
+        first, second = TrackedRef.of('a.py', 1, 'E712', 'm'), TrackedRef.of('a.py', 5, 'E712', 'm')
+        fingerprint = make_fingerprint('a.py', 'E712', 'if x == True:')
+        fixed, flags = split_progress(
+            initial=Counter({fingerprint: 3}), refs={fingerprint: [first, second]}, current=[]
+        )
+        assert fixed == [first.to_model(), second.to_model(), second.to_model()]
+        assert all(isinstance(ref, ViolationRef) for ref in fixed)
+        assert flags == []
+
 
 class TestSessionStore:
     def test_create_and_get(self) -> None:
@@ -90,6 +123,57 @@ class TestSessionStore:
         assert store.get(first.id) is None
         assert store.get(second.id) is not None
         assert store.get(third.id) is not None
+        assert store.eviction_reason(first.id) == 'memory'
+        assert store.eviction_reason(second.id) is None
+
+    def test_evicts_least_recently_used_over_memory_budget(self) -> None:
+        small = [tracked('a.py', 'F401', f'import m{n}') for n in range(10)]
+        large = [tracked('a.py', 'F401', f'import m{n}') for n in range(100)]
+        budget = (
+            new_session('.', 'beginner', 2, large).estimated_size
+            + new_session('.', 'beginner', 2, small).estimated_size
+        )
+        store = SessionStore(max_bytes=budget)
+        first = store.create(path='.', mode='beginner', max_retry=2, tracked=small)
+        second = store.create(path='.', mode='beginner', max_retry=2, tracked=small)
+        store.get(first.id)
+        store.create(path='.', mode='beginner', max_retry=2, tracked=large)
+        # `second` was used least recently; `first` still fits beside the new session
+        assert store.get(second.id) is None
+        assert store.get(first.id) is first
+        assert store.eviction_reason(second.id) == 'memory'
+        assert store.usage().bytes <= store.max_bytes
+        assert store.usage().evictions >= 1
+
+    def test_session_over_budget_on_its_own_is_kept(self) -> None:
+        store = SessionStore(max_bytes=1)
+        first = store.create(path='.', mode='beginner', max_retry=2, tracked=[])
+        second = store.create(path='.', mode='beginner', max_retry=2, tracked=[])
+        assert store.get(first.id) is None
+        assert store.get(second.id) is second
+
+    def test_save_re_estimates_size(self) -> None:
+        store = SessionStore()
+        session = store.create(path='.', mode='beginner', max_retry=2, tracked=[])
+        before = store.usage().bytes
+        session.track_new([tracked('a.py', 'F401', f'import m{n}') for n in range(10)])
+        store.save(session)
+        assert store.usage().bytes == session.estimated_size > before
+        store.remove(session.id)
+        assert store.usage().bytes == 0
+
+    def test_drops_idle_sessions(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        now = 1_000.0
+        monkeypatch.setattr('ruff_tutor_mcp.sessions.time.monotonic', lambda: now)
+        store = SessionStore(idle_ttl_seconds=60)
+        idle = store.create(path='.', mode='beginner', max_retry=2, tracked=[])
+        now += 30
+        active = store.create(path='.', mode='beginner', max_retry=2, tracked=[])
+        now += 45
+        assert store.get(idle.id) is None
+        assert store.get(active.id) is active
+        assert store.eviction_reason(idle.id) == 'idle'
+        assert store.usage().sessions == 1
 
     def test_track_new_folds_into_baseline(self) -> None:
         store = SessionStore()
@@ -100,6 +184,92 @@ class TestSessionStore:
         assert session.refs[new.fingerprint] == [new.ref]
         assert session.rules_covered == ['F821']
 
+    def test_concurrent_threads(self) -> None:
+        store = SessionStore(max_sessions=50)
+
+        def churn(_: int) -> None:
+            for _ in range(200):
+                session = store.create(path='.', mode='beginner', max_retry=2, tracked=[])
+                store.get(session.id)
+                store.save(session)
+                store.remove(session.id)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(churn, range(8)))
+        assert store.get('nope') is None
+
+
+class TestPackagePolicies:
+    def test_single_policy_session(self) -> None:
+        session = new_session('/repo', 'advanced', 2, [])
+        assert session.policy_for('/repo/a.py') == TeachingPolicy(mode='advanced', max_retry=2)
+        assert not session.reveals_fix('/repo/a.py')
+        session.attempts = 2
+        assert session.reveals_fix('/repo/a.py')
+
+    def test_nearest_package_wins(self) -> None:
+        session = new_session('/repo', 'mixed', 3, [])
+        session.packages = {
+            '/': TeachingPolicy(mode='auto', max_retry=2),
+            '/repo/easy': TeachingPolicy(mode='beginner', max_retry=1),
+            '/repo/hard': TeachingPolicy(mode='advanced', max_retry=3),
+            '/repo/hard/vendored': TeachingPolicy(mode='advanced', max_retry=1),
+        }
+        assert session.policy_for('/repo/easy/src/a.py').mode == 'beginner'
+        assert session.policy_for('/repo/tools/b.py').mode == 'auto'
+        session.attempts = 1
+        assert session.reveals_fix('/repo/easy/src/a.py')
+        assert session.reveals_fix('/repo/hard/vendored/c.py')
+        assert not session.reveals_fix('/repo/hard/src/c.py')
+
+
+class TestTrackedRef:
+    def test_interns_repeated_strings(self) -> None:
+        # built at runtime, so the two strings start out as distinct objects
+        first, second = (TrackedRef.of(f'a{".py"}', row, f'F{401}', 'm') for row in (1, 2))
+        assert first.file is second.file
+        assert first.code is second.code
+
+    def test_is_slotted(self) -> None:
+        assert not hasattr(TrackedRef.of('a.py', 1, 'F401', 'm'), '__dict__')
+
+
+class TestBaselineMemory:
+    def test_ten_thousand_tracked_violations(self) -> None:
+        # a baseline of 10k violations over 200 files takes ~4 MB; with string
+        # fingerprints and pydantic refs it took ~9 MB
+        tracemalloc.start()
+        try:
+            items = [
+                TrackedViolation(
+                    fingerprint=make_fingerprint(f'src/pkg/module_{n % 200}.py', 'E501', f'value_{n} = compute({n})'),
+                    ref=TrackedRef.of(f'src/pkg/module_{n % 200}.py', n, 'E501', 'Line too long (120 > 88)'),
+                )
+                for n in range(10_000)
+            ]
+            session = new_session('.', 'beginner', 3, items)
+            del items
+            gc.collect()
+            used, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert session.last_remaining == 10_000
+        assert used < 6 * 1024 * 1024
+
+
+class TestScanState:
+    def test_groups_findings_by_path(self) -> None:
+        items = [inspected('/p/b.py', 'F401'), inspected('/p/a.py', 'E712'), inspected('/p/b.py', 'E712')]
+        scan = ScanState.from_items(Snapshot(files={}, taken_at_ns=0), items)
+        assert sorted(scan.findings) == ['/p/a.py', '/p/b.py']
+        assert [i.violation.code for i in scan.findings['/p/b.py']] == ['F401', 'E712']
+        assert [i.path for i in scan.items] == ['/p/a.py', '/p/b.py', '/p/b.py']
+
+
+def inspected(path: str, code: str) -> Inspected:
+    violation = RuffViolation(code=code, message=code, filename=path, row=1, col=1, end_row=1, end_col=2)
+    return Inspected(violation=violation, path=path, file=path, line='x', before='x', after=None)
+
 
-def _counter(items: list[TrackedViolation]) -> Counter[tuple[str, str, str]]:
+def _counter(items: list[TrackedViolation]) -> Counter[Fingerprint]:
     return Counter(t.fingerprint for t in items)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from ruff_tutor_mcp.snapshots import is_ruff_config, take_snapshot
+
+
+def backdate(path: Path, seconds: int = 60) -> None:
+    # move mtime out of the racy window so the stat shortcut applies
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 1_000_000_000))
+
+
+class TestTakeSnapshot:
+    def test_collects_sources_and_configs(self, tmp_path: Path) -> None:
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        (tmp_path / 'notes.txt').write_text('ignored\n')
+        (tmp_path / 'ruff.toml').write_text('')
+        (tmp_path / '.venv').mkdir()
+        (tmp_path / '.venv' / 'lib.py').write_text('x = 1\n')
+        files = take_snapshot(tmp_path).files
+        assert sorted(Path(path).name for path in files if path.startswith(str(tmp_path))) == ['a.py', 'ruff.toml']
+
+    def test_single_file_includes_ancestor_configs(self, tmp_path: Path) -> None:
+        (tmp_path / 'pyproject.toml').write_text('')
+        (tmp_path / 'pkg').mkdir()
+        (tmp_path / 'pkg' / 'a.py').write_text('x = 1\n')
+        files = take_snapshot(tmp_path / 'pkg' / 'a.py').files
+        assert str(tmp_path / 'pyproject.toml') in files
+        assert str(tmp_path / 'pkg' / 'a.py') in files
+
+    def test_only_given_files(self, tmp_path: Path) -> None:
+        (tmp_path / 'ruff.toml').write_text('')
+        for name in ('a.py', 'b.py'):
+            (tmp_path / name).write_text('x = 1\n')
+        files = take_snapshot(tmp_path, only=[tmp_path / 'b.py']).files
+        # the scan root's own config is still in scope
+        assert sorted(Path(path).name for path in files if path.startswith(str(tmp_path))) == ['b.py', 'ruff.toml']
+
+
+class TestChanges:
+    def test_unchanged(self, tmp_path: Path) -> None:
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        before = take_snapshot(tmp_path)
+        assert before.changes(take_snapshot(tmp_path, previous=before)) == ([], [])
+
+    def test_modified_added_removed(self, tmp_path: Path) -> None:
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        (tmp_path / 'b.py').write_text('y = 1\n')
+        before = take_snapshot(tmp_path)
+        (tmp_path / 'a.py').write_text('x = 2\n')
+        (tmp_path / 'b.py').unlink()
+        (tmp_path / 'c.py').write_text('z = 1\n')
+        changed, removed = before.changes(take_snapshot(tmp_path, previous=before))
+        assert sorted(changed) == [str(tmp_path / 'a.py'), str(tmp_path / 'c.py')]
+        assert removed == [str(tmp_path / 'b.py')]
+
+    def test_resave_without_edits_is_not_a_change(self, tmp_path: Path) -> None:
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        before = take_snapshot(tmp_path)
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        assert before.changes(take_snapshot(tmp_path, previous=before)) == ([], [])
+
+    def test_old_stat_reuses_previous_state(self, tmp_path: Path) -> None:
+        target = tmp_path / 'a.py'
+        target.write_text('x = 1\n')
+        backdate(target)
+        before = take_snapshot(tmp_path)
+        after = take_snapshot(tmp_path, previous=before)
+        assert after.files[str(target)] is before.files[str(target)]
+
+
+class TestDigest:
+    def test_stable_across_resave(self, tmp_path: Path) -> None:
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        before = take_snapshot(tmp_path)
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        assert take_snapshot(tmp_path).digest == before.digest
+
+    def test_covers_sources_and_configs(self, tmp_path: Path) -> None:
+        (tmp_path / 'a.py').write_text('x = 1\n')
+        (tmp_path / 'ruff.toml').write_text('')
+        digests = {take_snapshot(tmp_path).digest}
+        (tmp_path / 'a.py').write_text('x = 2\n')
+        digests.add(take_snapshot(tmp_path).digest)
+        (tmp_path / 'ruff.toml').write_text('line-length = 100\n')
+        digests.add(take_snapshot(tmp_path).digest)
+        assert len(digests) == 3
+
+    def test_covers_extended_configs(self, tmp_path: Path) -> None:
+        (tmp_path / 'shared.toml').write_text('')
+        (tmp_path / 'base.toml').write_text('extend = "shared.toml"\n')
+        (tmp_path / 'project').mkdir()
+        (tmp_path / 'project' / 'a.py').write_text('x = 1\n')
+        (tmp_path / 'project' / 'pyproject.toml').write_text('[tool.ruff]\nextend = "../base.toml"\n')
+        before = take_snapshot(tmp_path / 'project')
+        assert {str(tmp_path / 'base.toml'), str(tmp_path / 'shared.toml')} <= before.files.keys()
+        (tmp_path / 'shared.toml').write_text('line-length = 100\n')
+        after = take_snapshot(tmp_path / 'project', previous=before)
+        assert after.digest != before.digest
+        assert before.changes(after) == ([str(tmp_path / 'shared.toml')], [])
+
+    def test_extend_cycle(self, tmp_path: Path) -> None:
+        (tmp_path / 'ruff.toml').write_text('extend = "other.toml"\n')
+        (tmp_path / 'other.toml').write_text('extend = "ruff.toml"\n')
+        files = take_snapshot(tmp_path).files
+        assert sorted(Path(path).name for path in files if path.startswith(str(tmp_path))) == [
+            'other.toml',
+            'ruff.toml',
+        ]
+
+
+def test_is_ruff_config() -> None:
+    assert is_ruff_config('/repo/pyproject.toml')
+    assert is_ruff_config('/repo/.ruff.toml')
+    assert is_ruff_config('/repo/shared/ruff-base.toml')
+    assert not is_ruff_config('/repo/setup.py')
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from ruff_tutor_mcp.worktree import GitError, _parse_hunks, working_tree_changes
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def repo(tmp_path: Path, git: Callable[..., None]) -> Path:
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'a.py').write_text('a = 1\nb = 2\nc = 3\n')
+    (tmp_path / 'pkg' / 'b.py').write_text('b = 1\n')
+    (tmp_path / 'README.md').write_text('readme\n')
+    git(tmp_path, 'init', '-q')
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-q', '-m', 'initial')
+    return tmp_path
+
+
+def key(path: Path) -> str:
+    return str(path.resolve())
+
+
+class TestWorkingTreeChanges:
+    async def test_lists_modified_and_untracked_sources(self, repo: Path) -> None:
+        (repo / 'pkg' / 'a.py').write_text('a = 1\nb = 20\nc = 3\n')
+        (repo / 'pkg' / 'new.py').write_text('n = 1\n')
+        (repo / 'ruff.toml').write_text('[lint]\n')
+        (repo / 'README.md').write_text('changed\n')
+        (repo / 'pkg' / 'b.py').unlink()
+        changed = await working_tree_changes(repo)
+        # deleted files and non-Python files are left out; ruff configs are kept
+        assert changed == {
+            key(repo / 'pkg' / 'a.py'): None,
+            key(repo / 'pkg' / 'new.py'): None,
+            key(repo / 'ruff.toml'): None,
+        }
+
+    async def test_clean_tree(self, repo: Path) -> None:
+        assert await working_tree_changes(repo, hunks=True) == {}
+
+    async def test_limited_to_path(self, repo: Path) -> None:
+        (repo / 'pkg' / 'a.py').write_text('a = 10\n')
+        (repo / 'top.py').write_text('t = 1\n')
+        assert list(await working_tree_changes(repo / 'pkg')) == [key(repo / 'pkg' / 'a.py')]
+        assert list(await working_tree_changes(repo / 'top.py')) == [key(repo / 'top.py')]
+
+    async def test_hunks_map_changed_lines(self, repo: Path, git: Callable[..., None]) -> None:
+        (repo / 'pkg' / 'a.py').write_text('a = 1\nb = 20\nc = 3\nd = 4\ne = 5\n')
+        (repo / 'pkg' / 'new.py').write_text('n = 1\n')
+        # staged changes count too: the diff is against HEAD
+        (repo / 'pkg' / 'b.py').write_text('b = 1\n\nx = 2\n')
+        git(repo, 'add', 'pkg/b.py')
+        changed = await working_tree_changes(repo, hunks=True)
+        assert changed == {
+            key(repo / 'pkg' / 'a.py'): {2, 4, 5},
+            key(repo / 'pkg' / 'b.py'): {2, 3},
+            key(repo / 'pkg' / 'new.py'): None,
+        }
+
+    async def test_renamed_file(self, repo: Path, git: Callable[..., None]) -> None:
+        git(repo, 'mv', 'pkg/b.py', 'pkg/c.py')
+        assert list(await working_tree_changes(repo)) == [key(repo / 'pkg' / 'c.py')]
+
+    async def test_repository_without_commits(self, tmp_path: Path, git: Callable[..., None]) -> None:
+        git(tmp_path, 'init', '-q')
+        (tmp_path / 'a.py').write_text('a = 1\n')
+        assert await working_tree_changes(tmp_path, hunks=True) == {key(tmp_path / 'a.py'): None}
+
+    async def test_not_a_repository(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv('GIT_CEILING_DIRECTORIES', str(tmp_path.parent))
+        with pytest.raises(GitError):
+            await working_tree_changes(tmp_path)
+
+    async def test_missing_path(self, tmp_path: Path) -> None:
+        with pytest.raises(GitError):
+            await working_tree_changes(tmp_path / 'missing')
+
+
+class TestParseHunks:
+    def test_new_side_lines(self, tmp_path: Path) -> None:
+        diff = (
+            'diff --git a/a.py b/a.py\n'
+            '--- a/a.py\n'
+            '+++ b/a.py\n'
+            '@@ -1 +1 @@\n'
+            '-a = 1\n'
+            '+a = 2\n'
+            '@@ -5,2 +4,0 @@\n'
+            '-gone\n'
+            '-gone\n'
+            '@@ -9,0 +8,3 @@ def f():\n'
+            '+x\n'
+            '+y\n'
+            '+z\n'
+            'diff --git a/old.py b/old.py\n'
+            '--- a/old.py\n'
+            '+++ /dev/null\n'
+            '@@ -1 +0,0 @@\n'
+            '-old\n'
+        )
+        # pure deletions touch no new-side line
+        assert _parse_hunks(diff, tmp_path) == {key(tmp_path / 'a.py'): {1, 8, 9, 10}}